@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+#
+# Generates synthetic TupLang programs for the benchmarks. The shape of the
+# program is tunable: the number of top-level definitions, how deeply the
+# expressions are nested, the size of the tuple literals, the number of
+# functions, whether pipes apply the functions with each:, and how deeply
+# nested the comment before each definition is. The same shape and seed
+# always give the same program, and the programs pass the semantic checks.
+#
+#   python benchmarks/generate.py --definitions 10000 -o big.tupl
+
+import random
+import sys
+
+
+shape_defaults = {
+    "definitions": 1000,  # top-level definitions, not counting the functions
+    "depth": 4,  # nesting of the parentheses in an expression
+    "tuple_size": 16,  # elements of a tuple literal
+    "functions": 8,
+    "each": True,  # pipes through each:Function
+    "comments": 0,  # nesting of the comment before each definition, 0 for none
+    "seed": 0,
+}
+
+
+def letters(number):
+    '''A name of lowercase letters for a number; tuple identifiers can not
+    contain digits'''
+    name = ""
+    while True:
+        number, digit = divmod(number, 26)
+        name += "abcdefghijklmnopqrstuvwxyz"[digit]
+        if number == 0:
+            return "t" + name
+
+
+def comment(depth):
+    if depth == 0:
+        return ""
+    return "{ generated " + comment(depth - 1) + "} "
+
+
+def expression(rng, depth, names):
+    '''An expression nested depth parentheses deep. Only one of the operands
+    is an earlier variable and it is never multiplied, so the values grow
+    slowly along the program.'''
+    text = rng.choice(names) if names else str(rng.randint(1, 9))
+    for level in range(depth):
+        operator = rng.choice("+-*")
+        if operator == "*":
+            text = "({} + {} * {})".format(text, rng.randint(1, 9), rng.randint(1, 9))
+        else:
+            text = "({} {} {})".format(text, operator, rng.randint(1, 9))
+    return text
+
+
+def function_definition(rng, index, depth):
+    return ("define Fn{0}[aa]\nbegin\n  bb <- aa * 2 + {0}.\n  = {1}.\nend.\n"
+            .format(index, expression(rng, depth, ["aa", "bb"])))
+
+
+def generate(definitions=1000, depth=4, tuple_size=16, functions=8, each=True, comments=0, seed=0):
+    '''The source of a program with the given shape'''
+    rng = random.Random(seed)
+    lines = [comment(comments) + function_definition(rng, index, depth) for index in range(functions)]
+    variables = []
+    literals = []  # tuples defined by a literal, concatenated with ++
+    tuples = []
+
+    for index in range(definitions):
+        kind = rng.randrange(6)
+        prefix = comment(comments)
+        name = letters(index)
+        if not literals or kind == 0:
+            elements = [str(rng.randint(1, 99)) for element in range(tuple_size - 1)]
+            elements.append(rng.choice(variables[-16:]) if variables else "1")
+            lines.append("{}<{}> <- [{}].\n".format(prefix, name, ", ".join(elements)))
+            literals.append(name)
+            tuples.append(name)
+        elif kind == 1:
+            lines.append("{}<{}> <- <{}> ++ [1..{}].\n".format(prefix, name, rng.choice(literals[-16:]), tuple_size))
+            tuples.append(name)
+        elif kind == 2:
+            operation = "each:Fn{} | +".format(rng.randrange(functions)) if each and functions else "*"
+            lines.append("{}<{}> | {} -> <{}>.\n".format(prefix, rng.choice(tuples[-16:]), operation, name))
+        elif kind == 3:
+            lines.append("{}<{}> | + -> <{}>.\n".format(prefix, rng.choice(tuples[-16:]), name))
+            variable = "va" + str(index)
+            lines.append("{}{} <- select:1[<{}>] - {}.\n".format(prefix, variable, name, rng.randint(1, 9)))
+            variables.append(variable)
+        else:
+            variable = "va" + str(index)
+            value = expression(rng, depth, variables[-16:])
+            if kind == 4 and functions:
+                value = "Fn{}[{}] + 1".format(rng.randrange(functions), value)
+            lines.append("{}{} <- {}.\n".format(prefix, variable, value))
+            variables.append(variable)
+
+    lines.append("= {}.\n".format(variables[-1] if variables else 0))
+    return "".join(lines)
+
+
+def add_shape_arguments(arg_parser):
+    '''The options for the shape of the generated program'''
+    arg_parser.add_argument('--definitions', type=int, default=shape_defaults["definitions"],
+                            help='number of top-level definitions (default %(default)s)')
+    arg_parser.add_argument('--depth', type=int, default=shape_defaults["depth"],
+                            help='nesting depth of the expressions (default %(default)s)')
+    arg_parser.add_argument('--tuple-size', type=int, default=shape_defaults["tuple_size"],
+                            help='number of elements in a tuple literal (default %(default)s)')
+    arg_parser.add_argument('--functions', type=int, default=shape_defaults["functions"],
+                            help='number of functions (default %(default)s)')
+    arg_parser.add_argument('--no-each', action='store_true', help='do not use each: in the pipes')
+    arg_parser.add_argument('--comments', type=int, default=shape_defaults["comments"],
+                            help='nesting depth of the comment before each definition (default %(default)s)')
+    arg_parser.add_argument('--seed', type=int, default=shape_defaults["seed"])
+
+
+def shape_from(ns):
+    return {"definitions": ns.definitions, "depth": ns.depth, "tuple_size": ns.tuple_size,
+            "functions": ns.functions, "each": not ns.no_each, "comments": ns.comments, "seed": ns.seed}
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    add_shape_arguments(arg_parser)
+    arg_parser.add_argument('-o', '--output', help='file to write the program to (default: stdout)')
+    ns = arg_parser.parse_args()
+
+    source = generate(**shape_from(ns))
+    if ns.output:
+        with open(ns.output, "w") as outfile:
+            outfile.write(source)
+    else:
+        sys.stdout.write(source)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Parses many generated programs (see generate.py) at the same time from a
+# pool of threads, with tree_generation.parse_source and with the ply lexer
+# of tokenizer.new_lexer, and checks that the trees, with the line numbers
+# of all nodes, and the tokens are the same as when the programs are parsed
+# one after the other. Exits with status 1 if any of them differ.
+#
+#   python benchmarks/parse_stress.py --programs 64 --threads 8 --rounds 3
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo)
+
+import generate
+import tokenizer
+import tree_generation
+from tree_nodes import ASTnode
+
+
+def dump(tree):
+    '''The nodes of the tree in preorder as (class, nodetype, line, value)'''
+    nodes = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, ASTnode):
+            nodes.append(repr(node))
+            continue
+        nodes.append((type(node).__name__, node.nodetype, node.lineno, repr(getattr(node, "value", None))))
+        children = []
+        for name, label, is_list in node.child_layout:
+            child = getattr(node, name, None)
+            if is_list:
+                children.extend(child or ())
+            elif child is not None:
+                children.append(child)
+        stack.extend(reversed(children))
+    return nodes
+
+
+def parsed(source):
+    try:
+        return dump(tree_generation.parse_source(source))
+    except Exception as err:
+        return repr(err)
+
+
+def lexed(source):
+    try:
+        lexer = tokenizer.new_lexer()
+        lexer.input(source)
+        return [(token.type, token.value, token.lineno) for token in iter(lexer.token, None)]
+    except Exception as err:
+        return repr(err)
+
+
+def programs(count, shape):
+    '''Programs of the shape with different seeds and comment nesting, so
+    the comment level of the lexers changes'''
+    return [generate.generate(**dict(shape, seed=shape["seed"] + index, comments=index % 3))
+            for index in range(count)]
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    generate.add_shape_arguments(arg_parser)
+    arg_parser.set_defaults(definitions=200)
+    arg_parser.add_argument('--programs', type=int, default=64, help='number of programs (default 64)')
+    arg_parser.add_argument('--threads', type=int, default=8, help='number of threads (default 8)')
+    arg_parser.add_argument('--rounds', type=int, default=3, help='times all programs are parsed (default 3)')
+    ns = arg_parser.parse_args()
+
+    # Switch between the threads more often than by default
+    sys.setswitchinterval(1e-5)
+
+    sources = programs(ns.programs, generate.shape_from(ns))
+    started = time.perf_counter()
+    expected_trees = [parsed(source) for source in sources]
+    expected_tokens = [lexed(source) for source in sources]
+    sequential = time.perf_counter() - started
+
+    failures = 0
+    with ThreadPoolExecutor(ns.threads) as pool:
+        for round_number in range(ns.rounds):
+            started = time.perf_counter()
+            trees = pool.map(parsed, sources)
+            tokens = pool.map(lexed, sources)
+            different = [index for index, (tree, expected) in enumerate(zip(trees, expected_trees))
+                         if tree != expected]
+            different += [index for index, (token_list, expected) in enumerate(zip(tokens, expected_tokens))
+                          if token_list != expected]
+            failures += len(different)
+            print("round {}: {} programs in {:.2f} s with {} threads ({:.2f} s one by one), {} different{}".format(
+                round_number + 1, len(sources), time.perf_counter() - started, ns.threads, sequential,
+                len(different), ": programs " + ", ".join(map(str, sorted(set(different)))) if different else ""))
+
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+#
+# Times the phases of the interpreter separately on a generated program (see
+# generate.py) or on a given file:
+#   lex       tokenizer.lexer (the ply lexer) over the source
+#   lex_file  tokenizer.lex_file, the lexer that the run scripts use
+#   parse     tree_generation.parser.parse of the lexed tokens
+#   optimize  semantics_optimize.optimize at -O1
+#   check     semantics_check.semantic_checks
+#   run       semantics_run.run_program with the VM
+# Every phase is run --warmup times untimed and then --repeat times. The
+# phases that change the tree get a new tree for each run, made outside the
+# timed part, and garbage is collected before each run. The output of the
+# program is discarded.
+#
+# The results are written as JSON with --output. With --baseline FILE the
+# median times are compared with the ones in FILE, a results file of an
+# earlier run, and the script exits with status 1 when a phase is slower than
+# the baseline by more than --threshold (a fraction, default 0.1).
+#
+#   python benchmarks/phases.py --definitions 5000 --output base.json
+#   ... change something ...
+#   python benchmarks/phases.py --definitions 5000 --baseline base.json
+
+import contextlib
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo)
+
+import generate
+import tokenizer
+import tree_generation
+import semantics_optimize
+import semantics_check
+import semantics_run
+from semantics_common import SemData, create_scope
+
+
+phases = ("lex", "lex_file", "parse", "optimize", "check", "run")
+
+
+def new_semdata():
+    '''The symbol table and settings of a run, as semantics_run.py makes them
+    with the default options'''
+    semdata = SemData()
+    semdata.in_function = None
+    semdata.evaluator = "vm"
+    semdata.memo = semantics_run.semantics_memo.MemoData(4096, None, [])
+    create_scope(semdata, "global")
+    semdata.symtbl["global"]["declared"] = set()
+    semdata.symtbl["global"]["functions"] = dict()
+    return semdata
+
+
+def ply_lex(source):
+    lexer = tokenizer.new_lexer()
+    lexer.input(source)
+    for token in iter(lexer.token, None):
+        pass
+
+
+def parse(arrays):
+    arrays.position = 0
+    arrays.lineno = 1
+    return tree_generation.parser.parse(lexer=arrays, debug=False)
+
+
+def phase_runs(filename):
+    '''For every phase a function that prepares a run (untimed) and returns
+    the function to time'''
+    with open(filename) as infile:
+        source = infile.read()
+    arrays = tokenizer.lex_file(filename)
+
+    def optimized():
+        tree = parse(arrays)
+        semantics_optimize.optimize(tree, 1)
+        return tree
+
+    def checked():
+        tree = optimized()
+        semdata = new_semdata()
+        semantics_check.semantic_checks(tree, semdata)
+        return tree, semdata
+
+    def prepare_check():
+        tree = optimized()
+        return lambda: semantics_check.semantic_checks(tree, new_semdata())
+
+    def prepare_run():
+        tree, semdata = checked()
+        return lambda: semantics_run.run_program(tree, semdata)
+
+    return {
+        "lex": lambda: lambda: ply_lex(source),
+        "lex_file": lambda: lambda: tokenizer.lex_file(filename),
+        "parse": lambda: lambda: parse(arrays),
+        "optimize": lambda: (lambda tree: lambda: semantics_optimize.optimize(tree, 1))(parse(arrays)),
+        "check": prepare_check,
+        "run": prepare_run,
+    }, len(source), len(arrays)
+
+
+def measure(filename, selected, repeat, warmup):
+    '''The times of the selected phases in seconds'''
+    runs, size, token_count = phase_runs(filename)
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for phase in selected:
+            times = []
+            for run in range(warmup + repeat):
+                timed = runs[phase]()
+                gc.collect()
+                started = time.perf_counter()
+                timed()
+                elapsed = time.perf_counter() - started
+                if run >= warmup:
+                    times.append(elapsed)
+            results[phase] = {"median": statistics.median(times), "min": min(times), "times": times}
+    return results, size, token_count
+
+
+def compare(results, baseline, threshold):
+    '''Print the medians next to the baseline and return the phases that
+    are slower by more than the threshold'''
+    slower = []
+    print("{:<10} {:>12} {:>12} {:>8}".format("phase", "baseline ms", "median ms", "change"))
+    for phase, result in results.items():
+        if phase not in baseline["phases"]:
+            print("{:<10} {:>12} {:>12.3f}".format(phase, "-", result["median"] * 1000))
+            continue
+        before = baseline["phases"][phase]["median"]
+        change = result["median"] / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            slower.append(phase)
+            flag = "  SLOWER"
+        print("{:<10} {:>12.3f} {:>12.3f} {:>+7.1%}{}".format(
+            phase, before * 1000, result["median"] * 1000, change, flag))
+    return slower
+
+
+def report(results):
+    print("{:<10} {:>12} {:>12}".format("phase", "median ms", "min ms"))
+    for phase, result in results.items():
+        print("{:<10} {:>12.3f} {:>12.3f}".format(phase, result["median"] * 1000, result["min"] * 1000))
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    generate.add_shape_arguments(arg_parser)
+    arg_parser.add_argument('-f', '--file', help='time this program instead of a generated one')
+    arg_parser.add_argument('--phase', action='append', choices=phases,
+                            help='time only this phase (can be repeated, default: all)')
+    arg_parser.add_argument('-n', '--repeat', type=int, default=5, help='timed runs of each phase (default 5)')
+    arg_parser.add_argument('--warmup', type=int, default=1, help='untimed runs before them (default 1)')
+    arg_parser.add_argument('-o', '--output', metavar='FILE', help='write the results to FILE as JSON')
+    arg_parser.add_argument('--baseline', metavar='FILE', help='compare with the results in FILE')
+    arg_parser.add_argument('--threshold', type=float, default=0.1,
+                            help='fraction by which a phase may be slower than the baseline (default 0.1)')
+    ns = arg_parser.parse_args()
+
+    selected = ns.phase or phases
+    if ns.file:
+        program = {"file": ns.file}
+        results, size, token_count = measure(ns.file, selected, ns.repeat, ns.warmup)
+    else:
+        program = generate.shape_from(ns)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "generated.tupl")
+            with open(filename, "w") as outfile:
+                outfile.write(generate.generate(**program))
+            results, size, token_count = measure(filename, selected, ns.repeat, ns.warmup)
+    program.update(bytes=size, tokens=token_count)
+
+    data = {"program": program, "python": platform.python_version(), "repeat": ns.repeat,
+            "warmup": ns.warmup, "phases": results}
+    if ns.output:
+        with open(ns.output, "w") as outfile:
+            json.dump(data, outfile, indent=1)
+            outfile.write("\n")
+
+    if ns.baseline:
+        with open(ns.baseline) as infile:
+            baseline = json.load(infile)
+        if baseline["program"] != program:
+            print("Warning: the baseline was measured on a different program:", baseline["program"])
+        slower = compare(results, baseline, ns.threshold)
+        if slower:
+            print("Slower than the baseline by more than {:.0%}: {}".format(ns.threshold, ", ".join(slower)))
+            sys.exit(1)
+    else:
+        report(results)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+#
+# Finds the phases whose time grows faster than linearly with the size of
+# the input. Every workload is a program made for a size n, run for a
+# series of doubling sizes; the shortest times of the phases (see
+# phases.py), which vary the least between runs, are fitted to c * n ** k
+# by least squares on log-log scale and the exponent k is reported. A phase
+# is flagged when k is above --limit (default 1.2). Phases that take less
+# than --min-time at the largest size are too fast to fit and are not
+# flagged.
+#
+#   python benchmarks/scaling.py
+#   python benchmarks/scaling.py --workload concat --scale 2 --output scaling.json
+#
+# The script exits with status 1 when a phase was flagged.
+
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+
+import phases
+
+
+def concat_program(n):
+    '''A chain of n constant tuples joined with ++'''
+    return "<ta> <- {}.\n= select:1[<ta>].\n".format(" ++ ".join("[{}]".format(i) for i in range(1, n + 1)))
+
+
+def concat_variable_program(n):
+    '''A chain of n tuples joined with ++ that is evaluated when run'''
+    return "aa <- 1.\n<ta> <- {}.\n= select:1[<ta>].\n".format(" ++ ".join(["[aa]"] * n))
+
+
+def range_program(n):
+    '''A range of n elements made into a list and summed'''
+    return "NN <- {}.\n<tr> <- [1..NN] ++ [0].\n<tr> | + -> <ts>.\n= select:1[<ts>].\n".format(n)
+
+
+def each_program(n):
+    '''A function applied with each: to n elements'''
+    return ("define Ff[aa]\nbegin\n  = aa * 2 + 1.\nend.\n"
+            "[1..{}] | each:Ff | + -> <ts>.\n= select:1[<ts>].\n".format(n))
+
+
+def definitions_program(n):
+    '''n global definitions, each using the one before'''
+    return "va0 <- 1.\n{}= va{}.\n".format("".join("va{} <- va{} + 1.\n".format(i, i - 1) for i in range(1, n)), n - 1)
+
+
+def locals_program(n):
+    '''A function with n local definitions, each using the one before'''
+    return ("define Ff[aa]\nbegin\n  bb0 <- aa.\n{}  = bb{}.\nend.\n= Ff[1].\n"
+            .format("".join("  bb{} <- bb{} + 1.\n".format(i, i - 1) for i in range(1, n)), n - 1))
+
+
+def calls_program(n):
+    '''n functions, each calling the one before'''
+    functions = ["define Fn0[aa]\nbegin\n  = aa + 1.\nend.\n"]
+    functions += ["define Fn{}[aa]\nbegin\n  = Fn{}[aa] + 1.\nend.\n".format(i, i - 1) for i in range(1, n)]
+    return "".join(functions) + "= Fn{}[0].\n".format(n - 1)
+
+
+def recursion_program(n):
+    '''A recursive function walking a list of n cells [value, next], where
+    next is a tuple of the next cell or empty at the end'''
+    functions = ("define Id[xx]\nbegin\n  = xx.\nend.\n"
+                 "define Box[xx]\nbegin\n  != [xx].\nend.\n"
+                 "define Empty[]\nbegin\n  != [1..0].\nend.\n"
+                 "define Cons[hh, next]\nbegin\n  != [hh, next].\nend.\n"
+                 "define Next[cell]\nbegin\n  = select:2[Id[cell]].\nend.\n"
+                 "define Len[cell]\nbegin\n  Next[cell] | each:Len | + -> <rest>.\n  = 1 + select:1[<rest>].\nend.\n")
+    cells = "".join("cc{} <- Cons[{}, bb{}].\nbb{} <- Box[cc{}].\n".format(i, i, i - 1, i, i) for i in range(1, n + 1))
+    return functions + "bb0 <- Empty[].\n" + cells + "= Len[cc{}].\n".format(n)
+
+
+# name -> (program for a size, sizes)
+workloads = {
+    "concat": (concat_program, [250, 500, 1000, 2000, 4000]),
+    "concat_variable": (concat_variable_program, [250, 500, 1000, 2000, 4000]),
+    "range": (range_program, [25000, 50000, 100000, 200000, 400000]),
+    "each": (each_program, [5000, 10000, 20000, 40000, 80000]),
+    "definitions": (definitions_program, [1000, 2000, 4000, 8000, 16000]),
+    "locals": (locals_program, [1000, 2000, 4000, 8000, 16000]),
+    "calls": (calls_program, [250, 500, 1000, 2000, 4000]),
+    "recursion": (recursion_program, [250, 500, 1000, 2000, 4000]),
+}
+
+fitted_phases = ("lex_file", "parse", "optimize", "check", "run")
+
+
+def exponent(sizes, times):
+    '''The exponent k of the least squares fit of times to c * sizes ** k'''
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(time, 1e-9)) for time in times]
+    x_mean, y_mean = statistics.fmean(xs), statistics.fmean(ys)
+    return (sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+            / sum((x - x_mean) ** 2 for x in xs))
+
+
+def sweep(program, sizes, repeat, warmup):
+    '''The shortest times of the phases for every size: {phase: [time]}'''
+    shortest = {phase: [] for phase in fitted_phases}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "scaling.tupl")
+        for index, size in enumerate(sizes):
+            with open(filename, "w") as outfile:
+                outfile.write(program(size))
+            if index == 0:
+                # The first runs also load NumPy, the process pool etc.; an
+                # untimed run keeps that out of the times even without
+                # --warmup, where it would make the smallest size the slowest
+                phases.measure(filename, fitted_phases, 1, 0)
+            results = phases.measure(filename, fitted_phases, repeat, warmup)[0]
+            for phase in fitted_phases:
+                shortest[phase].append(results[phase]["min"])
+    return shortest
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--workload', action='append', choices=list(workloads),
+                            help='run only this workload (can be repeated, default: all)')
+    arg_parser.add_argument('--scale', type=float, default=1.0, help='multiply the sizes by this (default 1)')
+    arg_parser.add_argument('-n', '--repeat', type=int, default=3, help='timed runs of each phase (default 3)')
+    arg_parser.add_argument('--warmup', type=int, default=1, help='untimed runs before them (default 1)')
+    arg_parser.add_argument('--limit', type=float, default=1.2,
+                            help='flag phases whose exponent is above this (default 1.2)')
+    arg_parser.add_argument('--min-time', type=float, default=0.005,
+                            help='seconds a phase must take at the largest size to be flagged (default 0.005)')
+    arg_parser.add_argument('-o', '--output', metavar='FILE', help='write the results to FILE as JSON')
+    ns = arg_parser.parse_args()
+
+    flagged = []
+    data = {}
+    print("{:<16} {:<9} {:>24} {:>9}".format("workload", "phase", "ms at smallest..largest", "exponent"))
+    for name in ns.workload or workloads:
+        program, sizes = workloads[name]
+        sizes = [max(1, round(size * ns.scale)) for size in sizes]
+        shortest = sweep(program, sizes, ns.repeat, ns.warmup)
+        data[name] = {"sizes": sizes, "phases": {}}
+        for phase, times in shortest.items():
+            k = exponent(sizes, times)
+            super_linear = k > ns.limit and times[-1] >= ns.min_time
+            data[name]["phases"][phase] = {"times": times, "exponent": k, "super_linear": super_linear}
+            if super_linear:
+                flagged.append("{} {}".format(name, phase))
+            print("{:<16} {:<9} {:>11.2f} ..{:>11.2f} {:>9.2f}{}".format(
+                name, phase, times[0] * 1000, times[-1] * 1000, k, "  SUPER-LINEAR" if super_linear else ""))
+
+    if ns.output:
+        with open(ns.output, "w") as outfile:
+            json.dump({"limit": ns.limit, "workloads": data}, outfile, indent=1)
+            outfile.write("\n")
+    if flagged:
+        print("Growing faster than linearly:", ", ".join(flagged))
+        sys.exit(1)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+# Cold start time of the interpreter: semantics_run.py is started in a new
+# process for a program that does almost nothing, from an empty working
+# directory, and the median wall time is reported. With --compare REV the
+# same is measured for the sources of a git revision (e.g. the commit before
+# the prebuilt tables), extracted to a temporary directory.
+#
+# Also reports the files that a run wrote to the working directory or next
+# to the sources.
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+program = "aa <- 1 + 2.\n= aa * 3.\n"
+
+
+def listing(directory):
+    return {name for name in os.listdir(directory) if name != "__pycache__"}
+
+
+def measure(sources, runs):
+    '''Median wall time of running the program with the sources in the directory
+    and the names of the files a first run wrote'''
+    with tempfile.TemporaryDirectory() as workdir:
+        filename = os.path.join(workdir, "startup.tupl")
+        with open(filename, "w") as outfile:
+            outfile.write(program)
+        command = [sys.executable, os.path.join(sources, "semantics_run.py"), "-f", filename]
+
+        before = listing(workdir), listing(sources)
+        times = []
+        for run in range(runs):
+            started = time.perf_counter()
+            result = subprocess.run(command, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            times.append(time.perf_counter() - started)
+            if result.returncode != 0 or b"Return value of the program: 9" not in result.stdout:
+                raise RuntimeError(result.stdout.decode(errors="replace")[-500:])
+            if run == 0:
+                written = sorted((listing(workdir) - before[0]) | (listing(sources) - before[1]))
+        return statistics.median(times), written
+
+
+def extract(revision, directory):
+    archive = subprocess.run(["git", "-C", repo, "archive", revision], stdout=subprocess.PIPE, check=True)
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+
+
+def report(label, median, written):
+    print("{:<20} {:8.1f} ms   writes: {}".format(label, median * 1000, ", ".join(written) or "nothing"))
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-n', '--runs', type=int, default=20, help='number of runs (default 20)')
+    arg_parser.add_argument('--compare', metavar='REV', help='also measure the sources of a git revision')
+    ns = arg_parser.parse_args()
+
+    if ns.compare:
+        directory = tempfile.mkdtemp()
+        try:
+            extract(ns.compare, directory)
+            report(ns.compare, *measure(directory, ns.runs))
+        finally:
+            shutil.rmtree(directory)
+    report("working tree", *measure(repo, ns.runs))
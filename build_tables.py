@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+#
+# Regenerate the prebuilt lexer and parser tables, lextab.py and
+# parsetab.py, that tokenizer.make_lexer and tree_generation.make_parser
+# read. Run this after changing the tokens or the grammar.
+
+import os
+import sys
+
+import ply.lex
+import ply.yacc
+
+import tokenizer
+import tree_generation
+
+
+def build_tables(outputdir):
+    ply.lex.lex(module=tokenizer).writetab("lextab", outputdir)
+    for stale in ("parsetab.py", "parser.out"):
+        if os.path.exists(os.path.join(outputdir, stale)):
+            os.remove(os.path.join(outputdir, stale))
+    # yacc does not write the tables when a parsetab module it can import
+    # matches the grammar, so the import is made to fail
+    saved = sys.modules.get("parsetab")
+    sys.modules["parsetab"] = None
+    try:
+        ply.yacc.yacc(module=tree_generation, tabmodule="parsetab", outputdir=outputdir, debug=False)
+    finally:
+        sys.modules.pop("parsetab", None)
+        if saved is not None:
+            sys.modules["parsetab"] = saved
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-o', '--outputdir', default=os.path.dirname(os.path.abspath(__file__)),
+                            help='directory of the tables (default: next to this file)')
+    ns = arg_parser.parse_args()
+
+    build_tables(ns.outputdir)
+    print("Wrote lextab.py and parsetab.py to", ns.outputdir)
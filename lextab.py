@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('BEGIN', 'COLON', 'COMMA', 'COMMENT', 'DEFINE', 'DIV', 'DOT', 'DOUBLEDOT', 'DOUBLEMULT', 'DOUBLEPLUS', 'EACH', 'END', 'EQ', 'GT', 'GTEQ', 'LARROW', 'LPAREN', 'LSQUARE', 'LT', 'LTEQ', 'MINUS', 'MOD', 'MULT', 'NEWLINE', 'NOTEQ', 'NUMBER_LITERAL', 'PIPE', 'PLUS', 'RARROW', 'RES', 'RPAREN', 'RSQUARE', 'SELECT', 'STRING_LITERAL', 'WHITESPACE', 'constIDENT', 'funcIDENT', 'tupleIDENT', 'varIDENT'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive', 'comment': 'exclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_varIDENT>[a-z]\\w+)|(?P<t_STRING_LITERAL>\\"([^\\"]*)\\")|(?P<t_tupleIDENT><[a-z]+>)|(?P<t_NUMBER_LITERAL>\\d+)|(?P<t_NEWLINE>\\n+)|(?P<t_comment>\\{)|(?P<t_funcIDENT>[A-Z][a-z0-9_]+)|(?P<t_constIDENT>[A-Z]+)|(?P<t_DOUBLEDOT>\\.\\.)|(?P<t_DOUBLEMULT>\\*\\*)|(?P<t_DOUBLEPLUS>\\+\\+)|(?P<t_DOT>\\.)|(?P<t_GTEQ>>=)|(?P<t_LARROW><-)|(?P<t_LPAREN>\\()|(?P<t_LSQUARE>\\[)|(?P<t_LTEQ><=)|(?P<t_MULT>\\*)|(?P<t_NOTEQ>!=)|(?P<t_PIPE>\\|)|(?P<t_PLUS>\\+)|(?P<t_RARROW>->)|(?P<t_RPAREN>\\))|(?P<t_RSQUARE>\\])|(?P<t_COLON>:)|(?P<t_COMMA>,)|(?P<t_DIV>/)|(?P<t_EQ>=)|(?P<t_GT>>)|(?P<t_LT><)|(?P<t_MINUS>-)|(?P<t_MOD>%)', [None, ('t_varIDENT', 'varIDENT'), ('t_STRING_LITERAL', 'STRING_LITERAL'), None, ('t_tupleIDENT', 'tupleIDENT'), ('t_NUMBER_LITERAL', 'NUMBER_LITERAL'), ('t_NEWLINE', 'NEWLINE'), ('t_comment', 'comment'), (None, 'funcIDENT'), (None, 'constIDENT'), (None, 'DOUBLEDOT'), (None, 'DOUBLEMULT'), (None, 'DOUBLEPLUS'), (None, 'DOT'), (None, 'GTEQ'), (None, 'LARROW'), (None, 'LPAREN'), (None, 'LSQUARE'), (None, 'LTEQ'), (None, 'MULT'), (None, 'NOTEQ'), (None, 'PIPE'), (None, 'PLUS'), (None, 'RARROW'), (None, 'RPAREN'), (None, 'RSQUARE'), (None, 'COLON'), (None, 'COMMA'), (None, 'DIV'), (None, 'EQ'), (None, 'GT'), (None, 'LT'), (None, 'MINUS'), (None, 'MOD')])], 'comment': [('(?P<t_comment_lbrace>\\{)|(?P<t_comment_rbrace>\\})|(?P<t_comment_NEWLINE>\\n+)|(?P<t_comment_else>[^\\n{}]+)', [None, ('t_comment_lbrace', 'lbrace'), ('t_comment_rbrace', 'rbrace'), ('t_comment_NEWLINE', 'NEWLINE'), ('t_comment_else', 'else')])]}
+_lexstateignore = {'comment': ' \t\r', 'INITIAL': ' \t\r'}
+_lexstateerrorf = {'comment': 't_comment_error', 'INITIAL': 't_error'}
+_lexstateeoff = {'comment': 't_comment_eof'}
@@ -0,0 +1,84 @@
+
+# parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'BEGIN COLON COMMA COMMENT DEFINE DIV DOT DOUBLEDOT DOUBLEMULT DOUBLEPLUS EACH END EQ GT GTEQ LARROW LPAREN LSQUARE LT LTEQ MINUS MOD MULT NEWLINE NOTEQ NUMBER_LITERAL PIPE PLUS RARROW RES RPAREN RSQUARE SELECT STRING_LITERAL WHITESPACE constIDENT funcIDENT tupleIDENT varIDENTprogram : return_value DOTprogram : definitions return_value DOTdefinitions : function_or_variable_definitiondefinitions : definitions function_or_variable_definitionfunction_or_variable_definition  : function_definition\n                                        | variable_definitionsfunction_definition  : DEFINE funcIDENT function_middle return_value DOT END DOTfunction_middle : LSQUARE RSQUARE BEGINfunction_middle : LSQUARE formals RSQUARE BEGINfunction_middle : function_middle variable_definitionsformals  : varIDENTformals  : formals COMMA varIDENTreturn_value  : EQ simple_expression\n                     | NOTEQ pipe_expressionvariable_definitions  : varIDENT LARROW simple_expression DOT\n                            | constIDENT LARROW constant_expression DOT\n                            | tupleIDENT LARROW tuple_expression DOT\n                            | pipe_expression RARROW tupleIDENT DOTconstant_expression : NUMBER_LITERALconstant_expression : constIDENTpipe_expression  : pipe_expression PIPE pipe_operation\n                        | tuple_expressionpipe_operation  : MULT\n                       | PLUSpipe_operation  : funcIDENT\n                       | each_statementeach_statement  : EACH COLON funcIDENTtuple_expression  : tuple_atomtuple_expression  : tuple_expression tuple_operation tuple_atomtuple_operation : DOUBLEPLUStuple_atom  : function_calltuple_atom  : tupleIDENTtuple_atom  : LSQUARE constant_expression DOUBLEMULT constant_expression RSQUARE\n                   | LSQUARE constant_expression DOUBLEDOT  constant_expression RSQUAREtuple_atom  : LSQUARE arguments RSQUAREfunction_call : funcIDENT LSQUARE arguments RSQUARE\n                     | funcIDENT LSQUARE RSQUAREarguments : simple_expressionarguments : arguments COMMA simple_expressionatom : NUMBER_LITERAL\n            | STRING_LITERALatom : function_callatom : varIDENT\n            | constIDENTatom : LPAREN simple_expression RPARENatom : SELECT COLON constant_expression LSQUARE tuple_expression RSQUAREfactor : MINUS atom\n              | atomterm : factorterm : term MULT factor\n            | term DIV factorsimple_expression  : termsimple_expression  : term PLUS simple_expression\n                          | term MINUS simple_expression'
+    
+_lr_action_items = {'EQ':([0,3,7,8,9,21,65,85,88,93,94,95,102,109,112,],[4,4,-3,-5,-6,-4,4,-18,-10,-15,-16,-17,-8,-9,-7,]),'NOTEQ':([0,3,7,8,9,21,65,85,88,93,94,95,102,109,112,],[5,5,-3,-5,-6,-4,5,-18,-10,-15,-16,-17,-8,-9,-7,]),'DEFINE':([0,3,7,8,9,21,85,93,94,95,112,],[10,10,-3,-5,-6,-4,-18,-15,-16,-17,-7,]),'varIDENT':([0,3,4,7,8,9,18,21,24,32,39,40,51,52,53,54,65,66,78,85,88,93,94,95,102,104,109,112,],[12,12,30,-3,-5,-6,30,-4,30,30,30,30,30,30,30,30,12,91,30,-18,-10,-15,-16,-17,-8,110,-9,-7,]),'constIDENT':([0,3,4,7,8,9,18,21,24,32,39,40,41,51,52,53,54,57,65,75,76,78,85,88,93,94,95,102,109,112,],[13,13,31,-3,-5,-6,48,-4,31,31,31,31,70,31,31,31,31,70,13,70,70,31,-18,-10,-15,-16,-17,-8,-9,-7,]),'tupleIDENT':([0,3,5,7,8,9,21,36,42,43,44,65,85,88,93,94,95,99,102,109,112,],[14,14,35,-3,-5,-6,-4,58,35,35,-30,14,-18,-10,-15,-16,-17,35,-8,-9,-7,]),'LSQUARE':([0,3,5,7,8,9,11,21,38,42,43,44,65,70,72,84,85,88,93,94,95,99,102,109,112,],[18,18,18,-3,-5,-6,39,-4,66,18,18,-30,18,-20,-19,99,-18,-10,-15,-16,-17,18,-8,-9,-7,]),'funcIDENT':([0,3,4,5,7,8,9,10,18,21,24,32,37,39,40,42,43,44,51,52,53,54,65,78,85,86,88,93,94,95,99,102,109,112,],[11,11,11,11,-3,-5,-6,38,11,-4,11,11,62,11,11,11,11,-30,11,11,11,11,11,11,-18,100,-10,-15,-16,-17,11,-8,-9,-7,]),'$end':([1,19,50,],[0,-1,-2,]),'DOT':([2,15,16,17,20,22,23,25,26,27,28,29,30,31,34,35,55,58,59,60,61,62,63,68,69,70,71,72,73,74,77,79,80,81,82,83,87,92,100,105,106,108,111,],[19,-22,-28,-31,50,-13,-52,-49,-48,-40,-41,-42,-43,-44,-14,-32,-47,85,-21,-23,-24,-25,-26,-37,93,-20,94,-19,95,-29,-35,-53,-54,-50,-51,-45,101,-36,-27,-33,-34,112,-46,]),'MINUS':([4,18,23,25,26,27,28,29,30,31,32,39,40,47,48,51,52,53,54,55,68,78,81,82,83,92,111,],[24,24,52,-49,-48,-40,-41,-42,-43,-44,24,24,24,-40,-44,24,24,24,24,-47,-37,24,-50,-51,-45,-36,-46,]),'NUMBER_LITERAL':([4,18,24,32,39,40,41,51,52,53,54,57,75,76,78,],[27,47,27,27,27,27,72,27,27,27,27,72,72,72,27,]),'STRING_LITERAL':([4,18,24,32,39,40,51,52,53,54,78,],[28,28,28,28,28,28,28,28,28,28,28,]),'LPAREN':([4,18,24,32,39,40,51,52,53,54,78,],[32,32,32,32,32,32,32,32,32,32,32,]),'SELECT':([4,18,24,32,39,40,51,52,53,54,78,],[33,33,33,33,33,33,33,33,33,33,33,]),'RARROW':([6,14,15,16,17,35,59,60,61,62,63,68,74,77,92,100,105,106,],[36,-32,-22,-28,-31,-32,-21,-23,-24,-25,-26,-37,-29,-35,-36,-27,-33,-34,]),'PIPE':([6,14,15,16,17,34,35,59,60,61,62,63,68,74,77,92,100,105,106,],[37,-32,-22,-28,-31,37,-32,-21,-23,-24,-25,-26,-37,-29,-35,-36,-27,-33,-34,]),'LARROW':([12,13,14,],[40,41,42,]),'DOUBLEPLUS':([14,15,16,17,35,68,73,74,77,92,105,106,107,],[-32,44,-28,-31,-32,-37,44,-29,-35,-36,-33,-34,44,]),'RSQUARE':([16,17,23,25,26,27,28,29,30,31,35,39,46,47,48,49,55,66,67,68,70,72,74,77,79,80,81,82,83,90,91,92,96,97,98,105,106,107,110,111,],[-28,-31,-52,-49,-48,-40,-41,-42,-43,-44,-32,68,77,-40,-44,-38,-47,89,92,-37,-20,-19,-29,-35,-53,-54,-50,-51,-45,103,-11,-36,105,106,-39,-33,-34,111,-12,-46,]),'COMMA':([23,25,26,27,28,29,30,31,46,47,48,49,55,67,68,79,80,81,82,83,90,91,92,98,110,111,],[-52,-49,-48,-40,-41,-42,-43,-44,78,-40,-44,-38,-47,78,-37,-53,-54,-50,-51,-45,104,-11,-36,-39,-12,-46,]),'RPAREN':([23,25,26,27,28,29,30,31,55,56,68,79,80,81,82,83,92,111,],[-52,-49,-48,-40,-41,-42,-43,-44,-47,83,-37,-53,-54,-50,-51,-45,-36,-46,]),'PLUS':([23,25,26,27,28,29,30,31,37,47,48,55,68,81,82,83,92,111,],[51,-49,-48,-40,-41,-42,-43,-44,61,-40,-44,-47,-37,-50,-51,-45,-36,-46,]),'MULT':([23,25,26,27,28,29,30,31,37,47,48,55,68,81,82,83,92,111,],[53,-49,-48,-40,-41,-42,-43,-44,60,-40,-44,-47,-37,-50,-51,-45,-36,-46,]),'DIV':([23,25,26,27,28,29,30,31,47,48,55,68,81,82,83,92,111,],[54,-49,-48,-40,-41,-42,-43,-44,-40,-44,-47,-37,-50,-51,-45,-36,-46,]),'COLON':([33,64,],[57,86,]),'EACH':([37,],[64,]),'DOUBLEMULT':([45,47,48,],[75,-19,-20,]),'DOUBLEDOT':([45,47,48,],[76,-19,-20,]),'BEGIN':([89,103,],[102,109,]),'END':([101,],[108,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'program':([0,],[1,]),'return_value':([0,3,65,],[2,20,87,]),'definitions':([0,],[3,]),'pipe_expression':([0,3,5,65,],[6,6,34,6,]),'function_or_variable_definition':([0,3,],[7,21,]),'function_definition':([0,3,],[8,8,]),'variable_definitions':([0,3,65,],[9,9,88,]),'tuple_expression':([0,3,5,42,65,99,],[15,15,15,73,15,107,]),'tuple_atom':([0,3,5,42,43,65,99,],[16,16,16,16,74,16,16,]),'function_call':([0,3,4,5,18,24,32,39,40,42,43,51,52,53,54,65,78,99,],[17,17,29,17,29,29,29,29,29,17,17,29,29,29,29,17,29,17,]),'simple_expression':([4,18,32,39,40,51,52,78,],[22,49,56,49,69,79,80,98,]),'term':([4,18,32,39,40,51,52,78,],[23,23,23,23,23,23,23,23,]),'factor':([4,18,32,39,40,51,52,53,54,78,],[25,25,25,25,25,25,25,81,82,25,]),'atom':([4,18,24,32,39,40,51,52,53,54,78,],[26,26,55,26,26,26,26,26,26,26,26,]),'tuple_operation':([15,73,107,],[43,43,43,]),'constant_expression':([18,41,57,75,76,],[45,71,84,96,97,]),'arguments':([18,39,],[46,67,]),'pipe_operation':([37,],[59,]),'each_statement':([37,],[63,]),'function_middle':([38,],[65,]),'formals':([66,],[90,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> program","S'",1,None,None,None),
+  ('program -> return_value DOT','program',2,'p_program1','tree_generation.py',18),
+  ('program -> definitions return_value DOT','program',3,'p_program2','tree_generation.py',26),
+  ('definitions -> function_or_variable_definition','definitions',1,'p_definitions1','tree_generation.py',37),
+  ('definitions -> definitions function_or_variable_definition','definitions',2,'p_definitions2','tree_generation.py',42),
+  ('function_or_variable_definition -> function_definition','function_or_variable_definition',1,'p_function_or_variable_definition','tree_generation.py',49),
+  ('function_or_variable_definition -> variable_definitions','function_or_variable_definition',1,'p_function_or_variable_definition','tree_generation.py',50),
+  ('function_definition -> DEFINE funcIDENT function_middle return_value DOT END DOT','function_definition',7,'p_function_definition','tree_generation.py',55),
+  ('function_middle -> LSQUARE RSQUARE BEGIN','function_middle',3,'p_function_middle1','tree_generation.py',71),
+  ('function_middle -> LSQUARE formals RSQUARE BEGIN','function_middle',4,'p_function_middle2','tree_generation.py',76),
+  ('function_middle -> function_middle variable_definitions','function_middle',2,'p_function_middle3','tree_generation.py',82),
+  ('formals -> varIDENT','formals',1,'p_formals1','tree_generation.py',88),
+  ('formals -> formals COMMA varIDENT','formals',3,'p_formals2','tree_generation.py',94),
+  ('return_value -> EQ simple_expression','return_value',2,'p_return_value','tree_generation.py',100),
+  ('return_value -> NOTEQ pipe_expression','return_value',2,'p_return_value','tree_generation.py',101),
+  ('variable_definitions -> varIDENT LARROW simple_expression DOT','variable_definitions',4,'p_variable_definitions','tree_generation.py',122),
+  ('variable_definitions -> constIDENT LARROW constant_expression DOT','variable_definitions',4,'p_variable_definitions','tree_generation.py',123),
+  ('variable_definitions -> tupleIDENT LARROW tuple_expression DOT','variable_definitions',4,'p_variable_definitions','tree_generation.py',124),
+  ('variable_definitions -> pipe_expression RARROW tupleIDENT DOT','variable_definitions',4,'p_variable_definitions','tree_generation.py',125),
+  ('constant_expression -> NUMBER_LITERAL','constant_expression',1,'p_constant_expression1','tree_generation.py',154),
+  ('constant_expression -> constIDENT','constant_expression',1,'p_constant_expression2','tree_generation.py',159),
+  ('pipe_expression -> pipe_expression PIPE pipe_operation','pipe_expression',3,'p_pipe_expression','tree_generation.py',169),
+  ('pipe_expression -> tuple_expression','pipe_expression',1,'p_pipe_expression','tree_generation.py',170),
+  ('pipe_operation -> MULT','pipe_operation',1,'p_pipe_operation1','tree_generation.py',191),
+  ('pipe_operation -> PLUS','pipe_operation',1,'p_pipe_operation1','tree_generation.py',192),
+  ('pipe_operation -> funcIDENT','pipe_operation',1,'p_pipe_operation2','tree_generation.py',197),
+  ('pipe_operation -> each_statement','pipe_operation',1,'p_pipe_operation2','tree_generation.py',198),
+  ('each_statement -> EACH COLON funcIDENT','each_statement',3,'p_each_statement','tree_generation.py',208),
+  ('tuple_expression -> tuple_atom','tuple_expression',1,'p_tuple_expression1','tree_generation.py',215),
+  ('tuple_expression -> tuple_expression tuple_operation tuple_atom','tuple_expression',3,'p_tuple_expression2','tree_generation.py',219),
+  ('tuple_operation -> DOUBLEPLUS','tuple_operation',1,'p_tuple_operation','tree_generation.py',251),
+  ('tuple_atom -> function_call','tuple_atom',1,'p_tuple_atom4','tree_generation.py',255),
+  ('tuple_atom -> tupleIDENT','tuple_atom',1,'p_tuple_atom1','tree_generation.py',266),
+  ('tuple_atom -> LSQUARE constant_expression DOUBLEMULT constant_expression RSQUARE','tuple_atom',5,'p_tuple_atom2','tree_generation.py',276),
+  ('tuple_atom -> LSQUARE constant_expression DOUBLEDOT constant_expression RSQUARE','tuple_atom',5,'p_tuple_atom2','tree_generation.py',277),
+  ('tuple_atom -> LSQUARE arguments RSQUARE','tuple_atom',3,'p_tuple_atom3','tree_generation.py',323),
+  ('function_call -> funcIDENT LSQUARE arguments RSQUARE','function_call',4,'p_function_call','tree_generation.py',339),
+  ('function_call -> funcIDENT LSQUARE RSQUARE','function_call',3,'p_function_call','tree_generation.py',340),
+  ('arguments -> simple_expression','arguments',1,'p_arguments1','tree_generation.py',360),
+  ('arguments -> arguments COMMA simple_expression','arguments',3,'p_arguments2','tree_generation.py',366),
+  ('atom -> NUMBER_LITERAL','atom',1,'p_atom1','tree_generation.py',373),
+  ('atom -> STRING_LITERAL','atom',1,'p_atom1','tree_generation.py',374),
+  ('atom -> function_call','atom',1,'p_atom5','tree_generation.py',382),
+  ('atom -> varIDENT','atom',1,'p_atom2','tree_generation.py',400),
+  ('atom -> constIDENT','atom',1,'p_atom2','tree_generation.py',401),
+  ('atom -> LPAREN simple_expression RPAREN','atom',3,'p_atom3','tree_generation.py',412),
+  ('atom -> SELECT COLON constant_expression LSQUARE tuple_expression RSQUARE','atom',6,'p_atom4','tree_generation.py',429),
+  ('factor -> MINUS atom','factor',2,'p_factor','tree_generation.py',463),
+  ('factor -> atom','factor',1,'p_factor','tree_generation.py',464),
+  ('term -> factor','term',1,'p_term1','tree_generation.py',495),
+  ('term -> term MULT factor','term',3,'p_term2','tree_generation.py',513),
+  ('term -> term DIV factor','term',3,'p_term2','tree_generation.py',514),
+  ('simple_expression -> term','simple_expression',1,'p_simple_expression1','tree_generation.py',570),
+  ('simple_expression -> term PLUS simple_expression','simple_expression',3,'p_simple_expression2','tree_generation.py',587),
+  ('simple_expression -> term MINUS simple_expression','simple_expression',3,'p_simple_expression2','tree_generation.py',588),
+]
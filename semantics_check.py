@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 #
 import sys
-from semantics_common import visit_tree, SymbolData, SemData, create_scope
+from semantics_common import visit_tree, SymbolData, SemData, create_scope, builtin_functions, CheckError
 
 # Define semantic check functions
 
@@ -14,6 +14,12 @@ def check_everything(node, semdata):
     if hasattr(node, "error"):
         return node.error
 
+    # Identifier nodes are named after the identifier, which can be the
+    # same as the type of a definition node, e.g. <tuple>
+    if nodetype in ("variable", "constant", "tuple", "return_value") and not \
+            (hasattr(node, "child_identifier") or hasattr(node, "sign")):
+        return None
+
     if nodetype == "variable" :
         if node.scope not in semdata.symtbl:
             create_scope(semdata, node.scope)
@@ -34,7 +40,7 @@ def check_everything(node, semdata):
             return node.child_identifier.nodetype + "' cannot be defined again"
 
         semdata.symtbl[node.scope]["declared"].add(node.child_identifier.nodetype)
-        if node.child_value.nodetype == "evaluable":
+        if node.child_value.nodetype in ("evaluable", "Pipe expression"):
             for var in node.child_value.params:
                 if var not in semdata.symtbl[node.scope]["declared"] and var not in semdata.symtbl["global"]["declared"]:
                     return "Referencing '" + var + "' that was not declared"
@@ -44,6 +50,9 @@ def check_everything(node, semdata):
             create_scope(semdata, node.child_return.scope)
             semdata.symtbl[node.child_identifier.nodetype]["declared"] = set()
 
+        if node.child_identifier.nodetype in builtin_functions:
+            return "Function '" + node.child_identifier.nodetype + "' is a builtin function"
+
         semdata.symtbl["global"]["functions"][node.child_identifier.nodetype] = len(node.args)
 
         if node.child_identifier.nodetype in semdata.symtbl[node.scope]["declared"]:
@@ -64,41 +73,62 @@ def check_everything(node, semdata):
         for param in node.params:
             if param in semdata.symtbl["global"]["functions"]:
                 func_found = True
-                if len(node.args) != semdata.symtbl["global"]["functions"][param]:
+                arity = semdata.symtbl["global"]["functions"][param]
+                if arity is not None and len(node.args) != arity:
                     return "Number of parameters do not match when calling '" + param + "'"
 
         if not func_found:
             return "Calling unknown function"
 
+    if hasattr(node, "stage") and node.stage in ("each", "function"):
+        if node.identifier not in semdata.symtbl["global"]["functions"]:
+            return "Calling unknown function '" + node.identifier + "'"
+        arity = semdata.symtbl["global"]["functions"][node.identifier]
+        if node.stage == "each" and arity is not None and arity != 1:
+            return "Function '" + node.identifier + "' called by each must take one parameter"
 
 
-def semantic_checks(tree, semdata):
-  '''run all semantic checks'''
+
+def declare_builtins(semdata):
+  '''prepare semdata for the checks and declare the builtin functions'''
   semdata.stack = []
   semdata.stack_size = 0 # Initially stack is empty
   semdata.old_stack_sizes = [] # Initially no old stacks
+  for name, (func, arity) in builtin_functions.items():
+    semdata.symtbl["global"]["functions"][name] = arity
+    semdata.symtbl["global"]["declared"].add(name)
+
+
+def semantic_checks(tree, semdata):
+  '''run all semantic checks'''
+  declare_builtins(semdata)
   visit_tree(tree, check_everything, None, semdata)
 
 
 import tokenizer
 import tree_generation
 import tree_print
-parser = tree_generation.parser
 
 if __name__ == "__main__":
-    import argparse, codecs
+    import argparse
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-f', '--file', help='filename to process')
+    arg_parser.add_argument('--tree', nargs='?', const='unicode', choices=tree_print.formats,
+                            help='print the syntax tree (unicode by default, ascii or dot)')
+    tree_print.add_tree_arguments(arg_parser)
 
     ns = arg_parser.parse_args()
 
     if ns.file is None:
         arg_parser.print_help()
     else:
-        data = codecs.open( ns.file, encoding='utf-8' ).read()
-        ast_tree = parser.parse(data, lexer=tokenizer.lexer, debug=False)
-        ast_tree.children_definitions.reverse()
-        tree_print.treeprint(ast_tree)
+        try:
+            ast_tree = tree_generation.parser.parse(lexer=tokenizer.lex_file(ns.file), debug=False)
+        except (tokenizer.LexError, tree_generation.ParseError) as err:
+            print(err)
+            sys.exit()
+        if ns.tree or ns.tree_file:
+            tree_print.treeprint_options(ast_tree, ns.tree or "unicode", ns)
 
         semdata = SemData()
         semdata.in_function = None
@@ -109,5 +139,9 @@ if __name__ == "__main__":
         semdata.symtbl["global"]["functions"] = dict()
 
 
-        semantic_checks(ast_tree, semdata)
+        try:
+            semantic_checks(ast_tree, semdata)
+        except CheckError as err:
+            print(err)
+            sys.exit()
         print("Semantics ok:")
@@ -3,8 +3,30 @@
 
 # Generic useful stuff for semantic analysis and interpretation/code generation
 
-import sys
-from tree_print import get_childvars
+import operator
+
+
+# Arithmetic of the language, used wherever two known values are combined
+# without running the program (constant folding)
+
+binary_operators = {
+  "+": operator.add,
+  "-": operator.sub,
+  "*": operator.mul,
+  "/": operator.truediv,
+}
+
+
+# Functions that are available without a definition. The value is the
+# implementation and the number of parameters (None for any number)
+
+def builtin_print(*args):
+  print("".join(str(arg) for arg in args))
+  return list(args)
+
+builtin_functions = {
+  "Print": (builtin_print, None),
+}
 
 
 # A class for collecting data needed during semantic analysis etc.
@@ -25,6 +47,10 @@ class SymbolData:
 
 
 
+class CheckError(Exception):
+    '''A program does not pass a semantic check (raised by visit_tree)'''
+
+
 def create_scope(semdata, name):
     semdata.symtbl[name] = {}
     semdata.symtbl[name]["value"] = dict()  # identifier -> value
@@ -34,43 +60,52 @@ def create_scope(semdata, name):
 
 # The function is given the root of the tree 
 def visit_tree(node, before_func=None, after_func=None, semdata=None):
-  '''A generic visitor (which uses tree_print.get_childvars)
+  '''A generic visitor (which visits the child_fields of the nodes, see tree_nodes)
   
      Parameters:
      node: root of the (sub)tree to be traversed
      before_func: When a node is found, this function is first called,
-                then all the childrens of the node are visited recursively, then
+                then all the childrens of the node are visited (depth first, with
+                an explicit stack, so deep trees do not recurse), then
                 the second function (after_func) is called. NOTE: If function returns
-                anything except None, it's regarded as an error message, which is printed
-                out and execution is terminated. If node contains an attribute 'lineno',
+                anything except None, it's regarded as an error message, which is raised
+                as CheckError. If node has a line number (.lineno),
                 that's included in the error message.
      after_func: When a node is found, the func_before function is first called,
                 then all the childrens of the node are visited recursively, then
                 this function is called. NOTE: If function returns
-                anything except None, it's regarded as an error message, which is printed
-                out and execution is terminated. If node contains an attribute 'lineno',
+                anything except None, it's regarded as an error message, which is raised
+                as CheckError. If node has a line number (.lineno),
                 that's included in the error message.
      semdata: optional data that is passed to all functions'''
 
-  if before_func:
-    err = before_func(node, semdata)
-    if not err is None:
-      if hasattr(node, "lineno"):
-        #err = "Line " + str(node.lineno) + ": " + err
-        err = "Line {}: {}".format(node.lineno, err)
-      print(err)
-      sys.exit()
-
-  children = get_childvars(node)
-
-  for name,child in children:
-    if child:
-      visit_tree(child, before_func, after_func, semdata)
-
-  if after_func:
-    err = after_func(node, semdata)
-    if not err is None:
-      if hasattr(node, "lineno"):
-        err = "Line " + str(node.lineno) + ": " + err
-      print(err)
-      sys.exit()
+  # The stack holds the nodes still to be visited and, below the children
+  # of a node, the node itself (with True) for calling after_func
+  stack = [(node, False)]
+  while stack:
+    node, visited = stack.pop()
+    if visited:
+      err = after_func(node, semdata)
+      if not err is None:
+        if getattr(node, "lineno", None) is not None:
+          err = "Line {}: {}".format(node.lineno, err)
+        raise CheckError(str(err))
+      continue
+
+    if before_func:
+      err = before_func(node, semdata)
+      if not err is None:
+        if getattr(node, "lineno", None) is not None:
+          err = "Line {}: {}".format(node.lineno, err)
+        raise CheckError(str(err))
+
+    if after_func:
+      stack.append((node, True))
+    children = []
+    for name, label, is_list in node.child_layout:
+      child = getattr(node, name, None)
+      if is_list:
+        children.extend(element for element in child or () if element)
+      elif child:
+        children.append(child)
+    stack.extend((child, False) for child in reversed(children))
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+#
+# Lowers the expressions of the syntax tree into flat instruction lists
+# that are run by semantics_vm.
+#
+# The names in a function are resolved when it is compiled: its parameters
+# and local definitions get the slots of a frame, a list that is made for
+# every call, and are loaded by index (LOAD_LOCAL); the other names are
+# loaded from the global scope (LOAD_GLOBAL). Top-level expressions load
+# names with LOAD_NAME, from the dictionary given as the local scope (see
+# semantics_watch) or else from the global scope.
+#
+# For the VM to call a function on its own stack (see semantics_vm), the
+# code of the local definitions, each followed by a STORE_LOCAL of its slot,
+# and of the return value are joined into one instruction list; a call that
+# gives the return value becomes a TAIL_CALL.
+
+from semantics_common import builtin_functions
+from semantics_vm import LOAD_CONST, LOAD_NAME, LOAD_LOCAL, LOAD_GLOBAL, STORE_LOCAL, ADD, SUB, MUL, DIV, NEG, \
+    BUILD_LIST, BUILD_RANGE, BUILD_REPEAT, CONCAT, SELECT, CALL, TAIL_CALL, PIPE, ENTER, LEAVE, Function
+
+
+binary_ops = {"+": ADD, "-": SUB, "*": MUL, "/": DIV}
+
+
+def pipe_parts(node):
+    '''Split nested pipe nodes into the source expression and the list of
+    (kind, identifier) stages in the order they are applied'''
+    stages = []
+    while getattr(node, "operation", None) == "pipe":
+        source, stage = node.children_operands
+        stages.append((stage.stage, getattr(stage, "identifier", None)))
+        node = source
+    stages.reverse()
+    return node, stages
+
+
+def lowering(node, slots=None):
+    '''The operand expressions of node, in the order their values are
+       computed, and the instruction that uses them (None if there is none).
+
+       Nodes with an .operation attribute are lowered according to it,
+       all the others must already hold their .value. slots: identifier ->
+       slot of the function the expression is in (None at the top level).'''
+
+    operation = getattr(node, "operation", None)
+
+    if operation is None:
+        return (), (LOAD_CONST, node.value)
+
+    elif operation == "wrap":
+        return (node.child_expression,), None
+
+    elif operation == "load":
+        if slots is None:
+            return (), (LOAD_NAME, node.identifier)
+        if node.identifier in slots:
+            return (), (LOAD_LOCAL, slots[node.identifier])
+        return (), (LOAD_GLOBAL, node.identifier)
+
+    elif operation == "binop":
+        first, sign, second = node.children_operands
+        return (first, second), (binary_ops[sign.value], None)
+
+    elif operation == "neg":
+        return (node.child_operand,), (NEG, None)
+
+    elif operation == "list":
+        return node.children_elements, (BUILD_LIST, len(node.children_elements))
+
+    elif operation == "..":
+        return (node.child_start, node.child_end), (BUILD_RANGE, None)
+
+    elif operation == "**":
+        return (node.child_start, node.child_end), (BUILD_REPEAT, None)
+
+    elif operation == "concat":
+        return node.children_components, (CONCAT, len(node.children_components))
+
+    elif operation == "select":
+        return (node.child_index, node.child_container), (SELECT, None)
+
+    elif operation == "call":
+        return node.args, (CALL, (node.identifier, len(node.args)))
+
+    elif operation == "pipe":
+        # The whole chain of stages is one instruction so that the
+        # elements stream through all of them
+        source, stages = pipe_parts(node)
+        return (source,), (PIPE, (tuple(stages), node.lineno))
+
+    else:
+        raise RuntimeError("Cannot compile operation '{}'".format(operation))
+
+
+def compile_expression(node, code=None, slots=None):
+    '''Append the instructions computing the value of node to code.
+       slots: see lowering
+
+       The expressions still to be lowered are kept on a stack, each one
+       above the instruction that uses its value, so deeply nested
+       expressions do not recurse.'''
+
+    if code is None:
+        code = []
+
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            code.append(item)
+            continue
+        operands, instruction = lowering(item, slots)
+        if instruction is not None:
+            stack.append(instruction)
+        stack.extend(reversed(operands))
+
+    return code
+
+
+def compile_definition(node, slots=None):
+    '''Attach the instruction list of a definition's value to it'''
+    node.child_value.code = compile_expression(node.child_value, slots=slots)
+
+
+def resolve_function(node):
+    '''Give the parameters and the local definitions of a function the
+    slots of its frame, the parameters first, and return them (identifier
+    -> slot). A name defined more than once has one slot. Sets .slot of the
+    local definitions and .frame_size of the function.'''
+    slots = {arg: index for index, arg in enumerate(node.args)}
+    for definition in node.children_definitions:
+        definition.slot = slots.setdefault(definition.child_identifier.nodetype, len(slots))
+    node.frame_size = len(slots)
+    return slots
+
+
+def compile_function(node):
+    '''Resolve the names of a function and compile its local definitions
+    and return value'''
+    slots = resolve_function(node)
+    for local_definition in node.children_definitions:
+        compile_definition(local_definition, slots)
+    node.child_return.code = compile_expression(node.child_return, slots=slots)
+
+
+def compile_program(tree):
+    '''Compile all the definitions and return values of a program'''
+    for definition in tree.children_definitions:
+        if definition.nodetype == "function":
+            compile_function(definition)
+        elif definition.nodetype in ("variable", "constant", "tuple"):
+            compile_definition(definition)
+
+    tree.child_returns.code = compile_expression(tree.child_returns)
+
+
+def compiled_functions(functions):
+    '''Compiled form of the function table of semantics_run:
+    name -> (args, [(slot, code)], return code, frame size)'''
+    return {name: (function["args"],
+                   [(definition.slot, definition.child_value.code) for definition in function["defs"]],
+                   function["return"].code,
+                   function["frame_size"])
+            for name, function in functions.items()}
+
+
+def function_codes(function):
+    args, definitions, return_code, frame_size = function
+    return [code for slot, code in definitions] + [return_code]
+
+
+def function_body(function):
+    '''The instruction list of a whole call of a compiled function'''
+    args, definitions, return_code, frame_size = function
+    body = []
+    for slot, code in definitions:
+        body += code
+        body.append((STORE_LOCAL, slot))
+    return tail_call(body + return_code)
+
+
+def profiled_body(function):
+    '''function_body of an entry of the function table of semantics_run,
+    with every local definition timed by the profiler (ENTER and LEAVE)'''
+    body = []
+    for definition in function["defs"]:
+        body.append((ENTER, ("definition", definition.lineno, definition.child_identifier.nodetype)))
+        body += definition.child_value.code
+        body += [(LEAVE, None), (STORE_LOCAL, definition.slot)]
+    return tail_call(body + function["return"].code)
+
+
+def tail_call(body):
+    '''Turn a call that gives the return value into a TAIL_CALL'''
+    if body[-1][0] == CALL:
+        body[-1] = (TAIL_CALL, body[-1][1])
+    return body
+
+
+def vm_function(compiled, name, cache=None, recursive=False):
+    '''The semantics_vm.Function of a compiled function.
+    recursive: whether it is in recursive_functions(compiled)'''
+    args, definitions, return_code, frame_size = compiled[name]
+    return Function(function_body(compiled[name]), len(args), frame_size, cache, recursive)
+
+
+def code_calls(code):
+    '''Names of the functions that an instruction list calls'''
+    names = set()
+    for opcode, arg in code:
+        if opcode == CALL or opcode == TAIL_CALL:
+            names.add(arg[0])
+        elif opcode == PIPE:
+            stages, lineno = arg
+            names.update(identifier for kind, identifier in stages if identifier)
+    return names
+
+
+def code_globals(code):
+    '''Names of the global values that an instruction list loads'''
+    return {arg for opcode, arg in code if opcode == LOAD_GLOBAL}
+
+
+def called_functions(function):
+    '''Names of the functions that a compiled function calls'''
+    names = set()
+    for code in function_codes(function):
+        names |= code_calls(code)
+    return names
+
+
+def reachable_functions(compiled, name):
+    '''The names of the function and all the functions it calls, or None if
+    one of them is a builtin (i.e. does I/O)'''
+    reached = set()
+    todo = [name]
+    while todo:
+        current = todo.pop()
+        if current in reached:
+            continue
+        if current in builtin_functions or current not in compiled:
+            return None
+        reached.add(current)
+        todo.extend(called_functions(compiled[current]))
+    return reached
+
+
+def recursive_functions(compiled):
+    '''The names of the functions that can call themselves, directly or
+    through the functions they call: the strongly connected components of
+    the call graph (Tarjan's algorithm, with a stack instead of recursion)'''
+    callees = {name: [callee for callee in called_functions(function) if callee in compiled]
+               for name, function in compiled.items()}
+    index, lowlink = dict(), dict()
+    stack, on_stack = [], set()
+    recursive = set()
+
+    for root in compiled:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        todo = [(root, iter(callees[root]))]
+        while todo:
+            name, edges = todo[-1]
+            for callee in edges:
+                if callee not in index:
+                    index[callee] = lowlink[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    todo.append((callee, iter(callees[callee])))
+                    break
+                if callee in on_stack:
+                    lowlink[name] = min(lowlink[name], index[callee])
+            else:
+                todo.pop()
+                if todo:
+                    caller = todo[-1][0]
+                    lowlink[caller] = min(lowlink[caller], lowlink[name])
+                if lowlink[name] == index[name]:
+                    component = []
+                    while not component or component[-1] != name:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    if len(component) > 1 or name in callees[name]:
+                        recursive.update(component)
+    return recursive
+
+
+def impure_functions(compiled, redefined=()):
+    '''The names of the functions that are not pure (see is_pure), found for
+    all the functions at once'''
+    callers = dict()
+    todo = []
+    for name, function in compiled.items():
+        if reads_globals(function, redefined):
+            todo.append(name)
+        for callee in called_functions(function):
+            if callee in builtin_functions or callee not in compiled:
+                todo.append(name)
+            else:
+                callers.setdefault(callee, []).append(name)
+    impure = set()
+    while todo:
+        name = todo.pop()
+        if name not in impure:
+            impure.add(name)
+            todo.extend(callers.get(name, ()))
+    return impure
+
+
+def is_pure(compiled, name, redefined=()):
+    '''Whether calling the function can have no side effects (printing) and,
+    given the names of the global values that are defined more than once,
+    always gives the same value for the same arguments'''
+    reached = reachable_functions(compiled, name)
+    return reached is not None and not any(reads_globals(compiled[current], redefined) for current in reached)
+
+
+def reads_globals(function, names):
+    '''Whether a compiled function loads one of the global values'''
+    return any(not code_globals(code).isdisjoint(names) for code in function_codes(function))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+#
+# Caches of the results of user function calls.
+#
+# Apart from Print, function bodies have no side effects, so a call with
+# the same argument values returns the same value, unless the function
+# reads a global value that is defined again in between. Every function
+# that cannot print and reads no global value defined more than once
+# (directly or through the functions it calls, see semantics_compile.is_pure)
+# gets its own cache, keyed by the argument values and bounded by a number
+# of entries and/or an estimated size in bytes. The least recently used
+# entries are evicted first. Calls with tuples nested more than
+# max_key_depth levels deep are not cached: a recursion walking such a
+# tuple would make a key as big as the rest of the tuple for every call.
+
+import sys
+from collections import OrderedDict
+
+from semantics_tuples import VirtualTuple, RangeTuple, RepeatTuple
+from semantics_numeric import NumericTuple
+
+
+max_key_depth = 8
+
+
+class KeyTooDeep(Exception):
+    '''A value is nested too deep to be a part of a key'''
+
+
+def cache_key(value, depth):
+    '''A hashable key that is equal only for equal values of the same types.
+    Raises KeyTooDeep for tuples nested more than depth levels deep.'''
+    kind = type(value)
+    if kind is int or kind is float or kind is str:
+        return (kind, value)
+    if kind is not list:
+        if isinstance(value, RangeTuple):
+            return ("range", value.range.start, value.range.stop)
+        if isinstance(value, RepeatTuple):
+            return ("repeat", value.count, cache_key(value.item, depth))
+        if isinstance(value, NumericTuple):
+            return ("array", value.array.dtype.str, value.array.tobytes())
+        if not isinstance(value, VirtualTuple):
+            return (kind, value)
+    if not depth:
+        raise KeyTooDeep()
+    return ("list",) + tuple(cache_key(item, depth - 1) for item in value)
+
+
+def call_key(args):
+    '''The key of a call with the arguments args, or None if it is not cached'''
+    try:
+        return tuple(cache_key(arg, max_key_depth) for arg in args)
+    except KeyTooDeep:
+        return None
+
+
+def estimate_size(value):
+    '''Rough number of bytes used by a value'''
+    size = 0
+    todo = [value]
+    while todo:
+        value = todo.pop()
+        size += sys.getsizeof(value)
+        if isinstance(value, NumericTuple):
+            size += value.array.nbytes
+        elif isinstance(value, list):
+            todo.extend(value)
+    return size
+
+
+class FunctionCache:
+    '''The LRU cache of one function'''
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, estimated size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        '''Return (True, value) for a cached key, else (False, None)'''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[0]
+
+    def store(self, key, value):
+        size = estimate_size(key) + estimate_size(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while (self.max_entries is not None and len(self.entries) > self.max_entries) or \
+                (self.max_bytes is not None and self.bytes > self.max_bytes):
+            old_key, (old_value, old_size) = self.entries.popitem(last=False)
+            self.bytes -= old_size
+            self.evictions += 1
+
+
+class MemoData:
+    '''The caches of all the functions of a program run'''
+
+    def __init__(self, max_entries=4096, max_bytes=None, excluded=()):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.excluded = set(excluded)  # functions that opt out
+        self.caches = dict()  # function name -> FunctionCache, or None if not cached
+
+    def cache_for(self, name, pure):
+        '''The cache of a function, or None if it is not cached.
+        pure: function() telling whether the function has no side effects'''
+        if name not in self.caches:
+            if name in self.excluded or not pure():
+                self.caches[name] = None
+            else:
+                self.caches[name] = FunctionCache(self.max_entries, self.max_bytes)
+        return self.caches[name]
+
+    def stats(self):
+        '''Hit/miss statistics of every cached function'''
+        return {name: {"hits": cache.hits, "misses": cache.misses, "evictions": cache.evictions,
+                       "entries": len(cache.entries), "bytes": cache.bytes}
+                for name, cache in self.caches.items() if cache is not None}
+
+    def print_stats(self):
+        print("{:<20} {:>10} {:>10} {:>10} {:>10}".format("function", "hits", "misses", "evictions", "entries"))
+        for name, stats in sorted(self.stats().items()):
+            print("{:<20} {:>10} {:>10} {:>10} {:>10}".format(
+                name, stats["hits"], stats["misses"], stats["evictions"], stats["entries"]))
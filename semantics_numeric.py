@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+#
+# Optional NumPy backend for pipes over numbers.
+#
+# Chunks of a pipe that contain only ints (within the 64 bit range) or only
+# floats are handled as NumPy arrays: reductions become vectorized sums and
+# products, and each:F runs F as a vectorized kernel (semantics_vm) when F
+# only does arithmetic on its parameter. Sums and products of ints that could
+# overflow are done with python ints instead, and floats are reduced from
+# left to right, so the results are the same as without NumPy. Without
+# NumPy (or with enabled = False) nothing here is used. NumPy is imported
+# only when the first array is made, since the import takes longer than
+# running a short program.
+
+import importlib.util
+import math
+
+from semantics_tuples import VirtualTuple, RangeTuple
+
+
+numpy = None  # the module, once loaded
+enabled = importlib.util.find_spec("numpy") is not None
+
+INT_LIMIT = 2 ** 63 - 1  # largest value of numpy.int64
+EXACT_FLOAT_LIMIT = 2 ** 53  # ints up to this are exact as floats
+
+
+class NumericFallback(Exception):
+    '''The values cannot be handled exactly with NumPy'''
+
+
+def load():
+    '''Import NumPy if it is enabled. Returns whether arrays can be used.'''
+    global numpy, enabled
+    if numpy is None and enabled:
+        try:
+            import numpy as module
+        except ImportError:
+            enabled = False
+        else:
+            numpy = module
+    return enabled and numpy is not None
+
+
+def is_array(chunk):
+    return numpy is not None and isinstance(chunk, numpy.ndarray)
+
+
+def as_list(chunk):
+    return chunk.tolist() if is_array(chunk) else chunk
+
+
+def to_array(chunk):
+    '''Convert a list of only ints or only floats to an array, else None'''
+    if not chunk or not load():
+        return None
+    kind = type(chunk[0])
+    if kind is int:
+        if all(type(item) is int and -INT_LIMIT <= item <= INT_LIMIT for item in chunk):
+            return numpy.array(chunk, dtype=numpy.int64)
+    elif kind is float:
+        if all(type(item) is float for item in chunk):
+            return numpy.array(chunk, dtype=numpy.float64)
+    return None
+
+
+def int_bound(array):
+    '''The largest absolute value of an int array'''
+    if not len(array):
+        return 0
+    return max(abs(int(array.min())), abs(int(array.max())))
+
+
+def range_chunks(items, size):
+    '''Chunks of a RangeTuple as arrays, or None if it does not fit int64'''
+    if not isinstance(items, RangeTuple) or not items or not load():
+        return None
+    if max(abs(items[0]), abs(items[-1])) > INT_LIMIT:
+        return None
+    return (numpy.arange(start, min(start + size, items.range.stop), dtype=numpy.int64)
+            for start in range(items.range.start, items.range.stop, size))
+
+
+def concatenate(arrays):
+    return numpy.concatenate(arrays)
+
+
+def sequential(ufunc, array, start):
+    '''The floats of the array (after start, if not None) reduced one by one
+    from left to right, in the order of a python reduction. The sum method
+    of an array adds pairwise, which can change the last digits.'''
+    if start is not None:
+        array = numpy.concatenate((numpy.array([float(start)]), array.astype(numpy.float64)))
+    return float(ufunc.accumulate(array)[-1])
+
+
+def array_sum(array, start=None):
+    '''The sum of the elements, added to start if it is not None'''
+    if array.dtype.kind == "f" or type(start) is float:
+        return sequential(numpy.add, array, start)
+    if int_bound(array) * len(array) <= INT_LIMIT:
+        total = int(array.sum())
+    else:
+        total = sum(array.tolist())
+    return total if start is None else start + total
+
+
+def array_product(array, start=None):
+    '''The product of the elements, multiplied with start if it is not None'''
+    if array.dtype.kind == "f" or type(start) is float:
+        return sequential(numpy.multiply, array, start)
+    if not len(array):
+        product = 1
+    elif not array.all():
+        product = 0
+    elif float(numpy.log2(numpy.abs(array)).sum()) < 62:
+        product = int(array.prod())
+    else:
+        product = math.prod(array.tolist())
+    return product if start is None else start * product
+
+
+class NumericTuple(VirtualTuple):
+    '''A tuple of numbers stored as a NumPy array'''
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.array[index].tolist()
+        return self.array[index].item()
+
+    def __iter__(self):
+        for start in range(0, len(self.array), 4096):
+            yield from self.array[start:start + 4096].tolist()
+
+    def materialize(self):
+        return self.array.tolist()
+
+    def shorthand(self):
+        return "<{} numbers>".format(len(self.array))
+
+    def sum(self):
+        return array_sum(self.array)
+
+    def product(self):
+        return array_product(self.array)
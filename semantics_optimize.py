@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+#
+# Rewrites the syntax tree after parsing so that there is less to check
+# and evaluate.
+#
+# Levels:
+#   0: nothing is changed
+#   1: pass-through nodes are removed and constant operands are folded
+#   2: in addition, constants are propagated into the expressions that use
+#      them and algebraic identities (x * 1, x + 0, x - 0, [a..a]) are
+#      simplified. These assume a well typed program, e.g. "s" + 0 is
+#      reduced to "s" instead of failing at runtime.
+#
+# The closures (.eval) built by the grammar are never modified: parents
+# keep calling the closures of their original operands, so the reference
+# evaluator still sees the tree exactly as it was parsed. New evaluable
+# nodes get closures and params of their own.
+
+import copy
+
+from semantics_common import binary_operators
+from semantics_tuples import RangeTuple, RepeatTuple, VirtualTuple, join_tuples
+from semantics_pipes import run_pipe
+from tree_nodes import Expression, ListExpression
+
+
+class OptData:
+    def __init__(self, level):
+        self.level = level
+        self.constants = dict()  # constant identifier -> known value
+        self.shadowed = set()  # identifiers that hide the constants
+        self.where = "global"  # definition being optimized, for the report
+        self.collapsed = 0  # pass-through nodes removed from the definition
+        self.report = []
+
+
+def joined(nodes, separator):
+    parts = []
+    for node in nodes:
+        if parts:
+            parts.append(separator)
+        parts.append(node)
+    return parts
+
+
+def operand_parts(node):
+    while getattr(node, "operation", None) == "wrap":
+        node = node.child_expression
+    if getattr(node, "operation", None) == "binop":
+        return ["(", node, ")"]
+    return [node]
+
+
+def description_parts(node):
+    '''The text of an expression as a list of strings and operand nodes'''
+    operation = getattr(node, "operation", None)
+
+    if operation is None:
+        if isinstance(getattr(node, "value", None), VirtualTuple):
+            return [node.value.shorthand()]
+        return [repr(node.value) if hasattr(node, "value") else node.nodetype]
+    if operation == "wrap":
+        return [node.child_expression]
+    if operation == "load":
+        return [node.identifier]
+    if operation == "binop":
+        first, sign, second = node.children_operands
+        return operand_parts(first) + [" {} ".format(sign.value)] + operand_parts(second)
+    if operation == "neg":
+        return ["-", node.child_operand]
+    if operation == "list":
+        return ["["] + joined(node.children_elements, ", ") + ["]"]
+    if operation in ("..", "**"):
+        return ["[", node.child_start, " {} ".format(operation), node.child_end, "]"]
+    if operation == "concat":
+        return joined(node.children_components, " ++ ")
+    if operation == "select":
+        return ["select:", node.child_index, "[", node.child_container, "]"]
+    if operation == "call":
+        return [node.identifier, "["] + joined(node.args, ", ") + ["]"]
+    if operation == "pipe":
+        source, stage = node.children_operands
+        return [source, " | " + stage.nodetype]
+    return [node.nodetype]
+
+
+def describe(node):
+    '''Return a short source-like text of an expression'''
+    text = []
+    stack = [node]
+    while stack:
+        part = stack.pop()
+        if isinstance(part, str):
+            text.append(part)
+        else:
+            stack.extend(reversed(description_parts(part)))
+    return "".join(text)
+
+
+def is_constant(node):
+    return getattr(node, "operation", None) is None and hasattr(node, "value")
+
+
+def constant_node(nodetype, value):
+    node = Expression(nodetype)
+    node.value = value
+    return node
+
+
+def rewritten(optdata, rule, before, after):
+    optdata.report.append("{}: {}: {} -> {}".format(optdata.where, rule, describe(before), describe(after)))
+    if after.lineno is None:
+        after.lineno = before.lineno
+    return after
+
+
+def fold(optdata, node, nodetype, func, *operands):
+    '''Replace node by a constant if all its operands are constants.
+    An operation that fails (e.g. division by zero) is left to the runtime.'''
+    if not all(is_constant(operand) for operand in operands):
+        return node
+    try:
+        value = func(*[operand.value for operand in operands])
+    except Exception:
+        return node
+    return rewritten(optdata, "fold", node, constant_node(nodetype, value))
+
+
+def copy_node(node, **changes):
+    '''A shallow copy of node with some of the attributes replaced, so that
+    the lists and nodes seen by the original closures stay untouched'''
+    duplicate = copy.copy(node)
+    for name, value in changes.items():
+        setattr(duplicate, name, value)
+    return duplicate
+
+
+def simplify_binop(optdata, node, first, sign, second):
+    is_value = lambda operand, value: is_constant(operand) and type(operand.value) is int and operand.value == value
+
+    if sign == "*":
+        if is_value(second, 1):
+            return rewritten(optdata, "simplify", node, first)
+        if is_value(first, 1):
+            return rewritten(optdata, "simplify", node, second)
+    elif sign == "+":
+        if is_value(second, 0):
+            return rewritten(optdata, "simplify", node, first)
+        if is_value(first, 0):
+            return rewritten(optdata, "simplify", node, second)
+    elif sign == "-":
+        if is_value(second, 0):
+            return rewritten(optdata, "simplify", node, first)
+    return node
+
+
+def same_expression(first, second):
+    if is_constant(first) and is_constant(second):
+        return first.value == second.value
+    return getattr(first, "operation", None) == "load" and \
+        getattr(second, "operation", None) == "load" and first.identifier == second.identifier
+
+
+def expression_operands(node):
+    '''The operand expressions of node, which are optimized before it'''
+    operation = getattr(node, "operation", None)
+
+    if operation == "wrap":
+        return (node.child_expression,)
+    if operation == "neg":
+        return (node.child_operand,)
+    if operation == "binop":
+        return (node.children_operands[0], node.children_operands[2])
+    if operation == "list":
+        return node.children_elements
+    if operation in ("..", "**"):
+        return (node.child_start, node.child_end)
+    if operation == "concat":
+        return node.children_components
+    if operation == "select":
+        return (node.child_index, node.child_container)
+    if operation == "call":
+        return node.args
+    if operation == "pipe":
+        return (node.children_operands[0],)
+    return ()
+
+
+def optimize_node(node, operands, optdata):
+    '''Return the optimized replacement of an expression node, given the
+    replacements of its operands (see expression_operands)'''
+
+    operation = getattr(node, "operation", None)
+
+    if operation is None:
+        return node
+
+    if operation == "wrap":
+        inner = node.child_expression
+        optimized, = operands
+        # Function calls can only be evaluated by the reference evaluator
+        # through the wrapper, so those stay
+        if hasattr(inner, "eval") or hasattr(inner, "value"):
+            optdata.collapsed += 1
+            return optimized
+        if optimized is not inner:
+            node = copy_node(node, child_expression=optimized)
+        return node
+
+    if operation == "load":
+        if optdata.level >= 2 and node.identifier in optdata.constants \
+                and node.identifier not in optdata.shadowed:
+            return rewritten(optdata, "propagate", node,
+                             constant_node("constant_expression", optdata.constants[node.identifier]))
+        return node
+
+    if operation == "binop":
+        sign = node.children_operands[1]
+        first, second = operands
+        if first is not node.children_operands[0] or second is not node.children_operands[2]:
+            node = copy_node(node, children_operands=[first, sign, second])
+        nodetype = "term" if sign.value in ("*", "/") else "simple_expression"
+        node = fold(optdata, node, nodetype, binary_operators[sign.value], first, second)
+        if optdata.level >= 2 and not is_constant(node):
+            node = simplify_binop(optdata, node, first, sign.value, second)
+        return node
+
+    if operation == "neg":
+        operand, = operands
+        if operand is not node.child_operand:
+            node = copy_node(node, child_operand=operand)
+        return fold(optdata, node, "factor", lambda value: -1 * value, operand)
+
+    if operation == "list":
+        elements = list(operands)
+        if any(new is not old for new, old in zip(elements, node.children_elements)):
+            node = copy_node(node, children_elements=elements)
+        return fold(optdata, node, "list", lambda *values: list(values), *elements)
+
+    if operation in ("..", "**"):
+        start, end = operands
+        if start is not node.child_start or end is not node.child_end:
+            node = copy_node(node, child_start=start, child_end=end)
+        if operation == "..":
+            node = fold(optdata, node, "range_expression", RangeTuple, start, end)
+        else:
+            node = fold(optdata, node, "range_expression", RepeatTuple, start, end)
+
+        if optdata.level >= 2 and operation == ".." and not is_constant(node) and same_expression(start, end):
+            single = ListExpression("evaluable")
+            single.eval = lambda **kwargs: [start.eval(**kwargs)]
+            single.params = start.params
+            single.operation = "list"
+            single.children_elements = [start]
+            node = rewritten(optdata, "simplify", node, single)
+        return node
+
+    if operation == "concat":
+        components = list(operands)
+        if any(new is not old for new, old in zip(components, node.children_components)):
+            node = copy_node(node, children_components=components)
+        return fold(optdata, node, "tuple_expression", lambda *tuples: join_tuples(tuples), *components)
+
+    if operation == "select":
+        index, container = operands
+        if index is not node.child_index or container is not node.child_container:
+            node = copy_node(node, child_index=index, child_container=container)
+        return fold(optdata, node, "tuple_expression", lambda position, items: items[position - 1],
+                    index, container)
+
+    if operation == "call":
+        args = list(operands)
+        if any(new is not old for new, old in zip(args, node.args)):
+            node = copy_node(node, args=args)
+        return node
+
+    if operation == "pipe":
+        source, stage = node.children_operands
+        optimized, = operands
+        if optimized is not source:
+            node = copy_node(node, children_operands=[optimized, stage])
+        # Reductions have no side effects, so they can be done now
+        if stage.stage in ("sum", "product"):
+            node = fold(optdata, node, "tuple_expression",
+                        lambda items: run_pipe(items, [(stage.stage, None)], None), optimized)
+        return node
+
+    return node
+
+
+def optimize_expression(node, optdata):
+    '''Return the optimized replacement of an expression node.
+
+    The operands are optimized before the expressions using them, in the
+    same order as a recursive optimizer would, but with an explicit stack
+    so that deeply nested expressions do not recurse.'''
+
+    optimized = []  # replacements of the operands not used yet
+    stack = [(node, False)]
+    while stack:
+        node, ready = stack.pop()
+        operands = expression_operands(node)
+        if operands and not ready:
+            stack.append((node, True))
+            stack.extend((operand, False) for operand in reversed(operands))
+            continue
+        first = len(optimized) - len(operands)
+        replacements = optimized[first:]
+        del optimized[first:]
+        optimized.append(optimize_node(node, replacements, optdata))
+    return optimized[0]
+
+
+def report_collapsed(optdata):
+    if optdata.collapsed:
+        optdata.report.append("{}: collapse: {} pass-through node(s)".format(optdata.where, optdata.collapsed))
+        optdata.collapsed = 0
+
+
+def optimize_definition(node, optdata):
+    optdata.where = node.child_identifier.nodetype
+    if hasattr(node.child_value, "operation"):
+        node.child_value = optimize_expression(node.child_value, optdata)
+    report_collapsed(optdata)
+
+
+def optimize_return(node, optdata, where):
+    optdata.where = where
+    node.child_expression = optimize_expression(node.child_expression, optdata)
+    if is_constant(node.child_expression) and not hasattr(node, "value"):
+        node.value = node.child_expression.value
+        for attr in ("eval", "params", "operation", "args"):
+            if hasattr(node, attr):
+                delattr(node, attr)
+    report_collapsed(optdata)
+
+
+def optimize(tree, level=1):
+    '''Optimize a parsed program in place.
+    Returns the list of rewrites that were done.'''
+
+    optdata = OptData(level)
+    if level <= 0:
+        return optdata.report
+
+    for definition in tree.children_definitions:
+        if definition.nodetype == "function":
+            optdata.shadowed = set(definition.args) | \
+                {local.child_identifier.nodetype for local in definition.children_definitions}
+            for local in definition.children_definitions:
+                optimize_definition(local, optdata)
+            optimize_return(definition.child_return, optdata, definition.child_identifier.nodetype)
+            optdata.shadowed = set()
+
+        elif definition.nodetype in ("variable", "constant", "tuple"):
+            optimize_definition(definition, optdata)
+            if definition.nodetype == "constant" and is_constant(definition.child_value):
+                optdata.constants[definition.child_identifier.nodetype] = definition.child_value.value
+
+    optimize_return(tree.child_returns, optdata, "program")
+    return optdata.report
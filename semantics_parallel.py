@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#
+# Parallel each:F over large tuples with a process pool.
+#
+# The tuple is split into tasks of chunk_size elements that are sent to the
+# worker processes together with the compiled code of F (and of the
+# functions F calls) and the global values it reads. The results are put
+# back together in the original order. Only a bounded number of tasks is in
+# flight at a time, so the elements still stream through the pipe.
+#
+# Functions that print (directly or through the functions they call) are
+# never run in parallel, since the output would be interleaved.
+
+import os
+from collections import deque
+from itertools import islice
+
+from semantics_compile import compiled_functions, function_codes, reachable_functions, recursive_functions, \
+    vm_function
+from semantics_numeric import as_list
+from semantics_vm import execute, LOAD_GLOBAL
+
+
+class ParallelData:
+    '''Settings and the process pool of parallel each:'''
+
+    def __init__(self, workers=None, chunk_size=10000):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.executor = None
+
+    def get_executor(self):
+        if self.executor is None:
+            # Imported here since multiprocessing is slow to import
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def read_globals(compiled, names, glob):
+    '''The global values that the functions read'''
+    values = {}
+    for name in names:
+        for code in function_codes(compiled[name]):
+            for opcode, arg in code:
+                if opcode == LOAD_GLOBAL and arg in glob:
+                    values[arg] = glob[arg]
+    return values
+
+
+def call_function(functions, glob, name, args):
+    '''functions: name -> semantics_vm.Function of the function and of the
+    functions it calls'''
+    function = functions[name]
+    call = lambda callee, callee_args: call_function(functions, glob, callee, callee_args)
+    return execute(function.code, function.frame(list(args)), glob, call, None, None, functions)
+
+
+def run_task(functions, glob, name, items):
+    '''Run in a worker process: call the function for every item'''
+    recursive = recursive_functions(functions)
+    functions = {callee: vm_function(functions, callee, recursive=callee in recursive) for callee in functions}
+    return [call_function(functions, glob, name, [item]) for item in items]
+
+
+def parallel_each(functions, glob, name, paralleldata):
+    '''Return a function mapping the chunks of each:name in parallel, or
+    None if name cannot be run in parallel'''
+
+    compiled = compiled_functions(functions)
+    names = reachable_functions(compiled, name)
+    if names is None:
+        return None
+    functions = {callee: compiled[callee] for callee in names}
+    glob = read_globals(compiled, names, glob)
+
+    def tasks(chunks):
+        items = (item for chunk in chunks for item in as_list(chunk))
+        while True:
+            task = list(islice(items, paralleldata.chunk_size))
+            if not task:
+                return
+            yield task
+
+    def mapper(chunks):
+        tasks_left = tasks(chunks)
+        first = next(tasks_left, None)
+        if first is None:
+            return
+        second = next(tasks_left, None)
+        if second is None:
+            # Not worth starting the workers for one task
+            yield run_task(functions, glob, name, first)
+            return
+
+        executor = paralleldata.get_executor()
+        pending = deque()
+        for task in [first, second]:
+            pending.append(executor.submit(run_task, functions, glob, name, task))
+        for task in tasks_left:
+            pending.append(executor.submit(run_task, functions, glob, name, task))
+            if len(pending) >= 2 * paralleldata.workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    return mapper
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+#
+# Evaluation of pipe expressions (tuple | stage | stage ...).
+#
+# The stages are chained as generators that pass the elements on in chunks
+# of at most chunk_size elements, so a pipe that ends in a reduction never
+# holds more than a few chunks in memory, however long the tuple is.
+#
+# A stage is a pair (kind, identifier):
+#   ("sum", None)       | +       the tuple of the sum of the elements
+#   ("product", None)   | *       the tuple of the product of the elements
+#   ("each", "Func")    | each:F  Func called with every element
+#   ("function", "Func")| Func    Func called with all the elements as arguments
+
+import operator
+import sys
+from functools import reduce
+from itertools import islice
+
+import semantics_profile
+from semantics_profile import stage_label
+from semantics_tuples import VirtualTuple, tuple_sum, tuple_product
+from semantics_numeric import NumericTuple, NumericFallback, is_array, as_list, to_array, \
+    range_chunks, array_sum, array_product, concatenate
+
+
+chunk_size = 1024
+
+# The call function of the pipes run by the closures of the grammar
+# (function(identifier, args), set by the closure evaluator while it runs)
+closure_call = None
+
+
+def is_tuple(value):
+    return isinstance(value, (list, VirtualTuple))
+
+
+def chunks_of(items, size):
+    '''Split a tuple into lists, or into NumPy arrays when it is a range or
+    already stored as an array'''
+    if isinstance(items, NumericTuple):
+        yield from (items.array[start:start + size] for start in range(0, len(items), size))
+        return
+    arrays = range_chunks(items, size)
+    if arrays is not None:
+        yield from arrays
+        return
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def reduce_stage(chunks, func, empty, vector_func):
+    '''Reduce the elements from left to right, across the chunks'''
+    result = empty
+    first = True
+    for chunk in chunks:
+        if is_array(chunk):
+            result = vector_func(chunk, None if first else result)
+        else:
+            result = reduce(func, chunk) if first else reduce(func, chunk, result)
+        first = False
+    yield [result]
+
+
+def each_stage(chunks, identifier, call, vector, mapper):
+    '''vector: the function as a kernel over NumPy arrays, or None
+       mapper: a function mapping all the chunks at once (in parallel), or None'''
+    if vector is None and mapper is not None:
+        yield from mapper(chunks)
+        return
+    for chunk in chunks:
+        if vector is not None:
+            array = chunk if is_array(chunk) else to_array(chunk)
+            if array is not None:
+                try:
+                    yield vector(array)
+                    continue
+                except NumericFallback:
+                    pass
+        yield [call(identifier, [item]) for item in as_list(chunk)]
+
+
+def print_stage(chunks, each):
+    '''The builtin Print streams the elements through while writing them out,
+    on one line or, with each:Print, one line per element'''
+    write = sys.stdout.write
+    separator = "\n" if each else ""
+    for chunk in chunks:
+        write(separator.join(str(item) for item in as_list(chunk)) + separator)
+        yield chunk
+    if not each:
+        write("\n")
+
+
+def function_stage(chunks, identifier, call, size):
+    items = [item for chunk in chunks for item in as_list(chunk)]
+    result = call(identifier, items)
+    if not is_tuple(result):
+        result = [result]
+    yield from chunks_of(result, size)
+
+
+def collect(chunks):
+    '''Join the chunks into the resulting tuple, kept as an array if all
+    of them are arrays of the same kind'''
+    chunks = list(chunks)
+    if chunks and all(is_array(chunk) for chunk in chunks) and \
+            len({chunk.dtype.kind for chunk in chunks}) == 1:
+        return NumericTuple(chunks[0] if len(chunks) == 1 else concatenate(chunks))
+    return [item for chunk in chunks for item in as_list(chunk)]
+
+
+def run_pipe(source, stages, call, size=None, kernel=None, parallel=None, lineno=None):
+    '''Run the stages over the source tuple and return the resulting tuple.
+
+       call: function(identifier, args) that calls a user function
+       kernel: function(identifier) that returns the user function as a
+               kernel over NumPy arrays, or None if it cannot be one
+       parallel: function(identifier) that returns a function running
+                 each:identifier over the chunks in parallel, or None
+       lineno: the line of the pipe expression, for semantics_profile'''
+    return collect(pipe_chunks(source, stages, call, size, kernel, parallel, lineno))
+
+
+def pipe_elements(source, stages, call, kernel=None, parallel=None, lineno=None):
+    '''The elements of the tuple that the stages make of source, one at a
+    time, as they are computed (see run_pipe)'''
+    chunks = pipe_chunks(source, stages, call, None, kernel, parallel, lineno)
+    return (item for chunk in chunks for item in as_list(chunk))
+
+
+def pipe_chunks(source, stages, call, size=None, kernel=None, parallel=None, lineno=None):
+    '''The chained stages of run_pipe, not yet run'''
+    size = size or chunk_size
+    profiler = semantics_profile.active
+    if profiler is not None:
+        kernel = parallel = None
+
+    # Reductions straight from a virtual tuple have closed forms
+    if stages and isinstance(source, VirtualTuple) and stages[0][0] in ("sum", "product"):
+        closed_form = tuple_sum if stages[0][0] == "sum" else tuple_product
+        if profiler is None:
+            source = [closed_form(source)]
+        else:
+            source = [profiler.timed(("pipe", lineno, stage_label(*stages[0])), closed_form, source)]
+        stages = stages[1:]
+
+    chunks = chunks_of(source, size)
+
+    for kind, identifier in stages:
+        if kind == "sum":
+            chunks = reduce_stage(chunks, operator.add, 0, array_sum)
+        elif kind == "product":
+            chunks = reduce_stage(chunks, operator.mul, 1, array_product)
+        elif identifier == "Print":
+            chunks = print_stage(chunks, kind == "each")
+        elif call is None:
+            raise RuntimeError("Calling '{}' from a pipe is not supported by this evaluator".format(identifier))
+        elif kind == "each":
+            each_call = call if profiler is None else profiler.each_call(call, lineno, identifier)
+            chunks = each_stage(chunks, identifier, each_call, kernel(identifier) if kernel else None,
+                                parallel(identifier) if parallel else None)
+        else:
+            chunks = function_stage(chunks, identifier, call, size)
+        if profiler is not None:
+            chunks = profiler.stage(chunks, ("pipe", lineno, stage_label(kind, identifier)))
+
+    return chunks
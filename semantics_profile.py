@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+#
+# Counts and times the evaluations of definitions, function calls, pipe
+# stages and each: applications when semantics_run runs a program with
+# --profile or --profile-json.
+#
+# The evaluators look at the module level `active` (the running Profiler,
+# or None) once per definition, pipe or run of the VM. The calls that the
+# VM makes on its own stack open and close their entries there (see
+# semantics_vm), the other calls are timed by a wrapper around the call
+# function of the VM that is only installed when profiling. Everything is keyed by (kind, source line, identifier):
+#   ("definition", line, name)        a global or local definition
+#   ("return", line, "program")       the return value of the program
+#   ("call", line of the definition, function)
+#   ("pipe", line, "| stage")         a stage of a pipe expression
+#   ("each", line, "each:function")   one application of each:function
+#
+# The total time of an entry includes everything that ran inside it (only
+# once for recursive calls), the self time does not include the other
+# entries that ran inside it. The stages of a pipe are generators that
+# pull their elements from the stage before, so the self time of a stage
+# does not include the stages before it. While profiling, each: stages
+# call their function for every element, without NumPy or the process
+# pool, so that every application is counted.
+
+import json
+import sys
+import time
+
+
+active = None
+
+
+class ProfileEntry:
+    __slots__ = ("count", "total", "own", "depth")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.own = 0.0
+        self.depth = 0  # how many times the entry is running (recursion)
+
+
+def stage_label(kind, identifier):
+    '''Source-like name of a pipe stage'''
+    if kind == "sum":
+        return "| +"
+    if kind == "product":
+        return "| *"
+    if kind == "each":
+        return "| each:" + identifier
+    return "| " + identifier
+
+
+class Profiler:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.entries = dict()  # (kind, line, identifier) -> ProfileEntry
+        self.running = []  # [entry, start time, time of the entries inside], innermost last
+
+    def enter(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = ProfileEntry()
+        entry.depth += 1
+        self.running.append([entry, self.clock(), 0.0])
+
+    def leave(self, counted=True):
+        entry, start, inside = self.running.pop()
+        elapsed = self.clock() - start
+        entry.depth -= 1
+        if counted:
+            entry.count += 1
+        if entry.depth == 0:
+            entry.total += elapsed
+        entry.own += elapsed - inside
+        if self.running:
+            self.running[-1][2] += elapsed
+
+    def timed(self, key, func, *args):
+        '''Call func(*args) as one evaluation of the entry'''
+        self.enter(key)
+        try:
+            return func(*args)
+        finally:
+            self.leave()
+
+    def stage(self, chunks, key):
+        '''Pass the chunks of a pipe stage on, timing the work done to get
+        each of them as the stage. The pipe is counted once.'''
+        iterator = iter(chunks)
+        done = object()
+        counted = True
+        while True:
+            self.enter(key)
+            try:
+                chunk = next(iterator, done)
+            finally:
+                self.leave(counted)
+                counted = False
+            if chunk is done:
+                return
+            yield chunk
+
+    def each_call(self, call, lineno, identifier):
+        '''The call function for an each: stage, timing every application'''
+        key = ("each", lineno, "each:" + identifier)
+        return lambda name, args: self.timed(key, call, name, args)
+
+    def rows(self):
+        '''The entries as dictionaries, the largest self time first'''
+        rows = [{"line": line, "kind": kind, "identifier": identifier, "count": entry.count,
+                 "total": entry.total, "self": entry.own}
+                for (kind, line, identifier), entry in self.entries.items()]
+        rows.sort(key=lambda row: (-row["self"], row["line"] or 0, row["identifier"]))
+        return rows
+
+    def print_table(self, file=None):
+        file = file or sys.stdout
+        print("{:>6}  {:<10} {:<24} {:>9} {:>12} {:>12}".format(
+            "line", "kind", "identifier", "count", "total ms", "self ms"), file=file)
+        for row in self.rows():
+            print("{:>6}  {:<10} {:<24} {:>9} {:>12.3f} {:>12.3f}".format(
+                "-" if row["line"] is None else row["line"], row["kind"], row["identifier"],
+                row["count"], row["total"] * 1000, row["self"] * 1000), file=file)
+
+    def write_json(self, filename):
+        '''Write the entries with their times in seconds'''
+        with open(filename, "w") as outfile:
+            json.dump({"entries": self.rows()}, outfile, indent=1)
+            outfile.write("\n")
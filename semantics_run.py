@@ -1,7 +1,29 @@
 #!/usr/bin/env python3
 #
 
-from semantics_common import SymbolData, SemData, create_scope
+from collections import ChainMap
+from semantics_common import SymbolData, SemData, create_scope, builtin_functions, visit_tree, CheckError
+from semantics_check import check_everything, declare_builtins
+from semantics_compile import compile_program, compile_definition, compile_expression, compile_function, \
+    compiled_functions, code_calls, is_pure, vm_function, profiled_body, recursive_functions, impure_functions
+import semantics_vm
+import semantics_numeric
+import semantics_parallel
+import semantics_memo
+import semantics_profile
+import semantics_trace
+import semantics_pipes
+from semantics_schedule import schedule, schedule_program, used_names, ScheduleError
+from tree_nodes import FunctionCall
+
+
+class RunError(Exception):
+    '''Evaluating a global definition or the return value of the program
+    failed. lineno is the line of the definition or the return value.'''
+
+    def __init__(self, lineno, error):
+        super().__init__("{}: {}".format(type(error).__name__, error))
+        self.lineno = lineno
 
 
 def eval_var_value(node, semdata):
@@ -15,31 +37,21 @@ def eval_var_node(node, semdata):
         create_scope(semdata, node.scope)
 
     if not hasattr(node.child_value, "value"):
-        if all(param in semdata.symtbl[node.scope]["value"] for param in node.child_value.params):
+        values = semdata.symtbl[node.scope]["value"]
+        functions = semdata.symtbl.get("functions", ())
+        if all(param in values for param in node.child_value.params):
             eval_var_value(node, semdata)
+        elif node.scope == "global" and all(param in values or param in functions or param in builtin_functions
+                                            for param in node.child_value.params):
+            # A global value that calls functions
+            node.child_value.value = closure_value(semdata, node.child_value, values)
+            values[node.child_identifier.nodetype] = node.child_value.value
         else:
             semdata.symtbl[node.scope]["no_value"].add(node)
     else:
         semdata.symtbl[node.scope]["value"][node.child_identifier.nodetype] = node.child_value.value
 
 
-def re_eval_vars(semdata, scope="global"):
-    evaluated = []
-
-    iters, size = 0, 0
-    while size > 0:
-        for node in semdata.symtbl[scope]["no_value"]:
-            if eval_var_node(node, semdata):
-                evaluated.append(node)
-        semdata.symtbl[scope]["no_value"].difference_update(evaluated)
-        evaluated = []
-        size = len(semdata.symtbl[scope]["no_value"])
-        iters += 1
-
-        if iters > 5:
-            raise RuntimeError("Couldn't evaluate all the variables")
-
-
 def print_vars(semdata):
     if semdata.stack and type(semdata.stack[-1]) is dict:
 
@@ -53,45 +65,359 @@ def print_vars(semdata):
 def run_program(tree, semdata):
     semdata.old_stacks = []
     semdata.stack = []
-    eval_node(tree, semdata)
+    # Raises ScheduleError before anything is evaluated
+    with semantics_trace.span("schedule"):
+        semdata.global_order, semdata.function_orders = schedule_program(tree, builtin_functions)
+    if getattr(semdata, "evaluator", "vm") == "closure":
+        semantics_pipes.closure_call = lambda name, args: closure_call(semdata, name, args)
+        try:
+            eval_node(tree, semdata)
+        finally:
+            semantics_pipes.closure_call = None
+    else:
+        try:
+            vm_run_program(tree, semdata)
+        finally:
+            if getattr(semdata, "parallel", None) is not None:
+                semdata.parallel.shutdown()
+
+
+def vm_call(semdata, name, args):
+    if name in builtin_functions:
+        return builtin_functions[name][0](*args)
+
+    memo = getattr(semdata, "memo", None)
+    if memo is not None:
+        cache = memo.cache_for(name, lambda: is_pure(compiled_functions(semdata.symtbl["functions"]), name,
+                                                     getattr(semdata, "redefined", set())))
+        if cache is not None:
+            key = semantics_memo.call_key(args)
+            if key is not None:
+                found, value = cache.lookup(key)
+                if not found:
+                    value = vm_call_uncached(semdata, name, args)
+                    cache.store(key, value)
+                return value
+
+    return vm_call_uncached(semdata, name, args)
+
+
+def vm_call_uncached(semdata, name, args):
+    glob = semdata.symtbl["global"]["value"]
+    call, kernel, parallel, functions = semdata.vm_call, semdata.vm_kernel, semdata.vm_parallel, semdata.vm_functions
+    function = functions[name]
+    return semantics_vm.execute(function.code, function.frame(list(args)), glob, call, kernel, parallel, functions)
+
+
+class VMFunctions(dict):
+    '''The semantics_vm.Function of every user function (None for the
+    builtins), made from the function table when it is first called. When
+    profiling, their code times the local definitions (profiled_body).'''
+
+    def __init__(self, semdata):
+        super().__init__()
+        self.semdata = semdata
+        self.compiled = {}
+        self.recursive = self.impure = None
+
+    def __missing__(self, name):
+        functions = self.semdata.symtbl["functions"]
+        if name not in functions:
+            return self.setdefault(name, None)
+        if name not in self.compiled:
+            # --fused adds the functions to the table as it checks them
+            self.compiled = compiled_functions(functions)
+            self.recursive = recursive_functions(self.compiled)
+            self.impure = impure_functions(self.compiled, getattr(self.semdata, "redefined", set()))
+        memo = getattr(self.semdata, "memo", None)
+        cache = None
+        if memo is not None:
+            cache = memo.cache_for(name, lambda: name not in self.impure)
+        function = vm_function(self.compiled, name, cache, name in self.recursive)
+        if semantics_profile.active is not None:
+            function.code = profiled_body(functions[name])
+            function.profile_key = ("call", functions[name]["lineno"], name)
+        return self.setdefault(name, function)
+
+
+def profiled_definition(profiler, definition, local, glob, call, kernel, parallel, functions):
+    return profiler.timed(("definition", definition.lineno, definition.child_identifier.nodetype),
+                          semantics_vm.execute, definition.child_value.code, local, glob, call, kernel, parallel,
+                          functions)
+
+
+def instrumented_definition(node, glob, call, kernel, parallel, functions):
+    '''Evaluate a global definition under the active profiler and tracer'''
+    profiler = semantics_profile.active
+    tracer = semantics_trace.active
+    if tracer is None:
+        return profiled_definition(profiler, node, glob, glob, call, kernel, parallel, functions)
+    with tracer.span("definition", identifier=node.child_identifier.nodetype, line=node.lineno,
+                     nodes=semantics_trace.count_nodes(node.child_value)):
+        if profiler is None:
+            return semantics_vm.execute(node.child_value.code, glob, glob, call, kernel, parallel, functions)
+        return profiled_definition(profiler, node, glob, glob, call, kernel, parallel, functions)
+
+
+def vm_kernel(semdata, name):
+    if not semantics_numeric.enabled or name not in semdata.symtbl["functions"]:
+        return None
+
+    function = semdata.symtbl["functions"][name]
+    if "kernel" not in function:
+        definitions = [(definition.slot, definition.child_value.code) for definition in function["defs"]]
+        function["kernel"] = semantics_vm.vector_kernel(function["args"], definitions, function["return"].code,
+                                                        function["frame_size"])
+
+    kernel = function["kernel"]
+    if kernel is None:
+        return None
+    glob = semdata.symtbl["global"]["value"]
+    return lambda array: semantics_vm.run_kernel(kernel, array, glob)
+
+
+def vm_parallel(semdata, name):
+    if getattr(semdata, "parallel", None) is None or name not in semdata.symtbl["functions"]:
+        return None
+    return semantics_parallel.parallel_each(semdata.symtbl["functions"], semdata.symtbl["global"]["value"],
+                                            name, semdata.parallel)
+
+
+def vm_callbacks(semdata):
+    '''Set up the call, kernel and parallel functions and the table of
+    functions that the VM is given and return them. When profiling, call
+    times the calls that do not run on the stack of the VM (the builtins
+    and the calls from pipe stages).'''
+    call = semdata.vm_call = lambda name, args: vm_call(semdata, name, args)
+    kernel = semdata.vm_kernel = lambda name: vm_kernel(semdata, name)
+    parallel = semdata.vm_parallel = lambda name: vm_parallel(semdata, name)
+    functions = semdata.vm_functions = VMFunctions(semdata)
+
+    profiler = semantics_profile.active
+    if profiler is not None:
+        table = semdata.symtbl["functions"]
+        untimed = call
+        call = semdata.vm_call = lambda name, args: profiler.timed(
+            ("call", table[name]["lineno"] if name in table else None, name), untimed, name, args)
+    return call, kernel, parallel, functions
+
+
+def function_table(tree, function_orders):
+    '''The functions of a compiled program for vm_call: name -> {"defs":
+    local definitions in order, "return": return value node, "args",
+    "frame_size", "lineno"}'''
+    return {node.child_identifier.nodetype: {"defs": function_orders[node.child_identifier.nodetype],
+                                             "return": node.child_return,
+                                             "args": node.args,
+                                             "frame_size": node.frame_size,
+                                             "lineno": node.lineno, }
+            for node in tree.children_definitions if node.nodetype == "function"}
+
+
+def redefined_globals(tree):
+    '''The names of the global values that are defined more than once: the
+    functions that read them are not cached (see semantics_memo)'''
+    seen, redefined = set(), set()
+    for node in tree.children_definitions:
+        if node.nodetype in ("variable", "constant", "tuple"):
+            name = node.child_identifier.nodetype
+            (redefined if name in seen else seen).add(name)
+    return redefined
+
+
+def vm_run_program(tree, semdata):
+    symtbl = semdata.symtbl
+    symtbl["functions"] = {}
+    semdata.redefined = redefined_globals(tree)
+    glob = symtbl["global"]["value"]
+    call, kernel, parallel, functions = vm_callbacks(semdata)
+    instrumented = semantics_profile.active is not None or semantics_trace.active is not None
+
+    with semantics_trace.span("compile"):
+        compile_program(tree)
+    symtbl["functions"].update(function_table(tree, semdata.function_orders))
+
+    for node in semdata.global_order:
+        try:
+            if not instrumented:
+                glob[node.child_identifier.nodetype] = semantics_vm.execute(
+                    node.child_value.code, glob, glob, call, kernel, parallel, functions)
+            else:
+                glob[node.child_identifier.nodetype] = instrumented_definition(node, glob, call, kernel, parallel,
+                                                                              functions)
+        except Exception as err:
+            raise RunError(node.lineno, err) from err
+
+    vm_run_return(tree.child_returns, glob, call, kernel, parallel, functions)
+
+
+def vm_run_return(return_node, glob, call, kernel, parallel, functions):
+    '''Evaluate and print the return value of the program'''
+    profiler = semantics_profile.active
+    with semantics_trace.span("return", line=return_node.lineno):
+        try:
+            if profiler is None:
+                return_node.value = semantics_vm.execute(return_node.code, glob, glob, call, kernel, parallel,
+                                                         functions)
+            else:
+                return_node.value = profiler.timed(("return", return_node.lineno, "program"), semantics_vm.execute,
+                                                   return_node.code, glob, glob, call, kernel, parallel, functions)
+        except Exception as err:
+            raise RunError(return_node.lineno, err) from err
+    print("Return value of the program:", return_node.value)
+
+
+def fused_run_program(tree, semdata):
+    '''Check, compile and run the program in one pass over its definitions,
+    with the VM and the symbol table of the checks.
+
+    A value definition is evaluated as soon as it has been checked, as long
+    as the definitions before it were. The first one that can print, fails,
+    or uses a name that is not defined before it is evaluated, with all the
+    definitions after it, only when the whole program has been checked, so
+    the errors are still reported before anything is printed.'''
+    symtbl = semdata.symtbl
+    symtbl["functions"] = {}
+    semdata.redefined = redefined_globals(tree)
+    glob = symtbl["global"]["value"]
+    call, kernel, parallel, functions = vm_callbacks(semdata)
+    instrumented = semantics_profile.active is not None or semantics_trace.active is not None
+    declare_builtins(semdata)
+
+    # The names the scheduler would know about, see schedule_program
+    function_names = {node.child_identifier.nodetype for node in tree.children_definitions
+                      if node.nodetype == "function"} | set(builtin_functions)
+    global_names = {node.child_identifier.nodetype for node in tree.children_definitions
+                    if node.nodetype in ("variable", "constant", "tuple")}
+
+    semdata.global_order, semdata.function_orders = [], {}
+    compiled, pure = {}, {}
+    defined = set()
+    deferred = []  # definitions left until the whole program is checked
+    scheduled = True  # False if the scheduler has to order the definitions
+
+    for node in tree.children_definitions:
+        visit_tree(node, check_everything, None, semdata)
+        name = node.child_identifier.nodetype
+
+        if node.nodetype == "function":
+            compile_function(node)
+            try:
+                order = schedule(node.children_definitions, set(node.args) | global_names, function_names, name)
+            except ScheduleError:
+                order, scheduled = node.children_definitions, False
+            semdata.function_orders[name] = order
+            symtbl["functions"][name] = {"defs": order, "return": node.child_return, "args": node.args,
+                                         "frame_size": node.frame_size, "lineno": node.lineno, }
+            compiled.update(compiled_functions({name: symtbl["functions"][name]}))
+
+        elif node.nodetype in ("variable", "constant", "tuple"):
+            compile_definition(node)
+            semdata.global_order.append(node)
+            if scheduled and not all(used in defined or used in function_names for used in used_names(node)):
+                scheduled = False
+            defined.add(name)
+            if deferred or not scheduled:
+                deferred.append(node)
+                continue
+            calls = code_calls(node.child_value.code)
+            for called in calls - set(pure):
+                pure[called] = is_pure(compiled, called)
+            if not all(pure[called] for called in calls):
+                deferred.append(node)
+                continue
+            try:
+                if not instrumented:
+                    glob[name] = semantics_vm.execute(node.child_value.code, glob, glob, call, kernel, parallel,
+                                                      functions)
+                else:
+                    glob[name] = instrumented_definition(node, glob, call, kernel, parallel, functions)
+            except Exception:
+                # Raised again when it is evaluated after the checks
+                deferred.append(node)
+
+    visit_tree(tree.child_returns, check_everything, None, semdata)
+
+    if not scheduled:
+        # Raises the ScheduleError of the definitions, or orders them
+        semdata.global_order, semdata.function_orders = schedule_program(tree, builtin_functions)
+        glob.clear()
+        vm_run_program(tree, semdata)
+        return
+
+    for node in deferred:
+        try:
+            if not instrumented:
+                glob[node.child_identifier.nodetype] = semantics_vm.execute(
+                    node.child_value.code, glob, glob, call, kernel, parallel, functions)
+            else:
+                glob[node.child_identifier.nodetype] = instrumented_definition(node, glob, call, kernel, parallel,
+                                                                              functions)
+        except Exception as err:
+            raise RunError(node.lineno, err) from err
+
+    tree.child_returns.code = compile_expression(tree.child_returns)
+    vm_run_return(tree.child_returns, glob, call, kernel, parallel, functions)
+
+
+def closure_call(semdata, name, args):
+    '''Call a function with the closures of its definitions (the pipe
+    stages of the closure evaluator)'''
+    if name in builtin_functions:
+        return builtin_functions[name][0](*args)
+    function = semdata.symtbl["functions"][name]
+    local = dict(zip(function["args"], args))
+    values = ChainMap(local, semdata.symtbl["global"]["value"])
+    for definition in function["defs"]:
+        local[definition.child_identifier.nodetype] = closure_value(semdata, definition.child_value, values)
+    return closure_value(semdata, function["return"].child_expression, values)
+
+
+def closure_value(semdata, expression, values):
+    '''The value of an expression from its closure, with the values of its
+    params. The closures read the result of a function call from the
+    parameter named after the function, so the calls in the expression are
+    made first.'''
+    if isinstance(expression, FunctionCall):
+        return closure_call(semdata, expression.identifier,
+                            [closure_value(semdata, arg, values) for arg in expression.args])
+    if not hasattr(expression, "eval"):
+        return expression.value
+    kwargs = {key: values.get(key) for key in expression.params}
+    for name, call in expression_calls(expression).items():
+        kwargs[name] = closure_value(semdata, call, values)
+    return expression.eval(**kwargs)
+
+
+def expression_calls(expression):
+    '''The function calls in an expression, outside the arguments of other
+    calls: identifier -> FunctionCall'''
+    calls = dict()
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, FunctionCall):
+            if node.identifier in calls:
+                raise RuntimeError("Calling '{}' twice in one expression is not supported by this evaluator"
+                                   .format(node.identifier))
+            calls[node.identifier] = node
+            continue
+        for name, label, is_list in node.child_layout:
+            child = getattr(node, name, None)
+            if is_list:
+                stack.extend(child or ())
+            elif child is not None:
+                stack.append(child)
+    return calls
 
 
 def eval_func(node, semdata):
-    for param in node.params:
-        if param in semdata.symtbl["functions"]:
-            kwargs = {}
-
-            for no_value_node in semdata.symtbl[param]["no_value"]:
-                for index, func_arg in enumerate(semdata.symtbl["functions"][param]["args"]):
-                    if func_arg in no_value_node.child_value.params:
-                        argum = node.args[index] if node.args[index] != param else node.args[index+1]
-                        if not hasattr(argum, "value"):
-                            kwars = {key: semdata.symtbl[node.scope]["value"].get(key) for key in
-                                      argum.params}
-                            argum.value = argum.eval(**kwars)
-                        kwargs[func_arg] = argum.value
-
-                no_value_node.child_value.value = no_value_node.child_value.eval(**kwargs)
-                semdata.symtbl[no_value_node.scope]["value"][no_value_node.child_identifier.nodetype] = no_value_node.child_value.value
-
-            return_node = semdata.symtbl["functions"][param]["return"]
-
-            for index, func_arg in enumerate(semdata.symtbl["functions"][param]["args"]):
-                if func_arg in return_node.params:
-                    argum = node.args[index] if node.args[index] != param else node.args[index + 1]
-                    if not hasattr(argum, "value"):
-                        kwars = {key: semdata.symtbl[node.scope]["value"].get(key) for key in
-                                 argum.params}
-                        argum.value = argum.eval(**kwars)
-                    kwargs[func_arg] = argum.value
-
-            for key in set(return_node.params):
-                if key not in kwargs or kwargs[key] is None:
-                    kwargs[key] = semdata.symtbl["global"]["value"].get(key)
-                    kwargs[key] = semdata.symtbl[node.scope]["value"].get(key) or kwargs[key]
-                    kwargs[key] = semdata.symtbl[return_node.scope]["value"].get(key) or kwargs[key]
-
-            node.value = return_node.eval(**kwargs)
+    '''Evaluate the return value of the program when it calls functions.
+    Every call evaluates the local definitions and the return value of the
+    function with their closures (closure_call), so the calls in them are
+    made too.'''
+    values = ChainMap(semdata.symtbl[node.scope]["value"], semdata.symtbl["global"]["value"])
+    node.value = closure_value(semdata, node, values)
 
 
 def eval_node(node, semdata):
@@ -103,8 +429,19 @@ def eval_node(node, semdata):
         # Copy and store current stack
         semdata.old_stacks.append(semdata.stack.copy())
         for i in node.children_definitions:
-          eval_node(i, semdata)
-        eval_node(node.child_returns, semdata)
+          if i.nodetype == "function":
+            eval_node(i, semdata)
+        for i in semdata.global_order:
+          with semantics_trace.span("definition", identifier=i.child_identifier.nodetype, line=i.lineno):
+            try:
+              eval_node(i, semdata)
+            except Exception as err:
+              raise RunError(i.lineno, err) from err
+        with semantics_trace.span("return", line=node.child_returns.lineno):
+          try:
+            eval_node(node.child_returns, semdata)
+          except Exception as err:
+            raise RunError(node.child_returns.lineno, err) from err
         # Restore stack
         semdata.stack = semdata.old_stacks.pop()
         return None
@@ -119,11 +456,12 @@ def eval_node(node, semdata):
         if node.child_identifier.nodetype not in semdata.symtbl:
             create_scope(semdata, node.child_identifier.nodetype)
 
-        symtbl["functions"][node.child_identifier.nodetype] = {"defs" : node.children_definitions,
+        order = semdata.function_orders[node.child_identifier.nodetype]
+        symtbl["functions"][node.child_identifier.nodetype] = {"defs" : order,
                                                                "return" : node.child_return,
                                                                "args" : node.args, }
 
-        for i in node.children_definitions:
+        for i in order:
             eval_node(i, semdata)
 
     elif nodetype == 'return_value':
@@ -131,7 +469,6 @@ def eval_node(node, semdata):
             if any(key not in symtbl[node.scope]["value"] for key in node.params) and hasattr(node, "args"):
                 eval_func(node, semdata)
             elif all(key in symtbl[node.scope]["value"] for key in node.params):
-                re_eval_vars(semdata)
                 kwargs = {key: semdata.symtbl[node.scope]["value"].get(key) for key in node.params}
                 node.value = node.eval(**kwargs)
 
@@ -145,32 +482,161 @@ import sys
 import tokenizer
 import tree_generation
 import tree_print
-parser = tree_generation.parser
 
 import semantics_check
+import semantics_optimize
 
 if __name__ == "__main__":
-    import argparse, codecs
+    import argparse
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-f', '--file', help='filename to process')
+    arg_parser.add_argument('-e', '--evaluator', choices=['vm', 'closure'], default='vm',
+                            help='evaluate with the bytecode VM (default) or the reference closures')
+    arg_parser.add_argument('--fused', action='store_true',
+                            help='check and run the program in one pass (VM only)')
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='print the count and time of every definition, call and pipe stage (VM only)')
+    arg_parser.add_argument('--profile-json', metavar='FILE',
+                            help='write the profile to FILE as JSON (VM only)')
+    arg_parser.add_argument('--trace', metavar='FILE',
+                            help='write the time of every phase and top-level definition to FILE')
+    arg_parser.add_argument('--trace-format', choices=semantics_trace.formats, default='jsonl',
+                            help='JSON lines (default) or the trace event format of Chrome')
+    arg_parser.add_argument('--tree', nargs='?', const='unicode', choices=tree_print.formats,
+                            help='print the syntax tree (unicode by default, ascii or dot)')
+    tree_print.add_tree_arguments(arg_parser)
+    arg_parser.add_argument('-O', '--optimize', type=int, choices=[0, 1, 2], default=1,
+                            help='optimization level of the syntax tree (default 1)')
+    arg_parser.add_argument('--optimizer-report', action='store_true',
+                            help='print the rewrites done by the optimizer')
+    arg_parser.add_argument('--no-numpy', action='store_true',
+                            help='do not use NumPy arrays for tuples of numbers')
+    arg_parser.add_argument('--no-memo', action='store_true', help='do not cache the results of function calls')
+    arg_parser.add_argument('--no-memo-for', action='append', default=[], metavar='FUNCTION',
+                            help='do not cache the results of this function (can be repeated)')
+    arg_parser.add_argument('--memo-entries', type=int, default=4096,
+                            help='maximum number of cached results per function (default 4096)')
+    arg_parser.add_argument('--memo-bytes', type=int,
+                            help='maximum estimated size of the cached results per function')
+    arg_parser.add_argument('--memo-stats', action='store_true', help='print the cache statistics')
+    arg_parser.add_argument('--parallel', action='store_true',
+                            help='run each: stages of functions that do not print in a process pool')
+    arg_parser.add_argument('--workers', type=int, help='number of worker processes (default: CPU count)')
+    arg_parser.add_argument('--parallel-chunk', type=int, default=10000,
+                            help='number of elements sent to a worker at a time (default 10000)')
+    arg_parser.add_argument('--max-depth', type=int, default=semantics_vm.max_depth,
+                            help='largest number of nested function calls (default {})'.format(semantics_vm.max_depth))
+    arg_parser.add_argument('--watch', action='store_true',
+                            help='evaluate the file again on every change, updating only what changed')
+    arg_parser.add_argument('--watch-interval', type=float, default=0.5,
+                            help='seconds between checks of the file in --watch mode (default 0.5)')
 
     ns = arg_parser.parse_args()
+    semantics_vm.max_depth = ns.max_depth
 
     if ns.file is None:
         arg_parser.print_help()
-    else:
-        data = codecs.open( ns.file, encoding='utf-8' ).read()
-        ast_tree = parser.parse(data, lexer=tokenizer.lexer, debug=False)
-        ast_tree.children_definitions.reverse()
-
+    elif ns.fused and ns.evaluator != "vm":
+        arg_parser.error("--fused runs the program with the VM")
+    elif (ns.profile or ns.profile_json) and (ns.evaluator != "vm" or ns.watch):
+        arg_parser.error("--profile and --profile-json profile a run with the VM")
+    elif ns.trace and ns.watch:
+        arg_parser.error("--trace traces a single run")
+    elif ns.watch and ns.evaluator != "vm":
+        arg_parser.error("--watch evaluates the program with the VM")
+    elif ns.watch and ns.fused:
+        arg_parser.error("--watch checks and evaluates the changed statements itself")
+    elif ns.watch:
+        import semantics_watch
         semdata = SemData()
-        semdata.in_function = None
-        tree_print.treeprint(ast_tree)
-        print("Semantics ok.")
-        create_scope(semdata, "global")
-        semdata.symtbl["global"]["declared"] = set()
-        semdata.symtbl["global"]["functions"] = dict()
-
-        semantics_check.semantic_checks(ast_tree, semdata)
-        run_program(ast_tree, semdata)
-        print("Program finished.")
+        if ns.no_numpy:
+            semantics_numeric.enabled = False
+        if ns.parallel:
+            semdata.parallel = semantics_parallel.ParallelData(ns.workers, ns.parallel_chunk)
+        if not ns.no_memo:
+            semdata.memo = semantics_memo.MemoData(ns.memo_entries, ns.memo_bytes, ns.no_memo_for)
+        try:
+            semantics_watch.watch(ns.file, semdata, ns.optimize, ns.watch_interval)
+        finally:
+            if ns.parallel:
+                semdata.parallel.shutdown()
+    else:
+        if ns.trace:
+            semantics_trace.active = semantics_trace.Tracer()
+        try:
+            # The file is mapped to memory and read while it is lexed
+            with semantics_trace.span("lex") as args:
+                tokens = tokenizer.lex_file(ns.file)
+                if args is not None:
+                    args["tokens"] = len(tokens)
+            with semantics_trace.span("parse") as args:
+                ast_tree = tree_generation.parser.parse(lexer=tokens, debug=False)
+            if args is not None:
+                args["nodes"] = semantics_trace.count_nodes(ast_tree)
+
+            with semantics_trace.span("optimize", level=ns.optimize) as args:
+                rewrites = semantics_optimize.optimize(ast_tree, ns.optimize)
+            if args is not None:
+                args.update(rewrites=len(rewrites), nodes=semantics_trace.count_nodes(ast_tree))
+            if ns.optimizer_report:
+                for rewrite in rewrites:
+                    print(rewrite)
+
+            semdata = SemData()
+            semdata.in_function = None
+            semdata.evaluator = ns.evaluator
+            if ns.no_numpy:
+                semantics_numeric.enabled = False
+            if ns.parallel:
+                semdata.parallel = semantics_parallel.ParallelData(ns.workers, ns.parallel_chunk)
+            if not ns.no_memo:
+                semdata.memo = semantics_memo.MemoData(ns.memo_entries, ns.memo_bytes, ns.no_memo_for)
+            if ns.tree or ns.tree_file:
+                with semantics_trace.span("print_tree"):
+                    tree_print.treeprint_options(ast_tree, ns.tree or "unicode", ns)
+            print("Semantics ok.")
+            with semantics_trace.span("scope", scope="global"):
+                create_scope(semdata, "global")
+                semdata.symtbl["global"]["declared"] = set()
+                semdata.symtbl["global"]["functions"] = dict()
+
+            if ns.profile or ns.profile_json:
+                semantics_profile.active = semantics_profile.Profiler()
+            try:
+                if ns.fused:
+                    try:
+                        with semantics_trace.span("fused", definitions=len(ast_tree.children_definitions)):
+                            fused_run_program(ast_tree, semdata)
+                    finally:
+                        if ns.parallel:
+                            semdata.parallel.shutdown()
+                else:
+                    with semantics_trace.span("check", definitions=len(ast_tree.children_definitions)):
+                        semantics_check.semantic_checks(ast_tree, semdata)
+                    run_program(ast_tree, semdata)
+            except ScheduleError as err:
+                print(err)
+                sys.exit(1)
+            except RunError as err:
+                print("{}:{}: {}".format(ns.file, err.lineno, err))
+                sys.exit(1)
+            if ns.memo_stats and not ns.no_memo:
+                semdata.memo.print_stats()
+            if semantics_profile.active is not None:
+                if ns.profile:
+                    semantics_profile.active.print_table()
+                if ns.profile_json:
+                    semantics_profile.active.write_json(ns.profile_json)
+                semantics_profile.active = None
+            print("Program finished.")
+        except tokenizer.LexError as err:
+            print("{}:{}: {}".format(ns.file, err.lineno, err.message))
+            sys.exit(1)
+        except (tree_generation.ParseError, CheckError) as err:
+            print(err)
+            sys.exit()
+        finally:
+            # Also when the checks stop the program
+            if semantics_trace.active is not None:
+                semantics_trace.active.write(ns.trace, ns.trace_format)
+                semantics_trace.active = None
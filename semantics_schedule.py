@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Evaluation order of the definitions of a scope.
+#
+# A dependency graph is built from the .params of the definitions: a name
+# used by a definition refers to the latest earlier definition of that name
+# in the same scope, else to a name known from outside the scope (function
+# parameters, globals), else to a later definition in the scope. The
+# definitions are then sorted topologically, keeping the source order
+# whenever the dependencies allow it, so every definition is evaluated
+# exactly once and after everything it needs.
+
+import heapq
+
+
+class ScheduleError(Exception):
+    '''A definition uses an unknown name or depends on itself'''
+
+
+def used_names(node):
+    return getattr(node.child_value, "params", [])
+
+
+def schedule(definitions, known=(), functions=(), scope="global"):
+    '''Return the definitions in dependency order.
+
+       known: names whose values come from outside the scope
+       functions: names of functions, which appear in .params of calls
+       Raises ScheduleError listing all missing names or cyclic definitions.'''
+
+    positions = dict()  # name -> indices of its definitions
+    for index, node in enumerate(definitions):
+        positions.setdefault(node.child_identifier.nodetype, []).append(index)
+
+    dependencies = [set() for node in definitions]
+    missing = []
+
+    for index, node in enumerate(definitions):
+        for name in used_names(node):
+            defined = positions.get(name, [])
+            earlier = [position for position in defined if position < index]
+            later = [position for position in defined if position > index]
+            if earlier:
+                dependencies[index].add(earlier[-1])
+            elif name in known or name in functions:
+                continue
+            elif later:
+                dependencies[index].add(later[0])
+            else:
+                missing.append("'{}' used by '{}'".format(name, node.child_identifier.nodetype))
+
+    if missing:
+        raise ScheduleError("Unknown names in scope '{}': {}".format(scope, ", ".join(missing)))
+
+    dependents = [[] for node in definitions]
+    waiting = [len(deps) for deps in dependencies]
+    for index, deps in enumerate(dependencies):
+        for dependency in deps:
+            dependents[dependency].append(index)
+
+    ready = [index for index, count in enumerate(waiting) if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        index = heapq.heappop(ready)
+        order.append(definitions[index])
+        for dependent in dependents[index]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                heapq.heappush(ready, dependent)
+
+    if len(order) < len(definitions):
+        cyclic = [definitions[index].child_identifier.nodetype
+                  for index, count in enumerate(waiting) if count > 0]
+        raise ScheduleError("Cyclic definitions in scope '{}': {}".format(scope, ", ".join(cyclic)))
+
+    return order
+
+
+def schedule_program(tree, builtins=(), known=()):
+    '''Schedule the global scope and the scope of every function.
+       known: names of global values that are not defined by the program
+       Returns (global definitions in order, {function name: local definitions in order})'''
+
+    functions = {node.child_identifier.nodetype: node for node in tree.children_definitions
+                 if node.nodetype == "function"}
+    function_names = set(functions) | set(builtins)
+    global_definitions = [node for node in tree.children_definitions
+                          if node.nodetype in ("variable", "constant", "tuple")]
+    global_names = {node.child_identifier.nodetype for node in global_definitions} | set(known)
+
+    global_order = schedule(global_definitions, set(known), function_names)
+    function_orders = {name: schedule(node.children_definitions, set(node.args) | global_names,
+                                      function_names, name)
+                       for name, node in functions.items()}
+    return global_order, function_orders
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+#
+# Trace spans of a run of semantics_run.py with --trace FILE: the phases
+# (lex, parse, optimize, print_tree, scope, check, schedule, compile), the
+# evaluation of every top-level definition and of the return value. Every
+# span records its wall time, the CPU time of the process and counts such
+# as the number of tokens or nodes.
+#
+# The spans are written as JSON lines, one object per span in the order
+# they started:
+#   {"name": "parse", "start": 0.0012, "wall": 0.35, "cpu": 0.34, "depth": 0,
+#    "args": {"nodes": 81234}}
+# (times in seconds from the start of the trace), or in the trace event
+# format of Chrome (chrome://tracing, Perfetto) with --trace-format chrome.
+#
+# The code looks at the module level `active` (the running Tracer, or None);
+# span() does nothing when no tracer is active.
+
+import contextlib
+import json
+import os
+import time
+
+from tree_nodes import ASTnode
+
+
+active = None
+
+no_span = contextlib.nullcontext()
+
+formats = ("jsonl", "chrome")
+
+
+def span(name, **args):
+    '''A span of the active tracer, or a context that does nothing'''
+    if active is None:
+        return no_span
+    return active.span(name, **args)
+
+
+def count_nodes(node):
+    '''The number of nodes in the tree under node'''
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, ASTnode):
+            continue
+        count += 1
+        for name, label, is_list in node.child_layout:
+            child = getattr(node, name, None)
+            if is_list:
+                stack.extend(child or ())
+            elif child is not None:
+                stack.append(child)
+    return count
+
+
+class Tracer:
+    def __init__(self, clock=time.perf_counter, cpu_clock=time.process_time):
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.origin = clock()
+        self.spans = []  # {"name", "start", "wall", "cpu", "depth", "args"}, in the order they ended
+        self.depth = 0
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        '''Record the code in the with block as a span. The with statement
+        gives the args dictionary, so counts known only at the end can be
+        added to it.'''
+        start, cpu = self.clock(), self.cpu_clock()
+        self.depth += 1
+        try:
+            yield args
+        finally:
+            self.depth -= 1
+            self.spans.append({"name": name, "start": start - self.origin, "wall": self.clock() - start,
+                               "cpu": self.cpu_clock() - cpu, "depth": self.depth, "args": args})
+
+    def started(self):
+        return sorted(self.spans, key=lambda record: record["start"])
+
+    def write(self, filename, outformat="jsonl"):
+        with open(filename, "w") as outfile:
+            if outformat == "chrome":
+                pid = os.getpid()
+                events = [{"name": record["name"], "cat": "tupl", "ph": "X", "pid": pid, "tid": 1,
+                           "ts": record["start"] * 1e6, "dur": record["wall"] * 1e6,
+                           "args": dict(record["args"], cpu_ms=record["cpu"] * 1000)}
+                          for record in self.started()]
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, outfile)
+                outfile.write("\n")
+            else:
+                for record in self.started():
+                    outfile.write(json.dumps(record) + "\n")
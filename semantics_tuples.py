@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+#
+# Tuples of the language are python lists. The tuples written as
+# [a..b] and [n ** x] are instead represented by the virtual tuples below,
+# which only store their bounds. They behave like lists (indexing, len,
+# iteration, comparison, ++) and are turned into real lists only when an
+# operation needs one, e.g. concatenation.
+
+import math
+import operator
+from collections.abc import Sequence
+from functools import reduce
+
+
+class VirtualTuple(Sequence):
+    '''Common list behaviour of the virtual tuples'''
+
+    def materialize(self):
+        return list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, VirtualTuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __add__(self, other):
+        if isinstance(other, (list, VirtualTuple)):
+            return join_tuples((self, other))
+        return NotImplemented
+
+    def __radd__(self, other):
+        if isinstance(other, list):
+            return join_tuples((other, self))
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+
+class RangeTuple(VirtualTuple):
+    '''The tuple [first..last]'''
+
+    def __init__(self, first, last):
+        self.range = range(first, last + 1)
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.range[index])
+        return self.range[index]
+
+    def __iter__(self):
+        return iter(self.range)
+
+    def __contains__(self, item):
+        return item in self.range
+
+    def shorthand(self):
+        return "[{}..{}]".format(self.range.start, self.range.stop - 1)
+
+    def sum(self):
+        count = len(self.range)
+        if not count:
+            return 0
+        return count * (self.range[0] + self.range[-1]) // 2
+
+    def product(self):
+        if not self.range:
+            return 1
+        first, last = self.range[0], self.range[-1]
+        if first <= 0 <= last:
+            return 0
+        if first > 0:
+            return math.factorial(last) // math.factorial(first - 1)
+        magnitude = math.factorial(-first) // math.factorial(-last - 1)
+        return magnitude if len(self.range) % 2 == 0 else -magnitude
+
+
+class RepeatTuple(VirtualTuple):
+    '''The tuple [count ** item], i.e. item repeated count times'''
+
+    def __init__(self, count, item):
+        self.count = max(operator.index(count), 0)
+        self.item = item
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.item] * len(range(self.count)[index])
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("tuple index out of range")
+        return self.item
+
+    def __iter__(self):
+        for _ in range(self.count):
+            yield self.item
+
+    def materialize(self):
+        return [self.item] * self.count
+
+    def shorthand(self):
+        return "[{} ** {!r}]".format(self.count, self.item)
+
+    def sum(self):
+        if not self.count:
+            return 0
+        return self.item * self.count
+
+    def product(self):
+        return self.item ** self.count
+
+
+def join_tuples(tuples):
+    '''The tuples of a chain of ++ joined into one list, copying every
+    element once'''
+    result = []
+    for items in tuples:
+        if not isinstance(items, (list, VirtualTuple)):
+            raise TypeError('can only concatenate list (not "{}") to list'.format(type(items).__name__))
+        result.extend(items)
+    return result
+
+
+def tuple_sum(items):
+    '''Reduce a tuple with +, in closed form for the virtual tuples'''
+    if isinstance(items, VirtualTuple):
+        return items.sum()
+    if not items:
+        return 0
+    return reduce(operator.add, items)
+
+
+def tuple_product(items):
+    '''Reduce a tuple with *, in closed form for the virtual tuples'''
+    if isinstance(items, VirtualTuple):
+        return items.product()
+    return reduce(operator.mul, items, 1)
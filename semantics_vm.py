@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+#
+# A stack based virtual machine for the instruction lists produced by
+# semantics_compile. Every instruction is a pair (opcode, argument).
+#
+# Calls of user functions given to execute as Functions do not recurse in
+# Python: the VM keeps the instructions and the frame of every caller on a
+# stack of its own and continues with the code of the callee. All the calls
+# share one value stack, where each one leaves its return value for its
+# caller. A TAIL_CALL, a call that gives the return value of a function,
+# replaces the frame of the running call instead, so it returns straight to
+# the caller of the running call. The each: and function stages of pipes
+# that call recursive functions are run the same way (see PipeCalls), since
+# an each: over an empty tuple is how a recursion in TupLang ends.
+#
+# When profiling, the calls made on the stack of the VM open and close
+# their entries of the running semantics_profile.Profiler themselves: a
+# call opens its entry in CALL or TAIL_CALL and the entries of the running
+# call are closed when it returns, so a tail call is timed inside the call
+# it replaces. ENTER and LEAVE time the local definitions in the code made
+# by semantics_compile.profiled_body.
+
+from semantics_tuples import RangeTuple, RepeatTuple, join_tuples
+from semantics_pipes import run_pipe, pipe_elements, is_tuple
+from semantics_memo import call_key
+import semantics_profile
+from semantics_profile import stage_label
+import semantics_numeric
+from semantics_numeric import NumericFallback, INT_LIMIT, EXACT_FLOAT_LIMIT, int_bound
+
+
+LOAD_CONST = 0
+LOAD_NAME = 1
+ADD = 2
+SUB = 3
+MUL = 4
+DIV = 5
+NEG = 6
+BUILD_LIST = 7
+BUILD_RANGE = 8
+BUILD_REPEAT = 9
+CONCAT = 10
+SELECT = 11
+CALL = 12
+PIPE = 13
+LOAD_LOCAL = 14
+LOAD_GLOBAL = 15
+STORE_LOCAL = 16
+TAIL_CALL = 17
+ENTER = 18
+LEAVE = 19
+
+opnames = {
+    LOAD_CONST: "LOAD_CONST",
+    LOAD_NAME: "LOAD_NAME",
+    ADD: "ADD",
+    SUB: "SUB",
+    MUL: "MUL",
+    DIV: "DIV",
+    NEG: "NEG",
+    BUILD_LIST: "BUILD_LIST",
+    BUILD_RANGE: "BUILD_RANGE",
+    BUILD_REPEAT: "BUILD_REPEAT",
+    CONCAT: "CONCAT",
+    SELECT: "SELECT",
+    CALL: "CALL",
+    PIPE: "PIPE",
+    LOAD_LOCAL: "LOAD_LOCAL",
+    LOAD_GLOBAL: "LOAD_GLOBAL",
+    STORE_LOCAL: "STORE_LOCAL",
+    TAIL_CALL: "TAIL_CALL",
+    ENTER: "ENTER",
+    LEAVE: "LEAVE",
+}
+
+
+# The largest number of calls that can wait for the calls they made
+max_depth = 1000000
+
+
+# Instructions that can be run on whole arrays by execute_vector
+vector_ops = {LOAD_CONST, LOAD_LOCAL, LOAD_GLOBAL, ADD, SUB, MUL, DIV, NEG}
+
+
+def disassemble(code):
+    '''Return a human readable listing of an instruction list'''
+    lines = []
+    for index, (opcode, arg) in enumerate(code):
+        if arg is None:
+            lines.append("{:4} {}".format(index, opnames[opcode]))
+        else:
+            lines.append("{:4} {:<13}{!r}".format(index, opnames[opcode], arg))
+    return "\n".join(lines)
+
+
+class Function:
+    '''A user function as execute calls it.
+
+       code: the instruction list of a whole call (semantics_compile.function_body)
+       arity: the number of parameters
+       frame_size: the number of slots in a frame of the function
+       cache: the semantics_memo.FunctionCache of its results, or None
+       recursive: whether it can call itself, directly or through other
+                  functions
+       profile_key: the key of its calls in the profile, when profiling'''
+
+    __slots__ = ("code", "padding", "cache", "recursive", "profile_key")
+
+    def __init__(self, code, arity, frame_size, cache=None, recursive=False, profile_key=None):
+        self.code = code
+        self.padding = [None] * (frame_size - arity)  # the slots of the local definitions
+        self.cache = cache
+        self.recursive = recursive
+        self.profile_key = profile_key
+
+    def frame(self, args):
+        '''The frame of a call, made of the list of its arguments'''
+        args += self.padding
+        return args
+
+
+class PipeCalls:
+    '''A pipe stage that calls a recursive function (each:F calls F with
+    every element, F with all of them), left to execute to call it. The
+    stages before it are read an element at a time, so their output is
+    still interleaved with the calls as in run_pipe, but the stages after
+    it only start when all the calls have returned.'''
+
+    __slots__ = ("function", "each", "items", "results", "stages", "lineno", "args", "key",
+                 "profiler", "profile_keys")
+
+    def __init__(self, source, stages, index, lineno, call, kernel, parallel, functions):
+        kind, identifier = stages[index]
+        self.function = functions[identifier]
+        self.each = kind == "each"
+        self.profiler = semantics_profile.active
+        if self.profiler is not None:
+            # The stage is timed until value() is called
+            self.profiler.enter(("pipe", lineno, stage_label(kind, identifier)))
+            self.profile_keys = [self.function.profile_key]
+            if self.each:
+                self.profile_keys.insert(0, ("each", lineno, "each:" + identifier))
+        items = pipe_elements(source, stages[:index], call, kernel, parallel, lineno)
+        self.items = items if self.each else iter([list(items)])
+        self.results = []
+        self.stages = stages[index + 1:]
+        self.lineno = lineno
+        self.args = self.key = None  # of the next call (see advance)
+
+    def advance(self):
+        '''Find the next call whose result is not cached: set .args and .key
+        (the key of its result in the cache, or None) and return True, or
+        return False when there are no calls left'''
+        cache = self.function.cache
+        for item in self.items:
+            args = [item] if self.each else item
+            if cache is None:
+                self.args = args
+                return True
+            key = call_key(args)
+            if key is None:
+                self.args, self.key = args, None
+                return True
+            found, value = cache.lookup(key)
+            if not found:
+                self.args, self.key = args, key
+                return True
+            if self.profiler is not None:
+                for _ in range(self.enter()):
+                    self.profiler.leave()
+            self.results.append(value)
+        return False
+
+    def enter(self):
+        '''Open the profile entries of the next call and return how many
+        there are'''
+        if self.profiler is None:
+            return 0
+        for key in self.profile_keys:
+            self.profiler.enter(key)
+        return len(self.profile_keys)
+
+    def value(self):
+        '''The tuple made by the stage'''
+        if self.profiler is not None:
+            self.profiler.leave()
+        if self.each:
+            return self.results
+        result = self.results[0]
+        return result if is_tuple(result) else [result]
+
+
+def recursive_stage(stages, functions):
+    '''The index of the first stage that calls a recursive function, or None'''
+    for index, (kind, identifier) in enumerate(stages):
+        if identifier is not None and kind != "sum" and kind != "product":
+            function = functions[identifier]
+            if function is not None and function.recursive:
+                return index
+    return None
+
+
+def pipe_calls(source, stages, lineno, call, kernel, parallel, functions):
+    '''Run the stages over source up to the first call of a recursive
+    function that execute has to make. Returns (the PipeCalls of the call,
+    None), or (None, the resulting tuple) if there is no such call.'''
+    while True:
+        index = recursive_stage(stages, functions)
+        if index is None:
+            return None, run_pipe(source, stages, call, kernel=kernel, parallel=parallel, lineno=lineno)
+        pipe = PipeCalls(source, stages, index, lineno, call, kernel, parallel, functions)
+        if pipe.advance():
+            return pipe, None
+        source, stages = pipe.value(), pipe.stages
+
+
+def execute(code, local, glob, call=None, kernel=None, parallel=None, functions=None):
+    '''Run an instruction list and return the value left on the stack.
+
+       local: identifier -> value of the innermost scope (LOAD_NAME), or
+              the frame of a function call, a list indexed by the slots
+              of its parameters and local definitions (LOAD_LOCAL)
+       glob: identifier -> value of the global scope (LOAD_NAME, LOAD_GLOBAL)
+       call: function(name, args) used for CALL instructions
+       kernel: function(name) giving vectorized functions for PIPE
+       parallel: function(name) giving parallel each: mappers for PIPE
+       functions: name -> Function (None for the builtins) of the user
+                  functions that are called on the stack of the VM rather
+                  than with call, or None to call them all with call'''
+
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    # (instructions, frame, stores, entries, PipeCalls or None) of the calls that wait
+    callers = []
+    instructions = iter(code)
+    # (cache, key) pairs that the result of the running call is stored with
+    stores = None
+    profiler = semantics_profile.active
+    # The number of profile entries opened for the running call
+    entries = 0
+
+    while True:
+        for opcode, arg in instructions:
+            if opcode == LOAD_CONST:
+                push(arg)
+            elif opcode == LOAD_LOCAL:
+                push(local[arg])
+            elif opcode == LOAD_GLOBAL:
+                push(glob[arg])
+            elif opcode == STORE_LOCAL:
+                local[arg] = pop()
+            elif opcode == LOAD_NAME:
+                if arg in local:
+                    push(local[arg])
+                else:
+                    push(glob[arg])
+            elif opcode == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif opcode == SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif opcode == MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif opcode == DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
+            elif opcode == NEG:
+                stack[-1] = -1 * stack[-1]
+            elif opcode == BUILD_LIST:
+                if arg:
+                    items = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    items = []
+                push(items)
+            elif opcode == BUILD_RANGE:
+                end = pop()
+                stack[-1] = RangeTuple(stack[-1], end)
+            elif opcode == BUILD_REPEAT:
+                item = pop()
+                stack[-1] = RepeatTuple(stack[-1], item)
+            elif opcode == CONCAT:
+                items = stack[-arg:]
+                del stack[-arg:]
+                push(join_tuples(items))
+            elif opcode == SELECT:
+                container = pop()
+                stack[-1] = container[stack[-1] - 1]
+            elif opcode == CALL or opcode == TAIL_CALL:
+                name, argc = arg
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                function = functions[name] if functions is not None else None
+                if function is None:
+                    push(call(name, args))
+                    continue
+                if profiler is not None:
+                    profiler.enter(function.profile_key)
+                key = None
+                if function.cache is not None:
+                    key = call_key(args)
+                    if key is not None:
+                        found, value = function.cache.lookup(key)
+                        if found:
+                            push(value)
+                            if profiler is not None:
+                                profiler.leave()
+                            continue
+                if opcode == CALL:
+                    if len(callers) >= max_depth:
+                        raise RecursionError("More than {} nested calls".format(max_depth))
+                    callers.append((instructions, local, stores, entries, None))
+                    stores = None
+                    entries = 0
+                if profiler is not None:
+                    entries += 1
+                if key is not None:
+                    # After a tail call, the result is also that of the running call
+                    if stores is None:
+                        stores = [(function.cache, key)]
+                    else:
+                        stores.append((function.cache, key))
+                instructions, local = iter(function.code), function.frame(args)
+                break
+            elif opcode == PIPE:
+                stages, lineno = arg
+                if functions is None or recursive_stage(stages, functions) is None:
+                    stack[-1] = run_pipe(stack[-1], stages, call, kernel=kernel, parallel=parallel, lineno=lineno)
+                    continue
+                pipe, value = pipe_calls(pop(), stages, lineno, call, kernel, parallel, functions)
+                if pipe is None:
+                    push(value)
+                    continue
+                if len(callers) >= max_depth:
+                    raise RecursionError("More than {} nested calls".format(max_depth))
+                callers.append((instructions, local, stores, entries, pipe))
+                instructions, local = iter(pipe.function.code), pipe.function.frame(pipe.args)
+                stores = None if pipe.key is None else [(pipe.function.cache, pipe.key)]
+                entries = pipe.enter()
+                break
+            elif opcode == ENTER:
+                profiler.enter(arg)
+            elif opcode == LEAVE:
+                profiler.leave()
+            else:
+                raise RuntimeError("Unknown opcode {}".format(opcode))
+
+        else:
+            # The running code has ended: return its value to the caller
+            if stores is not None:
+                for cache, key in stores:
+                    cache.store(key, stack[-1])
+            if entries:
+                for _ in range(entries):
+                    profiler.leave()
+            if not callers:
+                return stack[-1]
+            instructions, local, stores, entries, pipe = callers.pop()
+            if pipe is None:
+                continue
+            pipe.results.append(pop())
+            if not pipe.advance():
+                pipe, value = pipe_calls(pipe.value(), pipe.stages, pipe.lineno, call, kernel, parallel, functions)
+                if pipe is None:
+                    push(value)
+                    continue
+            callers.append((instructions, local, stores, entries, pipe))
+            instructions, local = iter(pipe.function.code), pipe.function.frame(pipe.args)
+            stores = None if pipe.key is None else [(pipe.function.cache, pipe.key)]
+            entries = pipe.enter()
+
+
+def vector_kernel(args, definitions, return_code, frame_size):
+    '''Check whether a function can be run for a whole array at once.
+
+       args: the parameters of the function
+       definitions: (slot, instruction list) of the local definitions
+       return_code: the instruction list of the return value
+       frame_size: the number of slots in a frame of the function
+       Returns the kernel description or None.'''
+
+    if len(args) != 1:
+        return None
+    for slot, code in definitions + [(None, return_code)]:
+        for opcode, arg in code:
+            if opcode not in vector_ops:
+                return None
+            if opcode == LOAD_CONST and type(arg) not in (int, float):
+                return None
+    return (frame_size, definitions, return_code)
+
+
+def checked(value, bound):
+    if bound is not None and bound > INT_LIMIT:
+        raise NumericFallback()
+    return value, bound
+
+
+def execute_vector(code, frame, glob):
+    '''Run an instruction list on (value, bound) pairs, where the bound of
+    an int value is its largest absolute value and None for floats. The
+    frame holds such pairs.'''
+    stack = []
+    for opcode, arg in code:
+        if opcode == LOAD_CONST:
+            stack.append(checked(arg, abs(arg) if type(arg) is int else None))
+        elif opcode == LOAD_LOCAL:
+            stack.append(frame[arg])
+        elif opcode == LOAD_GLOBAL:
+            value = glob[arg]
+            if type(value) is int:
+                stack.append(checked(value, abs(value)))
+            elif type(value) is float:
+                stack.append((value, None))
+            else:
+                raise NumericFallback()
+        elif opcode == NEG:
+            value, bound = stack.pop()
+            stack.append((-value, bound))
+        else:
+            (second, second_bound), (first, first_bound) = stack.pop(), stack.pop()
+            is_int = first_bound is not None and second_bound is not None
+            if opcode == ADD:
+                stack.append(checked(first + second, first_bound + second_bound if is_int else None))
+            elif opcode == SUB:
+                stack.append(checked(first - second, first_bound + second_bound if is_int else None))
+            elif opcode == MUL:
+                stack.append(checked(first * second, first_bound * second_bound if is_int else None))
+            else:
+                for bound in (first_bound, second_bound):
+                    if bound is not None and bound > EXACT_FLOAT_LIMIT:
+                        raise NumericFallback()
+                numpy = semantics_numeric.numpy
+                if numpy.any(numpy.asarray(second) == 0):
+                    raise NumericFallback()
+                stack.append((numpy.true_divide(first, second), None))
+    return stack[-1]
+
+
+def run_kernel(kernel, array, glob):
+    '''Apply a kernel from vector_kernel to every element of an array'''
+    frame_size, definitions, return_code = kernel
+    bound = int_bound(array) if array.dtype.kind == "i" else None
+    frame = [None] * frame_size
+    frame[0] = (array, bound)
+    for slot, code in definitions:
+        frame[slot] = execute_vector(code, frame, glob)
+    value, bound = execute_vector(return_code, frame, glob)
+
+    numpy = semantics_numeric.numpy
+    if numpy.ndim(value) == 0:
+        value = numpy.full(len(array), value, dtype=numpy.int64 if bound is not None else numpy.float64)
+    return value
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+#
+# Incremental re-evaluation of a program file that is being edited.
+#
+# The source is split into its top-level statements (definitions ending in
+# "." and define ... end. blocks). Every statement is parsed, checked and
+# compiled on its own and kept together with its value between updates. On
+# a change only the statements whose text is new are parsed again. A
+# statement is checked and evaluated again when its text is new, when one of
+# the names it uses now refers to a different statement, or when a statement
+# it depends on was updated. The names used by a function body refer to the
+# last global definition of that name.
+#
+# Function bodies read the global values when they are called, so when a
+# function reads a global variable that is defined more than once, the whole
+# program is evaluated again in order (the parsed statements are still
+# reused).
+
+import os
+import re
+import time
+
+import tokenizer
+import tree_generation
+import semantics_optimize
+import semantics_memo
+import semantics_vm
+import semantics_run
+from semantics_common import SemData, create_scope, visit_tree, builtin_functions, CheckError
+from semantics_check import check_everything
+from semantics_compile import compile_program, code_calls
+from semantics_schedule import schedule
+
+
+class WatchError(Exception):
+    '''The program cannot be updated'''
+
+
+# The only tokens that matter for finding the end of a statement
+boundary_pattern = re.compile(r'\{|"[^"]*"|<[a-z]+>|\.\.|\.|\bend\b')
+space_pattern = re.compile(r'\s*')
+define_pattern = re.compile(r'define\b')
+brace_pattern = re.compile(r'[{}]')
+
+
+def skip_comment(source, pos):
+    '''Position after the (nested) comment starting at pos'''
+    level = 0
+    for match in brace_pattern.finditer(source, pos):
+        level += 1 if match.group() == "{" else -1
+        if level == 0:
+            return match.end()
+    return len(source)
+
+
+def skip_space(source, pos):
+    '''Position of the first character after pos that is not space or comment'''
+    while True:
+        pos = space_pattern.match(source, pos).end()
+        if not source.startswith("{", pos):
+            return pos
+        pos = skip_comment(source, pos)
+
+
+def split_statements(source):
+    '''Split a program into its top-level statements: [(text, first line)]'''
+    statements = []
+    pos = counted = 0
+    line = 1
+
+    while True:
+        start = pos = skip_space(source, pos)
+        if start >= len(source):
+            return statements
+        line += source.count("\n", counted, start)
+        counted = start
+        in_function = define_pattern.match(source, start) is not None
+        after_end = False
+
+        while True:
+            match = boundary_pattern.search(source, pos)
+            if match is None:
+                statements.append((source[start:], line))
+                return statements
+            token, pos = match.group(), match.end()
+            if token == "{":
+                pos = skip_comment(source, match.start())
+            elif token == "." and (not in_function or after_end):
+                statements.append((source[start:pos], line))
+                break
+            else:
+                after_end = token == "end"
+
+
+def used_names(node):
+    '''Names an expression uses: its params and the functions of its pipe
+    stages, which are not in the params'''
+    return list(getattr(node, "params", [])) + sorted(code_calls(node.code))
+
+
+class Statement:
+    '''A top-level statement with everything known about it'''
+
+    def __init__(self, text, line):
+        self.text = text
+        self.line = line
+        self.node = None  # definition or return value node
+        self.kind = None  # "function", "value" or "return"
+        self.name = None
+        self.uses = []  # names used in the global scope
+        self.deps = None  # name -> Statement (None for builtins and unknown names)
+        self.previous = None  # earlier statement defining the same name
+        self.function = None  # entry of the function table
+        self.value = None
+
+    def parse(self, level):
+        is_return = self.text.lstrip().startswith(("=", "!="))
+        program = tree_generation.new_parser().parse(self.text if is_return else self.text + "\n= 0.",
+                                                     lexer=tokenizer.new_lexer(self.line), debug=False)
+        if program is None or len(program.children_definitions) != (0 if is_return else 1):
+            raise WatchError("Line {}: expected one statement".format(self.line))
+
+        semantics_optimize.optimize(program, min(level, 1))
+        compile_program(program)
+
+        if is_return:
+            self.node, self.kind = program.child_returns, "return"
+            self.uses = list(dict.fromkeys(used_names(self.node)))
+            return
+        self.node = program.children_definitions[0]
+        self.name = self.node.child_identifier.nodetype
+        if self.node.nodetype == "function":
+            self.kind = "function"
+            local = set(self.node.args) | {definition.child_identifier.nodetype
+                                           for definition in self.node.children_definitions}
+            used = [name for definition in self.node.children_definitions
+                    for name in used_names(definition.child_value)]
+            used += used_names(self.node.child_return)
+            self.uses = list(dict.fromkeys(name for name in used if name not in local))
+            self.function = {"defs": schedule(self.node.children_definitions, set(self.node.args) | set(self.uses),
+                                              builtin_functions, self.name),
+                             "return": self.node.child_return,
+                             "args": self.node.args,
+                             "frame_size": self.node.frame_size, }
+        else:
+            self.kind = "value"
+            self.uses = list(dict.fromkeys(used_names(self.node.child_value)))
+
+
+class WatchData:
+    '''The statements and values of a program between updates'''
+
+    def __init__(self, semdata, level=1):
+        self.semdata = semdata
+        self.level = level
+        self.statements = []
+        self.stale = True  # the values must be computed from scratch
+        self.last = dict()  # name -> last value statement defining it
+
+        create_scope(semdata, "global")
+        semdata.symtbl["functions"] = dict()
+        semdata.vm_call = lambda name, args: semantics_run.vm_call(semdata, name, args)
+        semdata.vm_kernel = lambda name: semantics_run.vm_kernel(semdata, name)
+        semdata.vm_parallel = lambda name: semantics_run.vm_parallel(semdata, name)
+
+    def reuse(self, source):
+        '''New statement list, reusing the statements whose text did not change'''
+        old = dict()
+        for statement in self.statements:
+            old.setdefault(statement.text, []).append(statement)
+        statements, parsed = [], 0
+        for text, line in split_statements(source):
+            if old.get(text):
+                statement = old[text].pop(0)
+            else:
+                statement = Statement(text, line)
+                statement.parse(self.level)
+                parsed += 1
+            statements.append(statement)
+
+        returns = [index for index, statement in enumerate(statements) if statement.kind == "return"]
+        if returns != [len(statements) - 1]:
+            raise WatchError("The program must end with its return value")
+        return statements, parsed
+
+    def resolve(self, statements):
+        '''Set the dependencies of every statement. Returns the statements whose
+        dependencies changed and the new last definitions.'''
+        functions = {statement.name: statement for statement in statements if statement.kind == "function"}
+        last, earlier, declared = dict(), dict(), dict()
+        for statement in statements:
+            if statement.kind == "value":
+                last[statement.name] = statement
+
+        changed = []
+        for statement in statements:
+            deps = dict()
+            for name in statement.uses:
+                if name in functions:
+                    deps[name] = functions[name]
+                elif statement.kind == "function":
+                    deps[name] = last.get(name)
+                elif name in earlier:
+                    deps[name] = earlier[name]
+                elif name in last:
+                    raise WatchError("Line {}: '{}' is used before it is defined".format(statement.line, name))
+                else:
+                    deps[name] = None  # a builtin, or an error found by the checks
+            previous = declared.get(statement.name)
+            if deps != statement.deps or previous is not statement.previous:
+                changed.append(statement)
+            statement.deps, statement.previous = deps, previous
+            if statement.kind == "value":
+                earlier[statement.name] = statement
+            if statement.name is not None:
+                declared[statement.name] = statement
+        return changed, last
+
+    def check(self, statements, dirty):
+        '''Check the statements that changed with the declarations before them'''
+        semdata = SemData()
+        create_scope(semdata, "global")
+        declared = semdata.symtbl["global"]["declared"] = set(builtin_functions)
+        arities = semdata.symtbl["global"]["functions"] = {name: arity for name, (func, arity)
+                                                            in builtin_functions.items()}
+        semdata.stack, semdata.stack_size, semdata.old_stack_sizes = [], 0, []
+
+        for statement in statements:
+            if statement in dirty:
+                visit_tree(statement.node, check_everything, None, semdata)
+            elif statement.kind == "function":
+                declared.add(statement.name)
+                arities[statement.name] = len(statement.node.args)
+            elif statement.kind == "value":
+                declared.add(statement.name)
+
+    def evaluate(self, statements, dirty, last, full):
+        symtbl = self.semdata.symtbl
+        glob = symtbl["global"]["value"]
+        call, kernel, parallel = self.semdata.vm_call, self.semdata.vm_kernel, self.semdata.vm_parallel
+
+        symtbl["functions"] = {statement.name: statement.function for statement in statements
+                               if statement.kind == "function"}
+
+        memo = getattr(self.semdata, "memo", None)
+        if memo is not None and dirty:
+            self.semdata.memo = semantics_memo.MemoData(memo.max_entries, memo.max_bytes, memo.excluded)
+        # Made again from the new function table and caches
+        functions = self.semdata.vm_functions = semantics_run.VMFunctions(self.semdata)
+
+        if full:
+            glob.clear()
+            for statement in statements:
+                if statement.kind == "value":
+                    statement.value = semantics_vm.execute(statement.node.child_value.code, glob, glob,
+                                                           call, kernel, parallel, functions)
+                    glob[statement.name] = statement.value
+                elif statement.kind == "return":
+                    statement.value = semantics_vm.execute(statement.node.code, glob, glob,
+                                                           call, kernel, parallel, functions)
+            return
+
+        for name in set(self.last) - set(last):
+            del glob[name]
+        for statement in statements:
+            if statement.kind == "function":
+                continue
+            if statement in dirty:
+                local = {name: dep.value for name, dep in statement.deps.items()
+                         if dep is not None and dep.kind == "value"}
+                code = statement.node.code if statement.kind == "return" else statement.node.child_value.code
+                statement.value = semantics_vm.execute(code, local, glob, call, kernel, parallel, functions)
+            if statement.kind == "value" and last[statement.name] is statement and \
+                    (statement in dirty or self.last.get(statement.name) is not statement):
+                glob[statement.name] = statement.value
+
+    def update(self, source):
+        '''Bring the program up to date with source.
+        Returns (return value, number of statements parsed, number evaluated, number of statements)'''
+        statements, parsed = self.reuse(source)
+        saved = [(statement, statement.deps, statement.previous) for statement in statements]
+        try:
+            return self.refresh(statements, parsed)
+        except BaseException:
+            for statement, deps, previous in saved:
+                statement.deps, statement.previous = deps, previous
+            raise
+
+    def refresh(self, statements, parsed):
+        changed, last = self.resolve(statements)
+
+        dependents = dict()
+        for statement in statements:
+            for dep in statement.deps.values():
+                if dep is not None:
+                    dependents.setdefault(id(dep), []).append(statement)
+        dirty = set()
+        todo = list(changed)
+        while todo:
+            statement = todo.pop()
+            if statement not in dirty:
+                dirty.add(statement)
+                todo.extend(dependents.get(id(statement), []))
+
+        self.check(statements, dirty)
+
+        counts = dict()
+        for statement in statements:
+            if statement.kind == "value":
+                counts[statement.name] = counts.get(statement.name, 0) + 1
+        self.semdata.redefined = {name for name, count in counts.items() if count > 1}
+        redefined_read = any(name in self.semdata.redefined for statement in statements
+                             if statement.kind == "function" for name in statement.uses)
+        full = self.stale or (redefined_read and bool(dirty))
+
+        self.stale = True
+        self.evaluate(statements, dirty, last, full)
+        self.statements, self.last, self.stale = statements, last, False
+
+        evaluated = len(statements) if full else len(dirty)
+        return statements[-1].value, parsed, evaluated, len(statements)
+
+
+def watch(filename, semdata, level=1, interval=0.5):
+    '''Evaluate the file again whenever it changes, until interrupted'''
+    watchdata = WatchData(semdata, level)
+    modified = None
+    try:
+        while True:
+            try:
+                stamp = os.stat(filename).st_mtime_ns
+            except OSError:
+                stamp = None
+            if stamp is not None and stamp != modified:
+                modified = stamp
+                with open(filename, encoding='utf-8') as infile:
+                    source = infile.read()
+                started = time.perf_counter()
+                try:
+                    value, parsed, evaluated, total = watchdata.update(source)
+                except (tokenizer.LexError, tree_generation.ParseError, CheckError) as err:
+                    print(err)
+                except Exception as err:
+                    print("Error:", err)
+                else:
+                    print("Return value of the program:", value)
+                    print("({} parsed, {} evaluated of {} statements in {:.3f} s)".format(
+                        parsed, evaluated, total, time.perf_counter() - started))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# Checks of the reference closure evaluator (semantics_run.py -e closure)
+# against the VM.
+#
+#   python -m pytest -q test_closure.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+local_call_program = '''define Inc[aa]
+begin
+  = aa + 1.
+end.
+
+define Dbl[aa]
+begin
+  bb <- Inc[aa].
+  = bb * 2.
+end.
+
+= Dbl[3].
+'''
+
+recursive_program = '''define Id[xx]
+begin
+  = xx.
+end.
+
+define Box[xx]
+begin
+  != [xx].
+end.
+
+define Empty[]
+begin
+  != [1..0].
+end.
+
+define Cons[hh, next]
+begin
+  != [hh, next].
+end.
+
+define Next[cell]
+begin
+  = select:2[Id[cell]].
+end.
+
+define Len[cell]
+begin
+  Next[cell] | each:Len | + -> <rest>.
+  = 1 + select:1[<rest> ++ [0]].
+end.
+
+bb0 <- Empty[].
+cc1 <- Cons[1, bb0].
+bb1 <- Box[cc1].
+cc2 <- Cons[2, bb1].
+bb2 <- Box[cc2].
+cc3 <- Cons[3, bb2].
+= Len[cc3].
+'''
+
+
+def run(path, *options):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantics_run.py")
+    return subprocess.run([sys.executable, script, *options, "-f", str(path)], capture_output=True, text=True)
+
+
+@pytest.mark.parametrize("program, value", [(local_call_program, "8"), (recursive_program, "3")])
+def test_closures_give_the_value_of_the_vm(tmp_path, program, value):
+    path = tmp_path / "program.tupl"
+    path.write_text(program, encoding="utf-8")
+    for options in [(), ("-e", "closure")]:
+        result = run(path, *options)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "Return value of the program: {}\n".format(value) in result.stdout
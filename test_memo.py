@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+#
+# Checks of the caches of function results (semantics_memo.py).
+#
+#   python -m pytest -q test_memo.py
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import tupl
+
+
+redefined_program = '''xx <- 1.
+define Fun[aa] begin = aa + xx. end.
+yy <- Fun[1].
+xx <- 10.
+zz <- Fun[1].
+!= Print[yy, zz].
+'''
+
+
+def test_function_reading_a_redefined_global_is_not_cached():
+    assert tupl.compile(redefined_program).run() == [2, 11]
+
+
+@pytest.mark.parametrize("options", [[], ["--fused"]])
+def test_function_reading_a_redefined_global_is_not_cached_when_run(tmp_path, options):
+    path = tmp_path / "redefined.tupl"
+    path.write_text(redefined_program, encoding="utf-8")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantics_run.py")
+    result = subprocess.run([sys.executable, script, *options, "-f", str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Return value of the program: [2, 11]" in result.stdout
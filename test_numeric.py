@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+#
+# Checks of the NumPy backend of the pipes (semantics_numeric.py).
+#
+#   python -m pytest -q test_numeric.py
+
+from functools import reduce
+import operator
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+import semantics_numeric
+from semantics_pipes import reduce_stage
+
+
+semantics_numeric.load()
+floats = [1 / item for item in range(1, 10001)]
+
+
+def chunks_of(items, size):
+    return [numpy.array(items[start:start + size]) for start in range(0, len(items), size)]
+
+
+def test_float_sum_is_sequential():
+    expected = reduce(operator.add, floats)
+    assert semantics_numeric.array_sum(numpy.array(floats)) == expected
+    assert next(reduce_stage(chunks_of(floats, 4096), operator.add, 0, semantics_numeric.array_sum)) == [expected]
+
+
+def test_float_product_is_sequential():
+    factors = [1 + item for item in floats]
+    expected = reduce(operator.mul, factors)
+    assert semantics_numeric.array_product(numpy.array(factors)) == expected
+    assert next(reduce_stage(chunks_of(factors, 4096), operator.mul, 1, semantics_numeric.array_product)) == [expected]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+# Checks that programs parsed at the same time from several threads, each
+# with a lexer of tokenizer.new_lexer and a parser of
+# tree_generation.new_parser, give the same printed trees and line numbers
+# as when they are parsed one after the other (as in
+# benchmarks/parse_stress.py).
+#
+#   python -m pytest -q test_parse.py
+
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import tokenizer
+import tree_generation
+import tree_print
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+import generate
+
+
+def lines(tree):
+    '''The line numbers of the nodes of the tree in preorder'''
+    found = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        found.append(getattr(node, "lineno", None))
+        stack.extend(reversed([child for label, child in tree_print.get_childvars(node) if child is not None]))
+    return found
+
+
+def printed(tree):
+    out = io.StringIO()
+    tree_print.treeprint(tree, "unicode", out)
+    return out.getvalue()
+
+
+def parse_with_lexer(source):
+    '''The printed tree and the line numbers, or the error'''
+    lexer = tokenizer.new_lexer()
+    lexer.input(source)
+    try:
+        tree = tree_generation.new_parser().parse(lexer=lexer, debug=False)
+    except (tokenizer.LexError, tree_generation.ParseError) as err:
+        return repr(err)
+    return printed(tree), lines(tree)
+
+
+def parse_with_token_arrays(source):
+    try:
+        tree = tree_generation.parse_source(source)
+    except (tokenizer.LexError, tree_generation.ParseError) as err:
+        return repr(err)
+    return printed(tree), lines(tree)
+
+
+def programs():
+    '''Generated programs with different comment nesting, so the comment
+    level of the lexers changes, and programs with errors'''
+    sources = [generate.generate(definitions=20, seed=index, comments=index % 3) for index in range(24)]
+    sources.append("aa <- 1.\n{ {\n} }\nbb <- aa +.\n= bb.\n")
+    sources.append("aa <- 1.\nbb <- aa $ 2.\n= bb.\n")
+    return sources
+
+
+def check_concurrent(parse):
+    sources = programs()
+    expected = [parse(source) for source in sources]
+    interval = sys.getswitchinterval()
+    # Switch between the threads more often than by default
+    sys.setswitchinterval(1e-5)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            for round_number in range(3):
+                assert list(pool.map(parse, sources)) == expected
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_concurrent_parses_with_new_lexers():
+    check_concurrent(parse_with_lexer)
+
+
+def test_concurrent_parses_with_token_arrays():
+    check_concurrent(parse_with_token_arrays)
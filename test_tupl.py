@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+# Checks of the library interface of tupl.py.
+#
+#   python -m pytest -q test_tupl.py
+
+import pytest
+
+import tupl
+
+
+nested_program = '''define Lazy[nn]
+begin
+  != [1..3].
+end.
+
+define Repeat[nn]
+begin
+  != [3 ** 7].
+end.
+
+rr <- Lazy[0].
+ss <- Repeat[0].
+!= [rr, 5, ss].
+'''
+
+
+def test_compile_and_run_with_inputs():
+    program = tupl.compile("define Twice[aa]\nbegin\n  = 2 * aa.\nend.\n= Twice[xx] + 1.\n", inputs=["xx"])
+    assert program.run(bindings={"xx": 20}) == 41
+    assert program.run(bindings={"xx": 1}) == 3
+
+
+def test_compile_error():
+    with pytest.raises(tupl.CompileError):
+        tupl.compile("aa <- 1 +.\n= aa.\n")
+
+
+def test_compile_error_stage():
+    with pytest.raises(tupl.CompileError) as caught:
+        tupl.compile("aa <- 1.\nbb <- cc + 1.\n= aa.\n")
+    assert caught.value.stage == "check"
+
+
+def test_lex_error_has_the_line():
+    with pytest.raises(tupl.CompileError) as caught:
+        tupl.compile("aa <- 1.\nbb <- aa $ 2.\n= bb.\n")
+    assert caught.value.stage == "lex"
+    assert caught.value.lineno == 2
+    assert str(caught.value) == "Illegal character '$'"
+
+
+def test_failed_constant_folding_is_a_check_error():
+    with pytest.raises(tupl.CompileError) as caught:
+        tupl.compile("bb <- 1.\naa <- 1/0 + bb.\n= aa.\n")
+    assert caught.value.stage == "check"
+    assert str(caught.value) == "Line 2: division by zero"
+
+
+def test_run_error_has_the_line():
+    program = tupl.compile("aa <- 1.\nbb <- aa - 1.\ncc <- 5 / bb.\n= cc.\n")
+    with pytest.raises(tupl.RunError) as caught:
+        program.run()
+    assert caught.value.lineno == 3
+    assert isinstance(caught.value.__cause__, ZeroDivisionError)
+
+
+def test_bindings_must_match_inputs():
+    program = tupl.compile("= xx.\n", inputs=["xx"])
+    with pytest.raises(ValueError):
+        program.run(bindings={})
+
+
+def test_nested_lazy_tuples_are_lists():
+    value = tupl.compile(nested_program).run()
+    assert value == [[1, 2, 3], 5, [7, 7, 7]]
+    assert [type(item) for item in value] == [list, int, list]
+
+
+def test_deeply_nested_tuples_are_lists():
+    value = [5]
+    for _ in range(100000):
+        value = [value]
+    converted = tupl.as_lists(value)
+    for _ in range(100000):
+        assert type(converted) is list and len(converted) == 1
+        converted = converted[0]
+    assert converted == [5]
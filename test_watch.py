@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+#
+# Checks of the incremental updates of semantics_watch.py.
+#
+#   python -m pytest -q test_watch.py
+
+import semantics_memo
+from semantics_common import SemData
+from semantics_watch import WatchData
+
+
+pipe_program = '''define Twice[xx]
+begin
+  = xx * {}.
+end.
+
+aa <- 0.
+[1..5] | each:Twice -> <tt>.
+!= Print[aa] ++ <tt>.
+'''
+
+
+def new_watchdata():
+    semdata = SemData()
+    semdata.memo = semantics_memo.MemoData()
+    return WatchData(semdata)
+
+
+def test_edit_of_a_function_used_only_as_a_pipe_stage():
+    watchdata = new_watchdata()
+    value, parsed, evaluated, total = watchdata.update(pipe_program.format(2))
+    assert list(value) == [0, 2, 4, 6, 8, 10]
+
+    value, parsed, evaluated, total = watchdata.update(pipe_program.format(3))
+    assert list(value) == [0, 3, 6, 9, 12, 15]
+    assert parsed == 1
+    assert evaluated == 3  # the function, the pipe and the return value
+
+
+def test_unchanged_program_is_not_evaluated_again():
+    watchdata = new_watchdata()
+    watchdata.update(pipe_program.format(2))
+    value, parsed, evaluated, total = watchdata.update(pipe_program.format(2))
+    assert list(value) == [0, 2, 4, 6, 8, 10]
+    assert (parsed, evaluated, total) == (0, 0, 4)
@@ -1,4 +1,7 @@
-import sys, ply.lex
+import sys, os, re, mmap, threading, ply.lex
+from array import array
+from itertools import accumulate, compress, repeat
+from operator import add, is_, itemgetter
 
 
 reserved = {
@@ -151,31 +154,356 @@ def t_comment_else(t):
 t_comment_ignore = ' \t\r'
 
 
+class LexError(Exception):
+    '''A character that starts no token, or a comment that is not closed.
+    lineno: the line of the error; filename: the file given to lex_file,
+    else None'''
+
+    def __init__(self, message, lineno, filename=None):
+        super().__init__("{} at line {}".format(message, lineno))
+        self.message = message
+        self.lineno = lineno
+        self.filename = filename
+
+
 def t_comment_error(t):
-    raise Exception("Illegal character '{}' at line {}".format(
-        t.value[0], t.lexer.lineno ) )
+    raise LexError("Illegal character '{}'".format(t.value[0]), t.lexer.lineno)
 
 
 def t_comment_eof(t):
     if t.lexer.lexstate == 'comment':
-        raise Exception("Unexpexted end of the file. Check the count of brackets")
+        raise LexError("Unexpexted end of the file. Check the count of brackets", t.lexer.lineno)
     return None
 
 #########################################################
 
 def t_error(t):
-    raise Exception("Illegal character '{}' at line {}".format(
-        t.value[0], t.lexer.lineno ) )
+    raise LexError("Illegal character '{}'".format(t.value[0]), t.lexer.lineno)
+
+def make_lexer():
+    '''
+    Build a lexer from the rules of this module. The master regular
+    expressions are read from the prebuilt lextab.py (see build_tables.py)
+    when it matches the tokens, which skips the validation of the rules.
+    Nothing is written to disk.
+    @:return ply lexer
+    '''
+    try:
+        import lextab
+    except ImportError:
+        lextab = None
+
+    module = sys.modules[__name__]
+    if lextab is not None and getattr(lextab, '_lextokens', None) == set(tokens):
+        return ply.lex.lex(module=module, optimize=1, lextab=lextab)
+    return ply.lex.lex(module=module)
+
+
+# The module level lexer is built on first use (tokenizer.lexer), so
+# importing this module costs nothing:
+def __getattr__(name):
+    if name == 'lexer':
+        global lexer
+        with build_lock:
+            if 'lexer' not in globals():
+                lexer = make_lexer()
+        return lexer
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# Held while the module level lexer or the fast patterns are built
+build_lock = threading.Lock()
+
+
+def new_lexer(lineno=1):
+    '''
+    A lexer of its own, cloned from the module level lexer. The line number,
+    the comment level and the state of the module level lexer carry over
+    from one input to the next and are shared by all its users; those of
+    this one start from the beginning, so every thread (or every parse) can
+    have one.
+    @:param lineno: line number of the first line of the input
+    @:return ply lexer
+    '''
+    clone = sys.modules[__name__].lexer.clone()
+    clone.lineno = lineno
+    clone.level = 0
+    clone.lexstatestack = []
+    clone.begin('INITIAL')
+    return clone
+
+
+#########################################################
+# Fast lexing of whole files into token arrays
+
+# The rules that are functions and their regexes; the fast lexer does the
+# same as them
+fast_function_rules = {'t_STRING_LITERAL': r'\"([^\"]*)\"', 't_tupleIDENT': r'<[a-z]+>',
+                       't_NUMBER_LITERAL': r'\d+', 't_NEWLINE': r'\n+',
+                       't_varIDENT': r'[a-z]\w+', 't_comment': r'\{'}
+
+# The only rule that matches a token starting with the character (the
+# function rules come before the others)
+fast_leading = dict([('"', 't_STRING_LITERAL')] +
+                    [(char, 't_NUMBER_LITERAL') for char in '0123456789'] +
+                    [(char, 't_varIDENT') for char in 'abcdefghijklmnopqrstuvwxyz'])
+
+token_codes = {name: code for code, name in enumerate(tokens)}
+
+reserved_codes = {word: token_codes[name] for word, name in reserved.items()}
+
+fast_patterns = {}  # str or bytes -> FastPatterns
+
+# Size of the parts of a file that are lexed at once
+fast_chunk = 1 << 16
+
+
+class FastPatterns:
+    '''
+    The token rules of the INITIAL state in the order of the ply lexer,
+    joined into one master regex without groups (unlike the regex of ply),
+    so that the regex engine can skip an alternative by its first character
+    and findall returns the matched strings. Newlines are ignored together
+    with the other ignored characters and counted from the matches. The
+    rule of a token is found from its first character or with the regex of
+    ply, once for every distinct match.
+    '''
+
+    def __init__(self, kind):
+        state = make_lexer()
+        regex = state.lexstatere['INITIAL']
+        names = [name for master, functions in regex
+                 for name in sorted(master.groupindex, key=master.groupindex.get)]
+        functions = {name: getattr(sys.modules[__name__], name).__doc__ for name in names
+                     if callable(getattr(sys.modules[__name__], name))}
+        if functions != fast_function_rules:
+            raise RuntimeError("The fast lexer does not know the rules " +
+                               ", ".join(sorted(set(functions.items()) ^ set(fast_function_rules.items()))))
+
+        def source(name):
+            rule = getattr(sys.modules[__name__], name)
+            pattern = rule.__doc__ if callable(rule) else rule
+            return re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+
+        convert = (lambda pattern: pattern) if kind is str else (lambda pattern: pattern.encode('ascii'))
+        space = state.lexstateignore['INITIAL'] + '\n'
+        self.space = convert(space)
+        self.leading = {convert(char): name for char, name in fast_leading.items()}
+        self.ignore = re.compile(convert('[{}]*'.format(re.escape(space))))
+        self.master = re.compile(convert('[{}]*(?:{})'.format(
+            re.escape(space), '|'.join(source(name) for name in names if name != 't_NEWLINE'))))
+        self.named = [(re.compile(convert(master.pattern)),
+                       {index: name for name, index in master.groupindex.items()})
+                      for master, functions in regex]
+
+
+def fast_pattern(kind):
+    '''
+    @:param kind: str or bytes, the type of the source
+    @:return FastPatterns
+    '''
+    if kind not in fast_patterns:
+        with build_lock:
+            if kind not in fast_patterns:
+                fast_patterns[kind] = FastPatterns(kind)
+    return fast_patterns[kind]
+
+
+class TokenArrays:
+    '''
+    The tokens of a source as parallel arrays: type codes (index in tokens),
+    start offsets, line numbers and values (strings are interned, numbers
+    are ints). Works as the lexer of the parser: token() returns the tokens
+    one by one as LexTokens.
+    '''
+
+    def __init__(self):
+        self.types = array('B')
+        self.starts = array('q')
+        self.lines = array('q')
+        self.values = []
+        self.position = 0
+        self.lineno = 1
+
+    def __len__(self):
+        return len(self.types)
+
+    def input(self, data):
+        self.__init__()
+        lex_into(self, data)
+
+    def token(self):
+        index = self.position
+        if index >= len(self.types):
+            return None
+        self.position = index + 1
+        token = ply.lex.LexToken()
+        token.type = tokens[self.types[index]]
+        token.value = self.values[index]
+        token.lineno = self.lineno = self.lines[index]
+        token.lexpos = self.starts[index]
+        token.lexer = self
+        return token
+
+    def __iter__(self):
+        return iter(self.token, None)
+
+
+def lex_into(arrays, data):
+    '''
+    Append the tokens of data (str, or bytes-like with only ASCII) to the
+    arrays. Does the same as the ply lexer of this module.
+    '''
+    text = isinstance(data, str)
+    patterns = fast_pattern(str if text else bytes)
+    master, ignore, space, leading = patterns.master, patterns.ignore, patterns.space, patterns.leading
+    brace = re.compile('[{}\n]' if text else rb'[{}\n]')
+    newline, left = ('\n', '{') if text else (b'\n', b'{')
+    types, starts, lines, values = arrays.types, arrays.starts, arrays.lines, arrays.values
+    # match (a token and the ignored characters before it) ->
+    # (type code, value, newlines before the token, offset of the token)
+    known = dict()
+    first, second, third, fourth = itemgetter(0), itemgetter(1), itemgetter(2), itemgetter(3)
+
+    def classify(found):
+        # Add a match to known. None for the start of a comment
+        raw = found.lstrip(space)
+        name = leading.get(raw[:1])
+        # no rule looks past the end of the token, so the rules that do
+        # not match in the source do not match the token either
+        for named, names in patterns.named if name is None else ():
+            match = named.match(raw)
+            if match:
+                name = names[match.lastindex]
+                break
+        if name == 't_comment':
+            return None
+        value = raw if text else raw.decode('ascii')
+        if name == 't_STRING_LITERAL':
+            value = value.strip('"')
+        elif name == 't_tupleIDENT':
+            value = value.strip('<>')
+        elif name == 't_NUMBER_LITERAL':
+            value = int(value)
+        code = token_codes[name[2:]]
+        if name == 't_varIDENT':
+            code = reserved_codes.get(value, code)
+        offset = len(found) - len(raw)
+        known[found] = entry = (code, sys.intern(value) if type(value) is str else value,
+                                found.count(newline, 0, offset), offset)
+        return entry
+
+    def skip_comment(pos, lineno):
+        level = 1
+        while level:
+            match = brace.search(data, pos)
+            if match is None:
+                raise LexError("Unexpexted end of the file. Check the count of brackets", lineno)
+            pos = match.end()
+            char = data[match.start():pos]
+            if char == newline:
+                lineno += 1
+            else:
+                level += 1 if char == left else -1
+        return pos, lineno
+
+    def one_by_one(pos, stop, lineno):
+        # Token by token until stop, or the end of the token at stop
+        while pos < stop:
+            match = master.match(data, pos)
+            if match is None:
+                end = ignore.match(data, pos).end()
+                lineno += data[pos:end].count(newline)
+                if end == len(data):
+                    return end, lineno
+                char = data[end:end + 1]
+                raise LexError("Illegal character '{}'".format(
+                    char if text else char.decode('ascii', 'replace')), lineno)
+            found = match.group()
+            entry = known.get(found) or classify(found)
+            if entry is None:
+                pos, lineno = skip_comment(match.end(), lineno + found.count(newline))
+                continue
+            lineno += entry[2]
+            types.append(entry[0])
+            starts.append(pos + entry[3])
+            lines.append(lineno)
+            values.append(entry[1])
+            pos = match.end()
+        return pos, lineno
+
+    lineno = 1
+    pos = 0
+    end = len(data)
+    comment = -1
+    while pos < end:
+        if comment < pos:
+            comment = data.find(left, pos)
+            if comment < 0:
+                comment = end
+        stop = comment
+        if stop - pos > fast_chunk:
+            # tokens other than strings do not continue over a newline
+            cut = data.rfind(newline, pos + 1, pos + fast_chunk)
+            if cut > 0:
+                stop = cut
+
+        # All the tokens up to stop at once, if they cover it without gaps
+        found = master.findall(data, pos, stop)
+        offsets = list(accumulate(map(len, found), initial=pos))
+        if ignore.match(data, offsets[-1], stop).end() != stop:
+            pos, lineno = one_by_one(pos, stop, lineno)
+            continue
+
+        entries = list(map(known.get, found))
+        if None in entries:
+            for match in set(compress(found, map(is_, entries, repeat(None)))):
+                classify(match)
+            entries = list(map(known.__getitem__, found))
+
+        types.extend(map(first, entries))
+        starts.extend(map(add, offsets, map(fourth, entries)))
+        values.extend(map(second, entries))
+        count = len(lines)
+        lines.extend(accumulate(map(third, entries), initial=lineno))
+        del lines[count]
+        lineno = (lines[-1] if entries else lineno) + data[offsets[-1]:stop].count(newline)
+        pos = stop
+
+        if pos == comment and pos < end:
+            pos, lineno = skip_comment(pos + 1, lineno)
+    return arrays
+
+
+non_ascii = re.compile(rb'[\x80-\xff]')
+
+
+def lex_file(filename):
+    '''
+    Lex a whole utf-8 file into TokenArrays. The file is mapped to memory
+    instead of read; files with non-ASCII characters are decoded first.
+    A LexError gets the filename.
+    @:return TokenArrays
+    '''
+    arrays = TokenArrays()
+    with open(filename, 'rb') as infile:
+        if os.fstat(infile.fileno()).st_size == 0:
+            return arrays
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            try:
+                if non_ascii.search(source):
+                    return lex_into(arrays, source[:].decode('utf-8'))
+                return lex_into(arrays, source)
+            except LexError as err:
+                err.filename = filename
+                raise
 
-# define lexer in module level so it can be used after
-# importing this module:
-lexer = ply.lex.lex()
 
 # if this module/file is the first one started (the main module)
 # then run:
 
 def main():
-    import argparse, codecs
+    import argparse
     parser = argparse.ArgumentParser()
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--who', action='store_true', help='name to print')
@@ -191,18 +519,7 @@ def main():
         # user didn't provide input filename
         parser.print_help()
     else:
-        # using codecs to make sure we process unicode
-        with codecs.open(ns.file, 'r', encoding='utf-8') as INFILE:
-            # blindly read all to memory (what if that is a 42Gb file?)
-            # likely I am too lazy to write test files that big
-            data = INFILE.read()
-
-        lexer.input(data)
-
-        while True:
-            token = lexer.token()
-            if token is None:
-                break
+        for token in lex_file(ns.file):
             print(token)
 
 
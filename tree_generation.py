@@ -1,20 +1,14 @@
 from ply import yacc
 import tokenizer
 import tree_print
-import sys, os, traceback
-
-
-class ASTnode:
-    def __init__(self, typestr):
-        self.nodetype = str(typestr)
-
-    def __str__(self):
-        if hasattr(self, "eval"):
-            return str(self.eval) + " , params: " + str(self.params)
-        elif hasattr(self, "value"):
-            return str(self.value)
-        else:
-            return self.nodetype
+from semantics_common import binary_operators
+from semantics_tuples import RangeTuple, RepeatTuple, join_tuples
+import semantics_pipes
+from semantics_pipes import run_pipe
+from tree_nodes import ASTnode, Identifier, Symbol, Program, FunctionDefinition, FunctionBody, Formals, \
+    Definition, Arguments, PipeStage, Expression, FunctionCall, Wrap, ReturnValue, Negation, \
+    BinaryOperation, PipeExpression, ListExpression, RangeExpression, Concatenation, Selection
+import copy, sys, os, threading, traceback
 
 
 # tokens are defined in lex-module, but needed here also in syntax rules
@@ -24,16 +18,31 @@ tokens = tokenizer.tokens
 def p_program1(p):
     '''program : return_value DOT'''
 
-    p[0] = ASTnode('program')
+    p[0] = Program('program')
     p[0].children_definitions = []
     p[0].child_returns = p[1]
 
 
 def p_program2(p):
-    '''program : function_or_variable_definition program'''
+    '''program : definitions return_value DOT'''
+
+    p[0] = Program('program')
+    p[0].children_definitions = p[1]
+    p[0].child_returns = p[2]
+
 
-    p[0] = p[2]
-    p[0].children_definitions.append(p[1])
+# The definitions are collected left-recursively, so they are in source
+# order and the parser stack does not grow with the number of definitions
+
+def p_definitions1(p):
+    '''definitions : function_or_variable_definition'''
+    p[0] = [p[1]]
+
+
+def p_definitions2(p):
+    '''definitions : definitions function_or_variable_definition'''
+    p[0] = p[1]
+    p[0].append(p[2])
 
 
 
@@ -46,8 +55,8 @@ def p_function_or_variable_definition(p):
 def p_function_definition(p):
     '''function_definition  : DEFINE funcIDENT function_middle return_value DOT END DOT'''
 
-    p[0] = ASTnode("function")
-    p[0].child_identifier = ASTnode(p[2])
+    p[0] = FunctionDefinition("function")
+    p[0].child_identifier = Identifier(p[2], p.lineno(2))
     p[0].children_definitions = p[3].definitions
     for defin in p[0].children_definitions:
         defin.scope = p[2]
@@ -61,12 +70,12 @@ def p_function_definition(p):
 
 def p_function_middle1(p):
     '''function_middle : LSQUARE RSQUARE BEGIN'''
-    p[0] = ASTnode("func_body")
+    p[0] = FunctionBody("func_body")
     p[0].definitions = []
 
 def p_function_middle2(p):
     '''function_middle : LSQUARE formals RSQUARE BEGIN'''
-    p[0] = ASTnode("func_body")
+    p[0] = FunctionBody("func_body")
     p[0].definitions = []
     p[0].args = p[2].identifiers
 
@@ -78,7 +87,7 @@ def p_function_middle3(p):
 
 def p_formals1(p):
     '''formals  : varIDENT'''
-    p[0] = ASTnode("formals")
+    p[0] = Formals("formals")
     p[0].identifiers = [p[1]]
 
 
@@ -92,16 +101,17 @@ def p_return_value(p):
     '''return_value  : EQ simple_expression
                      | NOTEQ pipe_expression'''
 
-    p[0] = ASTnode("return_value")
+    p[0] = ReturnValue("return_value")
 
-    if p[2].nodetype == "evaluable":
+    if hasattr(p[2], "eval"):
         p[0].eval = p[2].eval
-        a = p[2].params
         p[0].params = p[2].params
+        p[0].operation = "wrap"
 
     else:
         p[0].value = p[2].value
 
+    p[0].child_expression = p[2]
     p[0].sign = p[1]
     p[0].scope = "global"
 
@@ -119,39 +129,40 @@ def p_variable_definitions(p):
     var_type = p.slice[1].type
 
     if var_type == 'pipe_expression':
-        print('tuplevariable_definition( {} )'.format(p[3]))
-        p[0] = ASTnode("Tuple")
-        p[0].child_identifier = ASTnode(p[3])
+        p[0] = Definition("tuple")
+        p[0].child_identifier = Identifier(p[3], p.lineno(3))
         p[0].child_value = p[1]
 
     else:
-        p[0] = ASTnode("definition")
+        p[0] = Definition("definition")
 
         if var_type == 'varIDENT':
-            p[0] = ASTnode("variable")
+            p[0] = Definition("variable")
 
         elif var_type == 'constIDENT':
-            p[0] = ASTnode("constant")
+            p[0] = Definition("constant")
 
         elif var_type == 'tupleIDENT':
-            p[0] = ASTnode("tuple")
+            p[0] = Definition("tuple")
 
-        p[0].child_identifier = ASTnode(p[1])
+        p[0].child_identifier = Identifier(p[1], p.lineno(1))
         p[0].child_value = p[3]
 
     p[0].scope = "global"
 
 def p_constant_expression1(p):
     '''constant_expression : NUMBER_LITERAL'''
-    p[0] = ASTnode("constant_expression")
+    p[0] = Expression("constant_expression")
     p[0].value = p[1]
 
 def p_constant_expression2(p):
     '''constant_expression : constIDENT'''
     identifier = p[1]
-    p[0] = ASTnode("evaluable")
+    p[0] = Expression("evaluable")
     p[0].eval = lambda **kwargs: kwargs.pop(identifier)
     p[0].params = [identifier]
+    p[0].operation = "load"
+    p[0].identifier = identifier
 
 
 def p_pipe_expression(p):
@@ -159,27 +170,44 @@ def p_pipe_expression(p):
                         | tuple_expression'''
 
     if p.slice[1].type == 'tuple_expression':
-        print('pipe_expression')
         p[0] = p[1]
     else:
-        p[0] = ASTnode("Pipe expression")
-        p[0].children_operands = [p[1], p[3]]
+        source = p[1]
+        stage = (p[3].stage, getattr(p[3], "identifier", None))
+        p[0] = PipeExpression("Pipe expression")
+        p[0].children_operands = [source, p[3]]
+        p[0].operation = "pipe"
+
+        if hasattr(source, "eval"):
+            p[0].eval = lambda **kwargs: run_pipe(source.eval(**kwargs), [stage], semantics_pipes.closure_call)
+            p[0].params = source.params
+        else:
+            p[0].eval = lambda **kwargs: run_pipe(source.value, [stage], semantics_pipes.closure_call)
+            p[0].params = []
 
 
 def p_pipe_operation1(p):
     '''pipe_operation  : MULT
                        | PLUS'''
-    p[0] = ASTnode(p[1])
+    p[0] = PipeStage(p[1])
+    p[0].stage = "sum" if p[1] == "+" else "product"
 
 def p_pipe_operation2(p):
     '''pipe_operation  : funcIDENT
                        | each_statement'''
-    p[0] = ASTnode(p[1])
+    if p.slice[1].type == 'funcIDENT':
+        p[0] = PipeStage(p[1])
+        p[0].stage = "function"
+        p[0].identifier = p[1]
+    else:
+        p[0] = p[1]
 
 
 def p_each_statement(p):
     '''each_statement  : EACH COLON funcIDENT'''
-    p[0] = p[3]
+    p[0] = PipeStage("each:" + p[3])
+    p[0].stage = "each"
+    p[0].identifier = p[3]
 
 
 def p_tuple_expression1(p):
@@ -189,34 +217,47 @@ def p_tuple_expression1(p):
 def p_tuple_expression2(p):
     '''tuple_expression  : tuple_expression tuple_operation tuple_atom'''
 
-    first = p[1]
-    second = p[3]
-
-    if first.nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
-        if second.nodetype == "evaluable":
-            p[0].eval = lambda **kwargs: first.eval(**kwargs) + second.eval(**kwargs)
-            p[0].params = p[1].params + p[3].params
-        else:
-            p[0].eval = lambda **kwargs: first.eval(**kwargs) + second.value
-            p[0].params = p[1].params
-
-    elif second.nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
-        p[0].eval = lambda **kwargs: first.value + second.eval(**kwargs)
-        p[0].params = p[3].params
-
+    # A chain of ++ is one node that the tuples are added to as they are
+    # parsed (a tuple_atom is never a Concatenation), so that the chain is
+    # joined in one pass however long it is
+    if isinstance(p[1], Concatenation):
+        p[0] = p[1]
     else:
-        p[0] = ASTnode("tuple_expression")
+        p[0] = Concatenation("tuple_expression")
+        p[0].operation = "concat"
+        p[0].children_components = []
+        p[0].params = []
+        p[0].value = []
+        add_component(p[0], p[1], p)
+    add_component(p[0], p[3], p)
+
+
+def add_component(node, component, p):
+    '''Join a tuple to the end of a chain of ++'''
+    node.children_components.append(component)
+
+    if hasattr(component, "error"):
+        if not hasattr(node, "error"):
+            failed(node, component)
+        if hasattr(node, "value"):
+            del node.value
+    elif component.nodetype == "evaluable":
+        if node.nodetype != "evaluable":
+            components = node.children_components
+            node.nodetype = "evaluable"
+            node.eval = lambda **kwargs: join_tuples([item.eval(**kwargs) if item.nodetype == "evaluable"
+                                                      else item.value for item in components])
+            if hasattr(node, "value"):
+                del node.value
+        node.params += component.params
+
+    elif node.nodetype != "evaluable" and not hasattr(node, "error"):
         try:
-            p[0].value = first.value + second.value
+            node.value.extend(component.value)
         except Exception as e:
-            p[0].error = e
-            p[0].lineno = p.stack[-1].lineno
-
-    p[0].children_components = []
-    p[0].children_components.append(ASTnode(p[3]))
-    p[0].children_components.append(p[1])
+            node.error = e
+            node.lineno = p.stack[-1].lineno
+            del node.value
 
 
 def p_tuple_operation(p):
@@ -226,18 +267,22 @@ def p_tuple_operation(p):
 def p_tuple_atom4(p):
     '''tuple_atom  : function_call'''
     identifier = p[1]
-    p[0] = ASTnode("evaluable")
-    p[0].eval = lambda **kwargs: kwargs.pop(identifier)
+    p[0] = Wrap("evaluable")
+    p[0].eval = lambda **kwargs: kwargs.pop(identifier.identifier)
     p[0].params = identifier.params
     p[0].args = p[1].args
+    p[0].operation = "wrap"
+    p[0].child_expression = p[1]
 
 
 def p_tuple_atom1(p):
     '''tuple_atom  : tupleIDENT'''
     identifier = p[1]
-    p[0] = ASTnode("evaluable")
+    p[0] = Expression("evaluable")
     p[0].eval = lambda **kwargs: kwargs.pop(identifier)
     p[0].params = [identifier]
+    p[0].operation = "load"
+    p[0].identifier = identifier
 
 
 def p_tuple_atom2(p):
@@ -248,54 +293,60 @@ def p_tuple_atom2(p):
     second = p[4]
 
     if first.nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = RangeExpression("evaluable")
         if second.nodetype == "evaluable":
             if p[3] == "**":
-                p[0].eval = lambda **kwargs: [second.eval(**kwargs)] * first.eval(**kwargs)
+                p[0].eval = lambda **kwargs: RepeatTuple(first.eval(**kwargs), second.eval(**kwargs))
             else:
-                p[0].eval = lambda **kwargs: [i for i in range(first.eval(**kwargs), second.eval(**kwargs) + 1)]
-            p[0].params = p[1].params + p[3].params
+                p[0].eval = lambda **kwargs: RangeTuple(first.eval(**kwargs), second.eval(**kwargs))
+            p[0].params = first.params + second.params
         else:
             if p[3] == "**":
-                p[0].eval = lambda **kwargs: [second.value] * first.eval(**kwargs)
+                p[0].eval = lambda **kwargs: RepeatTuple(first.eval(**kwargs), second.value)
             else:
-                p[0].eval = lambda **kwargs: [i for i in range(first.eval(**kwargs), second.value + 1)]
-            p[0].params = p[1].params
+                p[0].eval = lambda **kwargs: RangeTuple(first.eval(**kwargs), second.value)
+            p[0].params = first.params
     elif second.nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = RangeExpression("evaluable")
         if p[3] == "**":
-            p[0].eval = lambda **kwargs: [second.eval(**kwargs)] * first.value
+            p[0].eval = lambda **kwargs: RepeatTuple(first.value, second.eval(**kwargs))
         else:
-            p[0].eval = lambda **kwargs: [i for i in range(first.value, second.value + 1)]
+            p[0].eval = lambda **kwargs: RangeTuple(first.value, second.eval(**kwargs))
 
-        p[0].params = p[3].params
+        p[0].params = second.params
     else:
-        p[0] = ASTnode("range_expression")
+        p[0] = RangeExpression("range_expression")
         try:
             if p[3] == "**":
-                p[0].value = [second.value] * first.value
+                p[0].value = RepeatTuple(first.value, second.value)
             else:
-                p[0].value = [i for i in range(first.value, second.value + 1)]
+                p[0].value = RangeTuple(first.value, second.value)
 
         except Exception as e:
             p[0].error = e
             p[0].lineno = p.stack[-1].lineno
 
+    p[0].operation = p[3]
     p[0].child_start = p[2]
-    p[0].child_type = ASTnode(p[3])
+    p[0].child_type = Symbol(p[3], p.lineno(3))
     p[0].child_end = p[4]
 
 
 def p_tuple_atom3(p):
     '''tuple_atom  : LSQUARE arguments RSQUARE'''
-    if any(expr.nodetype == "evaluable" for expr in p[2].children_expressions):
-        p[0] = ASTnode("evaluable")
+    errors = [expr for expr in p[2].children_expressions if hasattr(expr, "error")]
+    if errors:
+        p[0] = failed(Expression("list"), errors[0])
+    elif any(expr.nodetype == "evaluable" for expr in p[2].children_expressions):
+        p[0] = ListExpression("evaluable")
         args = p[2].children_expressions
         p[0].eval = lambda **kwargs: [expr.eval(**kwargs) if expr.nodetype == "evaluable" else expr.value for expr in args]
         p[0].params = [param for expr in p[2].children_expressions if expr.nodetype == "evaluable" for param in expr.params]
+        p[0].operation = "list"
+        p[0].children_elements = args
 
     else:
-        p[0] = ASTnode("list")
+        p[0] = Expression("list")
         p[0].value = [expr.value for expr in p[2].children_expressions]
 
 
@@ -304,7 +355,8 @@ def p_function_call(p):
     '''function_call : funcIDENT LSQUARE arguments RSQUARE
                      | funcIDENT LSQUARE RSQUARE'''
 
-    p[0] = ASTnode("function_call")
+    p[0] = FunctionCall("function_call")
+    identifier = p[1]
 
     if len(p) == 5:
         p[0].args = p[3].children_expressions
@@ -312,16 +364,17 @@ def p_function_call(p):
         pars = p[0].params
     else:
         p[0].args = []
-        p[0].eval = lambda **kwargs: p[1].eval(kwargs)
+        p[0].eval = lambda **kwargs: identifier.eval(kwargs)
         p[0].params = [p[1]]
         pars = p[0].params
 
     p[0].identifier = p[1]
+    p[0].operation = "call"
 
 
 def p_arguments1(p):
     '''arguments : simple_expression'''
-    p[0] = ASTnode("arguments")
+    p[0] = Arguments("arguments")
     p[0].children_expressions = [p[1]]
 
 
@@ -336,7 +389,7 @@ def p_atom1(p):
     '''atom : NUMBER_LITERAL
             | STRING_LITERAL'''
 
-    p[0] = ASTnode("atom")
+    p[0] = Expression("atom")
     p[0].value = p[1]
 
 
@@ -347,11 +400,13 @@ def p_atom5(p):
     identifier = p[1]
 
     if not hasattr(p[1], "value"):
-        p[0] = ASTnode("evaluable")
+        p[0] = Wrap("evaluable")
         p[0].eval = lambda **kwargs: kwargs.pop(identifier.identifier)
         p[0].params = identifier.params
+        p[0].operation = "wrap"
+        p[0].child_expression = identifier
     else:
-        p[0] = ASTnode("atom")
+        p[0] = Expression("atom")
         p[0].value = identifier.value
 
     p[0].args = p[1].args
@@ -362,20 +417,26 @@ def p_atom2(p):
             | constIDENT'''
 
     identifier = p[1]
-    p[0] = ASTnode("evaluable")
+    p[0] = Expression("evaluable")
     p[0].eval = lambda **kwargs: kwargs.pop(identifier)
     p[0].params = [identifier]
+    p[0].operation = "load"
+    p[0].identifier = identifier
 
 
 def p_atom3(p):
     '''atom : LPAREN simple_expression RPAREN'''
 
-    if p[2].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+    if hasattr(p[2], "error"):
+        p[0] = failed(Expression("atom"), p[2])
+    elif p[2].nodetype == "evaluable":
+        p[0] = Wrap("evaluable")
         p[0].eval = p[2].eval
         p[0].params = p[2].params
+        p[0].operation = "wrap"
+        p[0].child_expression = p[2]
     else:
-        p[0] = ASTnode("atom")
+        p[0] = Expression("atom")
         p[0].value = p[2].value
 
     if hasattr(p[2], "args"):
@@ -384,13 +445,13 @@ def p_atom3(p):
 
 def p_atom4(p):
     '''atom : SELECT COLON constant_expression LSQUARE tuple_expression RSQUARE'''
-    p[0] = ASTnode("Atom")
-
     first = p[3]
     second = p[5]
 
-    if first.nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+    if hasattr(second, "error"):
+        p[0] = failed(Selection("tuple_expression"), second)
+    elif first.nodetype == "evaluable":
+        p[0] = Selection("evaluable")
         if second.nodetype == "evaluable":
             p[0].eval = lambda **kwargs: second.eval(**kwargs)[first.eval(**kwargs)-1]
             p[0].params = first.params + second.params
@@ -399,18 +460,20 @@ def p_atom4(p):
             p[0].params = first.params
 
     elif second.nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = Selection("evaluable")
         p[0].eval = lambda **kwargs: second.eval(**kwargs)[first.value-1]
         p[0].params = second.params
 
     else:
-        p[0] = ASTnode("tuple_expression")
+        p[0] = Selection("tuple_expression")
         try:
             p[0].value = second.value[first.value-1]
         except Exception as e:
             p[0].error = e
             p[0].lineno = p.stack[-1].lineno
 
+    if p[0].nodetype == "evaluable":
+        p[0].operation = "select"
     p[0].child_index = p[3]
     p[0].child_container = p[5]
 
@@ -420,40 +483,48 @@ def p_factor(p):
     '''factor : MINUS atom
               | atom'''
 
-    p[0] = ASTnode("factor")
-
-    if len(p) == 3:
-        if p[2].nodetype == "evaluable":
-            p[0].nodetype = "evaluable"
-            p[0].eval = lambda **kwargs: -1 * p[2].eval(**kwargs)
-            p[0].params = p[2].params
+    operand = p[len(p) - 1]
+    if hasattr(operand, "error"):
+        p[0] = failed(Expression("factor"), operand)
+    elif len(p) == 3:
+        if operand.nodetype == "evaluable":
+            p[0] = Negation("evaluable")
+            p[0].eval = lambda **kwargs: -1 * operand.eval(**kwargs)
+            p[0].params = operand.params
+            p[0].operation = "neg"
+            p[0].child_operand = operand
         else:
-            p[0].value = -1 * p[2].value
-
-        if hasattr(p[2], "args"):
-            p[0].args = p[1].args
+            p[0] = Expression("factor")
+            p[0].value = -1 * operand.value
     else:
-        if p[1].nodetype == "evaluable":
-            p[0].nodetype = "evaluable"
-            p[0].eval = p[1].eval
-            p[0].params = p[1].params
+        if operand.nodetype == "evaluable":
+            p[0] = Wrap("evaluable")
+            p[0].eval = operand.eval
+            p[0].params = operand.params
+            p[0].operation = "wrap"
+            p[0].child_expression = operand
         else:
-            p[0].value = p[1].value
+            p[0] = Expression("factor")
+            p[0].value = operand.value
 
-        if hasattr(p[1], "args"):
-            p[0].args = p[1].args
+    if hasattr(operand, "args"):
+        p[0].args = operand.args
 
 
 
 def p_term1(p):
     '''term : factor'''
 
-    if p[1].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+    if hasattr(p[1], "error"):
+        p[0] = failed(Expression("term"), p[1])
+    elif p[1].nodetype == "evaluable":
+        p[0] = Wrap("evaluable")
         p[0].eval = p[1].eval
         p[0].params = p[1].params
+        p[0].operation = "wrap"
+        p[0].child_expression = p[1]
     else:
-        p[0] = ASTnode("term")
+        p[0] = Expression("term")
         p[0].value = p[1].value
 
     if hasattr(p[1], "args"):
@@ -468,12 +539,11 @@ def p_term2(p):
     first = p[1]
     second = p[3]
 
-    if hasattr(p[3], "error"):
-        p[0] = ASTnode("term")
-        p[0].error = second.error
+    if hasattr(first, "error") or hasattr(second, "error"):
+        p[0] = failed(BinaryOperation("term"), first if hasattr(first, "error") else second)
 
     elif p[1].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = BinaryOperation("evaluable")
 
         if second.nodetype == "evaluable":
 
@@ -493,7 +563,7 @@ def p_term2(p):
             p[0].params = first.params
 
     elif p[3].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = BinaryOperation("evaluable")
 
         if p[2] == "*":
             p[0].eval = lambda **kwargs: first.value * second.eval(**kwargs)
@@ -503,15 +573,17 @@ def p_term2(p):
         p[0].params = p[3].params
 
     else:
-        p[0] = ASTnode("term")
+        p[0] = BinaryOperation("term")
 
         try:
-            p[0].value = eval(str(p[1]) + p[2] + str(p[3]))
+            p[0].value = binary_operators[p[2]](first.value, second.value)
         except Exception as e:
             p[0].error = e
             p[0].lineno = p.stack[-1].lineno
 
-    sign = ASTnode("op")
+    if p[0].nodetype == "evaluable":
+        p[0].operation = "binop"
+    sign = Symbol("op", p.lineno(2))
     sign.value = p[2]
     p[0].children_operands = [p[1], sign, p[3]]
 
@@ -519,12 +591,16 @@ def p_term2(p):
 def p_simple_expression1(p):
     '''simple_expression  : term'''
 
-    if p[1].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+    if hasattr(p[1], "error"):
+        p[0] = failed(Expression("simple_expression"), p[1])
+    elif p[1].nodetype == "evaluable":
+        p[0] = Wrap("evaluable")
         p[0].eval = p[1].eval
         p[0].params = p[1].params
+        p[0].operation = "wrap"
+        p[0].child_expression = p[1]
     else:
-        p[0] = ASTnode("simple_expression")
+        p[0] = Expression("simple_expression")
         p[0].value = p[1].value
 
     if hasattr(p[1], "args"):
@@ -538,12 +614,11 @@ def p_simple_expression2(p):
     first = p[1]
     second = p[3]
 
-    if hasattr(p[3], "error"):
-        p[0] = ASTnode("simple_expression")
-        p[0].error = second.error
+    if hasattr(first, "error") or hasattr(second, "error"):
+        p[0] = failed(BinaryOperation("simple_expression"), first if hasattr(first, "error") else second)
 
     elif p[1].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = BinaryOperation("evaluable")
 
 
         if p[3].nodetype == "evaluable":
@@ -564,7 +639,7 @@ def p_simple_expression2(p):
             p[0].params = first.params
 
     elif p[3].nodetype == "evaluable":
-        p[0] = ASTnode("evaluable")
+        p[0] = BinaryOperation("evaluable")
 
         if p[2] == "+":
             p[0].eval = lambda **kwargs: first.value + second.eval(**kwargs)
@@ -574,13 +649,10 @@ def p_simple_expression2(p):
         p[0].params = second.params
 
     else:
-        p[0] = ASTnode("simple_expression")
+        p[0] = BinaryOperation("simple_expression")
 
         try:
-            if type(second.value) is str:
-                res = first.value + second.value if p[2] == "+" else first.value - second.value
-            else:
-                res = eval(str(first) + p[2] + str(second))
+            res = binary_operators[p[2]](first.value, second.value)
         except Exception as e:
             p[0].error = e
             p[0].lineno = p.stack[-1].lineno
@@ -588,7 +660,9 @@ def p_simple_expression2(p):
         else:
             p[0].value = res
 
-    sign = ASTnode("op")
+    if p[0].nodetype == "evaluable":
+        p[0].operation = "binop"
+    sign = Symbol("op", p.lineno(2))
     sign.value = p[2]
     p[0].children_operands = [first, sign, second]
 
@@ -597,26 +671,109 @@ def p_simple_expression2(p):
 
     if hasattr(p[3], "args"):
         if hasattr(p[1], "args"):
-            p[0].args += p[3].args
+            p[0].args = p[0].args + p[3].args
         else:
             p[0].args = p[3].args
 
 
-def p_error(p):
-    print( 'syntax error @', p )
-    raise SystemExit
+class ParseError(Exception):
+    '''The program has a syntax error'''
+
 
+def failed(node, operand):
+    '''Give node the error of an operand whose constant folding failed, so
+    that the checks report it on the line of the operand'''
+    node.error = operand.error
+    node.lineno = operand.lineno
+    return node
 
-parser = yacc.yacc()
+
+def p_error(p):
+    raise ParseError('syntax error @ {}'.format(p))
+
+
+def first_line(p):
+    '''The line of the first token of a rule: the first symbol is a token,
+    or a node (or a list of nodes) that already has its line'''
+    symbol = p.slice[1]
+    if hasattr(symbol, "lineno"):
+        return symbol.lineno
+    value = symbol.value
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return getattr(value, "lineno", None)
+
+
+def with_lines(rule):
+    '''Wrap a grammar rule so that the node it makes gets the line of the
+    first token of the rule. Nodes with an error already have the line of
+    the error, and identifiers and operators get the line of their token
+    when they are made.'''
+    def rule_with_lines(p):
+        rule(p)
+        if getattr(p[0], "lineno", 0) is None:
+            p[0].lineno = first_line(p)
+    return rule_with_lines
+
+
+def make_parser():
+    '''Build a parser from the grammar of this module. The LALR tables are
+    read from the prebuilt parsetab.py (see build_tables.py); if the grammar
+    has changed since, they are generated in memory. Nothing is written
+    to disk.
+
+    Every node gets the line of its first token in .lineno (see with_lines).'''
+    try:
+        import parsetab
+    except ImportError:
+        parsetab = "parsetab"
+    parser = yacc.yacc(module=sys.modules[__name__], tabmodule=parsetab, write_tables=False, debug=False)
+    for production in parser.productions:
+        if production.callable is not None:
+            production.callable = with_lines(production.callable)
+    return parser
+
+
+# The module level parser is built on first use (tree_generation.parser)
+def __getattr__(name):
+    if name == "parser":
+        global parser
+        with build_lock:
+            if "parser" not in globals():
+                parser = make_parser()
+        return parser
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# Held while the module level parser is built
+build_lock = threading.Lock()
+
+
+def new_parser():
+    '''A parser of its own that shares the tables of the module level
+    parser. ply also keeps the stacks of the running parse on the parser
+    object, where its error handling looks for them, so parses that run at
+    the same time should not share a parser.'''
+    return copy.copy(sys.modules[__name__].parser)
+
+
+def parse_source(source):
+    '''Lex and parse the source of a program (str, or bytes with only ASCII)
+    with a lexer and a parser of their own. Can be called from several
+    threads at once.'''
+    tokens = tokenizer.TokenArrays()
+    tokens.input(source)
+    return new_parser().parse(lexer=tokens, debug=False)
 
 
 if __name__ == '__main__':
-    import argparse, codecs
+    import argparse
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-t', '--treetype', help='type of output tree (unicode/ascii/dot)')
     group = arg_parser.add_mutually_exclusive_group()
     group.add_argument('--who', action='store_true', help='who wrote this' )
     group.add_argument('-f', '--file', help='filename to process')
+    tree_print.add_tree_arguments(arg_parser)
     ns = arg_parser.parse_args()
 
     outformat = "dot"
@@ -629,18 +786,21 @@ if __name__ == '__main__':
 
     if ns.who == True:
         # identify who wrote this
-        print( Udratov' )
+        print('276190, Magomed Udratov')
 
     elif ns.file is None:
         # user didn't provide input filename
         arg_parser.print_help()
     else:
-        data = codecs.open( ns.file, encoding='utf-8' ).read()
-        result = parser.parse(data, lexer=tokenizer.lexer, debug=False)
+        try:
+            result = make_parser().parse(lexer=tokenizer.lex_file(ns.file), debug=False)
+        except (tokenizer.LexError, ParseError) as err:
+            print(err)
+            sys.exit()
         if result is None:
             print( 'syntax OK' )
 
         print("\n\n")
 
-        tree_print.treeprint(result, outformat)
+        tree_print.treeprint_options(result, outformat, ns)
 
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+#
+# The node classes of the syntax tree.
+#
+# Every class lists its attributes in __slots__, so the nodes have no
+# __dict__, and its children in child_fields, in the order they are
+# printed and visited. Attributes starting with "children_" hold a list of
+# nodes, the other child fields one node. An attribute that was never set
+# does not exist (hasattr is False), as with the attributes that used to be
+# added on the fly. The exception is .lineno, the line of the first token of
+# the node, which is None for the nodes that are not made by the parser.
+#
+# The nodetype is an attribute of the node, not of the class: identifiers
+# are named after the identifier, and "evaluable" tells that the value is
+# only known when the program runs.
+
+child_prefix = "child_"
+children_prefix = "children_"
+
+
+class ASTnode:
+    '''A leaf: an identifier, or the type of a range'''
+
+    __slots__ = ("nodetype", "lineno")
+    child_fields = ()
+
+    # (attribute, label for printing, is a list), made from child_fields
+    child_layout = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.child_layout = tuple(
+            (name, name[len(children_prefix):], True) if name.startswith(children_prefix)
+            else (name, name[len(child_prefix):], False)
+            for name in cls.child_fields)
+
+    def __init__(self, typestr, lineno=None):
+        self.nodetype = str(typestr)
+        self.lineno = lineno
+
+    def __str__(self):
+        if hasattr(self, "eval"):
+            return str(self.eval) + " , params: " + str(self.params)
+        elif hasattr(self, "value"):
+            return str(self.value)
+        else:
+            return self.nodetype
+
+
+class Identifier(ASTnode):
+    '''The name of a definition or a function (the nodetype)'''
+
+    __slots__ = ()
+
+
+class Symbol(ASTnode):
+    '''An operator; the sign of a binary operation is also its value'''
+
+    __slots__ = ("value",)
+
+
+class Program(ASTnode):
+    __slots__ = ("children_definitions", "child_returns")
+    child_fields = ("children_definitions", "child_returns")
+
+
+class FunctionDefinition(ASTnode):
+    '''.frame_size is added by semantics_compile'''
+
+    __slots__ = ("child_identifier", "children_definitions", "child_return", "args", "scope", "frame_size")
+    child_fields = ("child_identifier", "children_definitions", "child_return")
+
+
+class FunctionBody(ASTnode):
+    '''The formals and local definitions of a function while it is parsed'''
+
+    __slots__ = ("definitions", "args")
+
+
+class Formals(ASTnode):
+    __slots__ = ("identifiers",)
+
+
+class Definition(ASTnode):
+    '''A variable, constant or tuple definition. A local definition of a
+    function gets its .slot in the frame from semantics_compile.'''
+
+    __slots__ = ("child_identifier", "child_value", "scope", "slot")
+    child_fields = ("child_identifier", "child_value")
+
+
+class Arguments(ASTnode):
+    __slots__ = ("children_expressions",)
+    child_fields = ("children_expressions",)
+
+
+class PipeStage(ASTnode):
+    '''+, *, a function or each:function after a |'''
+
+    __slots__ = ("stage", "identifier")
+
+
+class Expression(ASTnode):
+    '''An expression without child expressions: a literal, a constant that
+    was computed when parsing, or a load of a name (operation "load").
+    Evaluable expressions have .eval and .params, the others .value.
+    .code is added by semantics_compile.'''
+
+    __slots__ = ("value", "eval", "params", "operation", "identifier", "args", "error", "code")
+
+
+class FunctionCall(Expression):
+    '''The arguments (.args) are not visited as children'''
+
+    __slots__ = ()
+
+
+class Wrap(Expression):
+    '''Passes through the value of the child expression'''
+
+    __slots__ = ("child_expression",)
+    child_fields = ("child_expression",)
+
+
+class ReturnValue(Wrap):
+    __slots__ = ("sign", "scope")
+
+
+class Negation(Expression):
+    __slots__ = ("child_operand",)
+    child_fields = ("child_operand",)
+
+
+class BinaryOperation(Expression):
+    '''The operands are [first, Symbol("op"), second]'''
+
+    __slots__ = ("children_operands",)
+    child_fields = ("children_operands",)
+
+
+class PipeExpression(Expression):
+    '''The operands are [source, PipeStage]'''
+
+    __slots__ = ("children_operands",)
+    child_fields = ("children_operands",)
+
+
+class ListExpression(Expression):
+    __slots__ = ("children_elements",)
+    child_fields = ("children_elements",)
+
+
+class RangeExpression(Expression):
+    __slots__ = ("child_start", "child_type", "child_end")
+    child_fields = ("child_start", "child_type", "child_end")
+
+
+class Concatenation(Expression):
+    '''A whole chain of ++, with all the joined tuples as components'''
+
+    __slots__ = ("children_components",)
+    child_fields = ("children_components",)
+
+
+class Selection(Expression):
+    __slots__ = ("child_index", "child_container")
+    child_fields = ("child_index", "child_container")
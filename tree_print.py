@@ -1,56 +1,50 @@
 #!/usr/bin/env python3
 # ----------------------------------------------------------------------
 
+import sys
+
 # Values to control the module's working
 
 # How to recognize attributes in nodes by their names
 
-child_prefix_default = "child_"
-children_prefix_default = "children_"
 value_attr = "value"
 type_attr = "nodetype"
 
 # Finding and creating a list of all children nodes of a node, based on
-# attribute names of a node
+# the child fields of its class (see tree_nodes)
 
-def get_childvars(node, child_prefix=child_prefix_default,
-                  children_prefix=children_prefix_default):
+def get_childvars(node):
   '''Return all children nodes of a tree node
   
-  This function assumes that all attributes of a node beginning with
-  child_prefix refer to a child node, and attributes beginning with
-  children_prefix refer to a LIST of child nodes. The return value is a list
-  of pairs (tuples), where the first element of each pair is a "label"
-  for the node (the name of the attribute without the child/children prefix),
-  and the second element is the child node itself. For child lists, the label
-  also contains the number of the child, or EMPTY if the list is empty
-  (in which case None is used as the second element, as there is no child).'''
+  The children are the attributes listed in the child_fields of the node's
+  class: attributes beginning with "child_" refer to a child node, and
+  attributes beginning with "children_" refer to a LIST of child nodes. The
+  return value is a list of pairs (tuples), where the first element of each
+  pair is a "label" for the node (the name of the attribute without the
+  child/children prefix), and the second element is the child node itself.
+  For child lists, the label also contains the number of the child, or
+  EMPTY if the list is empty (in which case None is used as the second
+  element, as there is no child). Attributes that were not set are skipped.'''
 
   childvars = []
-  # Only search for attributes if we have an object
-  if hasattr(node, "__dict__"):
-    # Iterate though all attributes of the node object
-    for name,val in vars(node).items():
-      # An attribute containing one child node
-      if name.startswith(child_prefix):
-        label = name[len(child_prefix):]
-        childvars.append((label, val))
-      # An attribute containing a child list
-      elif name.startswith(children_prefix):
-        label = name[len(children_prefix):]
-        # Make sure contents is not None and is a list (or actually, can
-        # be iterated through
-        if val is None:
-          childvars.append((label+"[NONE stored instead of a list!!!]", None))
-        else:
-          assert not val is None, "'None' passed as children list!"
-          assert hasattr(val, "__iter__"), "Children list is not a list!!!"
-          # An empty list/iterable (no nodes)
-          if not val:
-            childvars.append((label+"[EMPTY]", None))
-          # A non-empty list/iterable
-          else:
-            childvars.extend([(label+"["+str(i)+"]", child) for (i, child) in enumerate(val)])
+  for name, label, is_list in getattr(node, "child_layout", ()):
+    if not hasattr(node, name):
+      continue
+    val = getattr(node, name)
+    # An attribute containing one child node
+    if not is_list:
+      childvars.append((label, val))
+    # An attribute containing a child list
+    elif val is None:
+      childvars.append((label+"[NONE stored instead of a list!!!]", None))
+    else:
+      assert hasattr(val, "__iter__"), "Children list is not a list!!!"
+      # An empty list/iterable (no nodes)
+      if not val:
+        childvars.append((label+"[EMPTY]", None))
+      # A non-empty list/iterable
+      else:
+        childvars.extend([(label+"["+str(i)+"]", child) for (i, child) in enumerate(val)])
   return childvars
 
 
@@ -93,105 +87,223 @@ def dotnodeid(nodenum):
   '''Convert node number to a dot id'''
   return "N"+str(nodenum)
 
-def treeprint_indent(node, outtype="unicode", label="", first_indent="", indent=""):
+
+# Trees are written to a file-like sink (sys.stdout by default) in pieces of
+# buffer_lines lines, instead of with a print() per line
+
+buffer_lines = 4096
+
+formats = ("unicode", "ascii", "dot")
+
+class TreeWriter:
+  '''Collects the lines of a printed tree and writes them to out in large
+  pieces. The printers append to .lines and call flush() when it has .size
+  lines; flush() also writes the rest at the end.'''
+
+  def __init__(self, out=None, size=buffer_lines):
+    self.out = sys.stdout if out is None else out
+    self.size = size
+    self.lines = []
+
+  def line(self, text):
+    self.lines.append(text)
+    if len(self.lines) >= self.size:
+      self.flush()
+
+  def flush(self):
+    if self.lines:
+      self.lines.append("")
+      self.out.write("\n".join(self.lines))
+      self.lines.clear()
+
+def writer_for(out):
+  '''out if it is a TreeWriter, otherwise a TreeWriter writing to out'''
+  return out if isinstance(out, TreeWriter) else TreeWriter(out)
+
+missing = object()
+
+def node_text(node):
+  '''The node type of a node, and its value in parenthesis if it has one'''
+  # If node has node type attribute, use that, otherwise try to show the whole
+  # node take help in finding the error
+  text = getattr(node, type_attr, missing)
+  if text is missing:
+    text = "??? '{}' ???".format(node)
+  value = getattr(node, value_attr, missing)
+  if value is not missing:
+    return "{} ({})".format(text, value)
+  return text
+
+def children_text(childvars):
+  '''"1 child" or "N children"'''
+  return "1 child" if len(childvars) == 1 else "{} children".format(len(childvars))
+
+def is_collapsed(node, depth, max_depth, collapse):
+  '''Whether the children of the node are left out: below max_depth, or if
+  its node type or class name is in collapse'''
+  if max_depth is not None and depth >= max_depth:
+    return True
+  return bool(collapse) and (getattr(node, type_attr, None) in collapse or type(node).__name__ in collapse)
+
+def treeprint_indent(node, outtype="unicode", label="", first_indent="", indent="",
+                     out=None, max_depth=None, max_nodes=None, collapse=()):
   '''Print out an ASCII/Unicode version of a subtree in a tree.
   
   node = the root of the subtree
   outtype = unicode/ascii
   label = the "role" of the subtree on the parent node (from attribute name)
   first_indent = what to print at the beginning of the first line (indentation)
-  indent = what to print at the beginning of the rest of the lines (indentation)'''
+  indent = what to print at the beginning of the rest of the lines (indentation)
+  out = file-like object or TreeWriter to write to (default sys.stdout)
+  max_depth = depth below which children are left out (the root is at 0)
+  max_nodes = number of nodes after which the rest are left out
+  collapse = node types or class names whose children are left out
+
+  The subtrees still to be printed are kept on a stack (the next one on top)
+  instead of printing them recursively, so deep trees can be printed.
+  Returns the number of nodes printed.'''
   
-  # Add label (if any) to the first line after the indentation
-  if label:
-    first_indent += label + ": "
-  if not node:
-    # If node is None, just print NONE
-    print(first_indent + "NONE")
+  if outtype == "unicode":
+    indents = (child_indent_uni, normal_indent_uni), (last_child_indent_uni, last_normal_indent_uni)
   else:
-    # If node has node type attribute, print that, otherwise try to print the whole
-    # node take help in finding the error
-    if hasattr(node, type_attr):
-      print(first_indent + getattr(node, type_attr), end="")
-    else:
-      print(first_indent + "??? '" + str(node) + "' ???", end="")
-    # If node has a value attribute, print the value of the node in parenthesis
-    if hasattr(node, value_attr):
-      print(" (" + str(node.value) + ")")
-    else:
-      print()
-    # Get all children of the node and iterate through them
+    indents = (child_indent_asc, normal_indent_asc), (last_child_indent_asc, last_normal_indent_asc)
+  limited = max_depth is not None or bool(collapse)
+  if max_nodes is None:
+    max_nodes = float("inf")
+
+  writer = writer_for(out)
+  lines, size = writer.lines, writer.size
+  printed = 0
+  stack = [(node, label, first_indent, indent, 0)]
+  while stack:
+    if len(lines) >= size:
+      writer.flush()
+    node, label, first_indent, indent, depth = stack.pop()
+    if printed >= max_nodes:
+      lines.append("{}... (stopped after {} nodes)".format(first_indent, printed))
+      break
+    printed += 1
+    # Add label (if any) to the first line after the indentation
+    if label:
+      first_indent += label + ": "
+    if not node:
+      # If node is None, just print NONE
+      lines.append(first_indent + "NONE")
+      continue
     childvars = get_childvars(node)
-    i = len(childvars)
-    for name,value in childvars:
-      i -= 1
-      if i > 0:
-        # Not the last child, use normal indentation
-        if outtype == "unicode":
-          first_indent = child_indent_uni
-          rest_indent = normal_indent_uni
-        else:
-          first_indent = child_indent_asc
-          rest_indent = normal_indent_asc
-      else:
-        # The last child, use indentation for that case
-        if outtype == "unicode":
-          first_indent = last_child_indent_uni
-          rest_indent = last_normal_indent_uni
-        else:
-          first_indent = last_child_indent_asc
-          rest_indent = last_normal_indent_asc
-      # Recursively print the child subtrees, adding indentation
-      treeprint_indent(value, outtype, name, indent+first_indent,
-                indent+rest_indent)
-
-def treeprint_dot(node, nodenum, nodecount):
+    if limited and childvars and is_collapsed(node, depth, max_depth, collapse):
+      lines.append("{}{} ... ({})".format(first_indent, node_text(node), children_text(childvars)))
+      continue
+    lines.append(first_indent + node_text(node))
+    # Push all children of the node last child first, the last child with
+    # the indentation for that case
+    last = True
+    for name,value in reversed(childvars):
+      child_indent, rest_indent = indents[last]
+      stack.append((value, name, indent+child_indent, indent+rest_indent, depth+1))
+      last = False
+  writer.flush()
+  return printed
+
+def treeprint_dot(node, nodenum, nodecount, out=None, max_depth=None, max_nodes=None, collapse=()):
   '''Print a subtree in dot format.
   
   nodenum = number of the node (for dot id generation)
-  nodecount = a list containing the maximum used id'''
+  nodecount = a list containing the maximum used id
+  out, max_depth, max_nodes, collapse = as in treeprint_indent
+
+  The nodes are numbered and printed in the same order as a recursive
+  printer would, but with a stack of work: a child subtree to print, or the
+  line connecting a child to its parent, which is pushed below the child's
+  children so it is printed after them. A collapsed node is drawn dashed.
+  Returns the number of nodes printed.'''
   
-  nodeline = dotnodeid(nodenum)
-  if not node:
-    # None is output as an ellipse with label NONE
-    nodeline += ' [shape="ellipse", label="NONE"]'
-    print(nodeline)
-  else:
+  limited = max_depth is not None or bool(collapse)
+  if max_nodes is None:
+    max_nodes = float("inf")
+
+  writer = writer_for(out)
+  lines, size = writer.lines, writer.size
+  printed = 0
+  stopped = False
+  # A subtree to print is (node, number of the parent, label, depth); the
+  # root is numbered nodenum and the children by one more than the current
+  # maximum
+  stack = [(node, None, "", 0)]
+  while stack:
+    if len(lines) >= size:
+      writer.flush()
+    work = stack.pop()
+    if type(work) is str:
+      # The connection between a parent and a child that was printed
+      lines.append(work)
+      continue
+    if stopped or printed >= max_nodes:
+      # Only the connections between the printed nodes are left to print
+      stopped = True
+      continue
+    printed += 1
+    node, parentnum, name, depth = work
+    if parentnum is not None:
+      nodecount[0] += 1
+      nodenum = nodecount[0]
+      stack.append('N{}->N{} [label="{}"]'.format(parentnum, nodenum, name))
+
+    if not node:
+      # None is output as an ellipse with label NONE
+      lines.append('N{} [shape="ellipse", label="NONE"]'.format(nodenum))
+      continue
     # Normal nodes use the default shape
-    nodeline += ' [label="'
-    # If node has node type attribute, print that, otherwise try to print the whole
-    # node take help in finding the error
-    if hasattr(node, type_attr):
-      nodeline += getattr(node, type_attr)
-    else:
-      nodeline += "??? '" + str(node) + "' ???"
-    # If node has a value attribute, output the value in parenthesis
-    if hasattr(node, value_attr):
-      nodeline += " (" + str(node.value) + ")"
-    nodeline += '"]'
-    print(nodeline)
-    # Get all children of the node and iterate through them
     childvars = get_childvars(node)
-    for name,value in childvars:
-      # Number the child by one more than current maximum (and update maximum)
-      nodecount[0] += 1
-      childnum = nodecount[0]
-      # Recursively print the child subtrees
-      treeprint_dot(value, childnum, nodecount)
-      # Output the named connection between parent and child
-      print(dotnodeid(nodenum)+"->"+dotnodeid(childnum)+ ' [label="'+name+'"]')
+    if limited and childvars and is_collapsed(node, depth, max_depth, collapse):
+      lines.append('N{} [label="{} ... ({})", style=dashed]'.format(
+        nodenum, node_text(node), children_text(childvars)))
+      continue
+    lines.append('N{} [label="{}"]'.format(nodenum, node_text(node)))
+    # Push all children of the node last child first
+    for name,value in reversed(childvars):
+      stack.append((value, nodenum, name, depth+1))
+  if stopped:
+    lines.append("// stopped after {} nodes".format(printed))
+  writer.flush()
+  return printed
 
-def treeprint(rootnode, outtype="unicode"):
+def treeprint(rootnode, outtype="unicode", out=None, max_depth=None, max_nodes=None, collapse=()):
   '''Prints out a tree, given its root.
   
      The second argument is the output type:
      "unicode" (default) prints a text-version of the tree using Unicode block characters.
      "ascii" prints an ASCII-only version, with |, -, +.
      "dot" prints a tree in dot format (can be converted to a graphical tree
-     using dot command in graphwiz).'''
+     using dot command in graphwiz).
+     The tree is written to out (a file-like object, default sys.stdout);
+     max_depth, max_nodes and collapse limit the nodes printed (see
+     treeprint_indent).'''
+  writer = TreeWriter(out)
   if outtype == "dot":
-    print(dot_preamble)
-    treeprint_dot(rootnode, 0, [0])
-    print(dot_postamble)
+    writer.line(dot_preamble)
+    treeprint_dot(rootnode, 0, [0], writer, max_depth, max_nodes, collapse)
+    writer.line(dot_postamble)
+  else:
+    treeprint_indent(rootnode, outtype, out=writer, max_depth=max_depth, max_nodes=max_nodes, collapse=collapse)
+  writer.flush()
+
+
+# Options of the scripts that print the tree
+
+def add_tree_arguments(arg_parser):
+  '''Add the options that limit the printed tree and send it to a file'''
+  arg_parser.add_argument('--tree-file', metavar='FILE', help='write the syntax tree to FILE')
+  arg_parser.add_argument('--tree-depth', type=int, metavar='N',
+                          help='leave out the nodes more than N levels below the root')
+  arg_parser.add_argument('--tree-nodes', type=int, metavar='N', help='print at most N nodes of the tree')
+  arg_parser.add_argument('--tree-collapse', action='append', default=[], metavar='NODETYPE',
+                          help='leave out the children of these nodes (node type or class name, can be repeated)')
+
+def treeprint_options(rootnode, outtype, ns):
+  '''Print the tree with the options of add_tree_arguments'''
+  if ns.tree_file:
+    with open(ns.tree_file, "w", encoding="utf-8") as out:
+      treeprint(rootnode, outtype, out, ns.tree_depth, ns.tree_nodes, set(ns.tree_collapse))
   else:
-    treeprint_indent(rootnode, outtype)
+    treeprint(rootnode, outtype, None, ns.tree_depth, ns.tree_nodes, set(ns.tree_collapse))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+#
+# TupLang as a library: compile a program once and run it many times.
+#
+#   import tupl
+#   program = tupl.compile("define Twice[aa]\nbegin\n  = 2 * aa.\nend.\n= Twice[xx] + 1.\n",
+#                          inputs=["xx"])
+#   program.run(bindings={"xx": 20})   # 41
+#   program.run(bindings={"xx": 1})    # 3
+#
+# compile() lexes, parses, optimizes, checks, schedules and compiles the
+# program for the VM, as semantics_run.py does, and raises CompileError
+# instead of printing the errors; its stage tells which of the steps
+# failed ("lex", "parse", "check" or "schedule"). Names the program uses without defining
+# them are given as inputs; their values are passed to run() as bindings.
+# Every run evaluates the global definitions with a new table of values
+# (and a new cache of function results) and returns the return value of the
+# program instead of printing it. Tuples are returned as lists, also when
+# they are nested in other tuples. An error while running is raised as a
+# RunError with the line of the definition that failed; the error itself
+# is its __cause__.
+
+import tokenizer
+import tree_generation
+import semantics_optimize
+import semantics_memo
+import semantics_run
+import semantics_vm
+from semantics_common import SemData, create_scope, builtin_functions, visit_tree, CheckError
+from semantics_check import check_everything, declare_builtins
+from semantics_compile import compile_program
+from semantics_schedule import schedule_program, ScheduleError
+from semantics_tuples import VirtualTuple
+from semantics_run import RunError
+
+
+class CompileError(Exception):
+    '''The program has a syntax error or does not pass the checks.
+    stage: "lex", "parse", "check" or "schedule"
+    lineno: the line of a lex error, else None'''
+
+    def __init__(self, message, stage, lineno=None):
+        super().__init__(message)
+        self.stage = stage
+        self.lineno = lineno
+
+
+def compile(source, inputs=(), optimize=1):
+    '''Compile the source of a program into a Program.
+
+       inputs: names of the values the program uses but does not define
+       optimize: optimization level of the syntax tree (0, 1 or 2)'''
+    tokens = tokenizer.TokenArrays()
+    try:
+        tokens.input(source)
+    except tokenizer.LexError as err:
+        raise CompileError(err.message, "lex", err.lineno) from None
+    try:
+        tree = tree_generation.new_parser().parse(lexer=tokens, debug=False)
+    except tree_generation.ParseError as err:
+        raise CompileError(str(err), "parse") from None
+    if tree is None:
+        raise CompileError("Syntax error", "parse")
+    semantics_optimize.optimize(tree, optimize)
+
+    semdata = SemData()
+    semdata.in_function = None
+    create_scope(semdata, "global")
+    semdata.symtbl["global"]["declared"] = set(inputs)
+    semdata.symtbl["global"]["functions"] = dict()
+    declare_builtins(semdata)
+    try:
+        visit_tree(tree, check_everything, None, semdata)
+    except CheckError as err:
+        raise CompileError(str(err), "check") from None
+
+    try:
+        global_order, function_orders = schedule_program(tree, builtin_functions, inputs)
+    except ScheduleError as err:
+        raise CompileError(str(err), "schedule") from None
+    compile_program(tree)
+    return Program(tree, inputs, global_order, semantics_run.function_table(tree, function_orders),
+                   semantics_run.redefined_globals(tree))
+
+
+class Program:
+    '''A checked and compiled program (see compile)'''
+
+    def __init__(self, tree, inputs, global_order, functions, redefined=()):
+        self.tree = tree
+        self.inputs = frozenset(inputs)
+        self.global_order = global_order
+        self.functions = functions
+        self.redefined = set(redefined)
+
+    def run(self, bindings=None, memo=True):
+        '''Evaluate the program with the values of the inputs given in
+        bindings (name -> value) and return its return value.
+
+           memo: cache the results of the functions that cannot print during
+                 the run'''
+        bindings = dict(bindings or {})
+        if bindings.keys() != self.inputs:
+            missing = sorted(self.inputs - bindings.keys())
+            unknown = sorted(bindings.keys() - self.inputs)
+            raise ValueError("Bindings do not match the inputs of the program" +
+                             (", missing: " + ", ".join(missing) if missing else "") +
+                             (", not inputs: " + ", ".join(unknown) if unknown else ""))
+
+        semdata = SemData()
+        create_scope(semdata, "global")
+        semdata.symtbl["functions"] = self.functions
+        semdata.redefined = self.redefined
+        if memo:
+            semdata.memo = semantics_memo.MemoData()
+        glob = semdata.symtbl["global"]["value"]
+        glob.update(bindings)
+        call, kernel, parallel, functions = semantics_run.vm_callbacks(semdata)
+
+        for node in self.global_order:
+            try:
+                glob[node.child_identifier.nodetype] = semantics_vm.execute(
+                    node.child_value.code, glob, glob, call, kernel, parallel, functions)
+            except Exception as err:
+                raise RunError(node.lineno, err) from err
+        returns = self.tree.child_returns
+        try:
+            value = semantics_vm.execute(returns.code, glob, glob, call, kernel, parallel, functions)
+        except Exception as err:
+            raise RunError(returns.lineno, err) from err
+        return as_lists(value)
+
+
+def as_lists(value):
+    '''The value with all its tuples, however deeply nested, as lists (the
+    lists of the VM are copied too, since its values may share them)'''
+    if not isinstance(value, (list, VirtualTuple)):
+        return value
+    result = []
+    # (tuple, list its elements are added to); an explicit stack, so deeply
+    # nested tuples such as lists of cells do not recurse
+    stack = [(value, result)]
+    while stack:
+        items, target = stack.pop()
+        if isinstance(items, VirtualTuple):
+            items = items.materialize()
+        for item in items:
+            if isinstance(item, (list, VirtualTuple)):
+                nested = []
+                stack.append((item, nested))
+                item = nested
+            target.append(item)
+    return result
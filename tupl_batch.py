@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+#
+# Runs many programs in a pool of processes and writes one JSON line per
+# program, in the order the programs were given:
+#   {"file": "exs/a.tupl", "ok": true, "value": [1, 2], "output": "...",
+#    "error": null, "times": {"read": 0.0001, "compile": 0.012, "run": 0.003}}
+# "output" is what the program printed, "value" its return value (tuples
+# as lists). A program that fails has "ok": false and "error":
+# {"phase": "compile", "type": "CompileError", "message": "Line 2: ...",
+#  "stage": "check", "lineno": null}; the other programs are run as usual.
+# "stage" and "lineno" are those of tupl.CompileError ("lineno" is set for
+# a lex error only), and an error while running is given by its own type
+# and message, with the line of the definition that failed in "lineno".
+#
+#   python tupl_batch.py exs -o results.jsonl
+#   python tupl_batch.py --manifest programs.txt --workers 4 -o results.jsonl
+#
+# A manifest lists one program per line, relative to the directory of the
+# manifest; empty lines and lines starting with # are skipped. Every worker
+# builds the lexer and the parser once, when it starts, and compiles and
+# runs its programs with tupl.compile and Program.run. The script exits
+# with status 1 when a program failed.
+
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import tokenizer
+import tree_generation
+import semantics_numeric
+import tupl
+
+
+def init_worker(no_numpy=False):
+    '''Build the lexer and the parser of a worker before its first program'''
+    tree_generation.parser
+    tokenizer.fast_pattern(str)
+    if no_numpy:
+        semantics_numeric.enabled = False
+
+
+def jsonable(value):
+    '''Values json does not know, such as NumPy scalars'''
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def error_record(phase, err):
+    '''The "error" of a record for an exception raised in phase'''
+    if isinstance(err, tupl.RunError) and err.__cause__ is not None:
+        return {"phase": phase, "type": type(err.__cause__).__name__, "message": str(err.__cause__),
+                "stage": None, "lineno": err.lineno}
+    return {"phase": phase, "type": type(err).__name__, "message": str(err),
+            "stage": getattr(err, "stage", None), "lineno": getattr(err, "lineno", None)}
+
+
+def run_file(filename, optimize=1, memo=True):
+    '''Compile and run the program in filename; returns its record'''
+    record = {"file": filename, "ok": False, "value": None, "output": "", "error": None, "times": {}}
+    output = io.StringIO()
+    phase = "read"
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            with open(filename, encoding="utf-8") as infile:
+                source = infile.read()
+            record["times"]["read"] = time.perf_counter() - started
+
+            phase, started = "compile", time.perf_counter()
+            program = tupl.compile(source, optimize=optimize)
+            record["times"]["compile"] = time.perf_counter() - started
+
+            phase, started = "run", time.perf_counter()
+            record["value"] = program.run(memo=memo)
+            record["times"]["run"] = time.perf_counter() - started
+        record["ok"] = True
+    except Exception as err:
+        record["times"][phase] = time.perf_counter() - started
+        record["error"] = error_record(phase, err)
+    record["output"] = output.getvalue()
+    try:
+        json.dumps(record["value"], default=jsonable)
+    except ValueError:
+        # e.g. a tuple that contains itself
+        record["value"] = str(record["value"])
+    return record
+
+
+def read_manifest(filename):
+    '''The programs listed in a manifest file'''
+    directory = os.path.dirname(filename)
+    with open(filename, encoding="utf-8") as infile:
+        return [os.path.join(directory, line.strip()) for line in infile
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
+def find_programs(paths, manifests, pattern="*.tupl"):
+    '''The program files of the paths (directories are searched for
+    pattern) and of the manifests, in the order given'''
+    programs = []
+    for path in paths:
+        if os.path.isdir(path):
+            programs += sorted(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            programs.append(path)
+    for manifest in manifests:
+        programs += read_manifest(manifest)
+    return programs
+
+
+def run_batch(programs, outfile, workers=None, optimize=1, memo=True, no_numpy=False):
+    '''Run the programs and write their records to outfile.
+    Returns (number of programs that ran, number that failed)'''
+    failed = 0
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(no_numpy,)) as pool:
+        futures = [pool.submit(run_file, filename, optimize, memo) for filename in programs]
+        for filename, future in zip(programs, futures):
+            try:
+                record = future.result()
+            except Exception as err:
+                # The worker died (e.g. killed when out of memory); the pool
+                # cannot run the programs after it either
+                record = {"file": filename, "ok": False, "value": None, "output": "", "times": {},
+                          "error": {"phase": "worker", "type": type(err).__name__, "message": str(err)}}
+            failed += not record["ok"]
+            outfile.write(json.dumps(record, default=jsonable) + "\n")
+            outfile.flush()
+    return len(programs) - failed, failed
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('paths', nargs='*', help='program files, or directories to search for programs')
+    arg_parser.add_argument('-m', '--manifest', action='append', default=[],
+                            help='file listing programs, one per line (can be repeated)')
+    arg_parser.add_argument('--pattern', default='*.tupl', help='programs to find in directories (default *.tupl)')
+    arg_parser.add_argument('-o', '--output', metavar='FILE', help='write the JSON lines to FILE (default: stdout)')
+    arg_parser.add_argument('--workers', type=int, default=None,
+                            help='number of worker processes (default: number of CPUs)')
+    arg_parser.add_argument('-O', '--optimize', type=int, choices=(0, 1, 2), default=1,
+                            help='optimization level of the syntax tree (default 1)')
+    arg_parser.add_argument('--no-memo', action='store_true', help='do not cache the results of functions')
+    arg_parser.add_argument('--no-numpy', action='store_true', help='evaluate pipes without NumPy')
+    ns = arg_parser.parse_args()
+
+    programs = find_programs(ns.paths, ns.manifest, ns.pattern)
+    if not programs:
+        arg_parser.error("no programs to run")
+
+    started = time.perf_counter()
+    with (open(ns.output, "w") if ns.output else contextlib.nullcontext(sys.stdout)) as outfile:
+        succeeded, failed = run_batch(programs, outfile, ns.workers, ns.optimize, not ns.no_memo, ns.no_numpy)
+    print("{} programs in {:.2f} s: {} ok, {} failed".format(
+        len(programs), time.perf_counter() - started, succeeded, failed), file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+#
+# Runs a program with the daemon of tupl_daemon.py and prints what
+# semantics_run.py -f prints of it: "Semantics ok." once it is compiled,
+# what the program prints, as it is printed, then its return value, or the
+# error that stopped it.
+#
+#   python tupl_client.py -f exs/program.tupl
+#   python tupl_client.py -f program.tupl --input xx=20 --timeout 5
+#
+# The client exits with the status of semantics_run.py: 1 when the
+# program fails while it runs (or times out), 0 for syntax and check
+# errors. It cancels the program when it is interrupted.
+
+import json
+import socket
+import sys
+
+import tupl_daemon
+
+
+def connect(socket_path=None, port=None):
+    '''A connection to the daemon'''
+    if port is not None:
+        return socket.create_connection(("127.0.0.1", port))
+    connection = socket.socket(socket.AF_UNIX)
+    connection.connect(socket_path or tupl_daemon.default_socket())
+    return connection
+
+
+def run(request, socket_path=None, port=None, out=sys.stdout):
+    '''Send the request to the daemon, write "Semantics ok." and the output
+    of the program to out and return the result message'''
+    with connect(socket_path, port) as connection, connection.makefile("rwb") as stream:
+        request = dict(request, id=1)
+        stream.write((json.dumps(request) + "\n").encode("utf-8"))
+        stream.flush()
+        try:
+            for line in stream:
+                message = json.loads(line)
+                if message.get("done"):
+                    return message
+                out.write("Semantics ok.\n" if message.get("compiled") else message["output"])
+                out.flush()
+        except KeyboardInterrupt:
+            stream.write((json.dumps({"cancel": 1}) + "\n").encode("utf-8"))
+            stream.flush()
+            raise
+    raise ConnectionError("The daemon closed the connection")
+
+
+def report_error(error, filename):
+    '''Print the error of a result as semantics_run.py does and return the
+    exit status'''
+    if error["phase"] == "compile":
+        if error.get("stage") == "lex":
+            print("{}:{}: {}".format(filename, error["lineno"], error["message"]))
+            return 1
+        # semantics_run.py prints "Semantics ok." before the checks
+        if error.get("stage") != "parse":
+            print("Semantics ok.")
+        print(error["message"])
+        return 1 if error.get("stage") == "schedule" else 0
+    if error.get("lineno") is not None:
+        print("{}:{}: {}: {}".format(filename, error["lineno"], error["type"], error["message"]))
+    else:
+        print(error["message"])
+    return 1
+
+
+def binding(text):
+    '''name=value, with the value in JSON (a number or a string in quotes)'''
+    name, separator, value = text.partition("=")
+    if not separator:
+        raise ValueError(text)
+    return name, json.loads(value)
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-f', '--file', help='filename to process')
+    group = arg_parser.add_mutually_exclusive_group()
+    group.add_argument('--socket', metavar='PATH', help='Unix socket of the daemon (default: {})'.format(
+        tupl_daemon.default_socket()))
+    group.add_argument('--port', type=int, help='TCP port of the daemon on localhost')
+    arg_parser.add_argument('--input', type=binding, action='append', default=[], metavar='NAME=VALUE',
+                            help='value of a name the program uses without defining it (can be repeated)')
+    arg_parser.add_argument('--timeout', type=float, help='seconds the program may run')
+    arg_parser.add_argument('-O', '--optimize', type=int, choices=[0, 1, 2], default=1,
+                            help='optimization level of the syntax tree (default 1)')
+    arg_parser.add_argument('--no-memo', action='store_true', help='do not cache the results of function calls')
+    ns = arg_parser.parse_args()
+
+    if ns.file is None:
+        arg_parser.print_help()
+    else:
+        with open(ns.file, encoding='utf-8') as infile:
+            request = {"source": infile.read(), "bindings": dict(ns.input), "optimize": ns.optimize,
+                       "memo": not ns.no_memo}
+        if ns.timeout is not None:
+            request["timeout"] = ns.timeout
+        try:
+            result = run(request, ns.socket, ns.port)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        if not result["ok"]:
+            sys.exit(report_error(result["error"], ns.file))
+        print("Return value of the program:", result["text"])
+        print("Program finished.")
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+#
+# A long-running interpreter: listens on a Unix socket (or a TCP port on
+# localhost) and runs the programs it is sent in a pool of worker
+# processes, so the programs are run without starting Python, importing
+# the interpreter or building the parser. tupl_client.py sends it a file
+# and prints what semantics_run.py -f would.
+#
+#   python tupl_daemon.py --workers 4 &
+#   python tupl_client.py -f exs/program.tupl
+#
+# The requests and responses are JSON lines. A request
+#   {"id": 1, "source": "...", "bindings": {"xx": 20}, "timeout": 10}
+# (or "path" instead of "source", and "optimize" and "memo" as in tupl.py)
+# is answered with {"id": 1, "compiled": true} once the program is
+# compiled, the lines the program prints as they are printed,
+#   {"id": 1, "output": "text\n"}
+# and at the end with
+#   {"id": 1, "done": true, "ok": true, "value": [1, 2], "text": "[1, 2]",
+#    "error": null, "cached": false, "times": {"compile": 0.01, "run": 0.2}}
+# where "error" is {"phase", "type", "message", "stage", "lineno"} when the
+# program failed (as in tupl_batch.py), timed out or was cancelled. {"cancel": 1} cancels request 1. A
+# connection can send more requests before the earlier ones are done; they
+# are run at the same time and answered in the order they finish, and the
+# ones still running are cancelled when it is closed.
+#
+# Every worker keeps the programs it compiled, keyed by a hash of the
+# source, the inputs and the optimization level, and a request goes to an
+# idle worker that has compiled its program if there is one. Python cannot
+# interrupt a running evaluation, so a worker whose program times out or is
+# cancelled is killed and replaced by a new one.
+
+import asyncio
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+
+def default_socket():
+    '''The Unix socket of the daemon of this user'''
+    return os.path.join(tempfile.gettempdir(), "tupl-{}.sock".format(os.getuid()))
+
+
+def program_key(source, inputs, optimize):
+    '''The key of a compiled program in the caches of the workers'''
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return "{}:{}:{}".format(digest, ",".join(sorted(inputs)), optimize)
+
+
+# The worker processes
+
+class OutputStream(io.TextIOBase):
+    '''sys.stdout of a worker while it runs a program: sends every printed
+    line to the daemon'''
+
+    def __init__(self, send):
+        self.send = send
+        self.pending = []
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.pending.append(text)
+        if "\n" in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.send({"output": "".join(self.pending)})
+            self.pending = []
+
+
+def worker_main(cache_size, no_numpy):
+    '''Run the programs of the requests read from stdin, one at a time'''
+    import tupl
+    import tupl_batch
+
+    tupl_batch.init_worker(no_numpy)
+    channel = sys.stdout
+
+    def send(message):
+        channel.write(json.dumps(message, default=tupl_batch.jsonable) + "\n")
+        channel.flush()
+
+    programs = collections.OrderedDict()  # program_key -> Program, least recently used first
+    for line in sys.stdin:
+        request = json.loads(line)
+        inputs = sorted(request.get("bindings") or {})
+        optimize = request.get("optimize", 1)
+        key = program_key(request["source"], inputs, optimize)
+        result = {"done": True, "ok": False, "value": None, "text": None, "error": None,
+                  "cached": key in programs, "times": {}}
+        output = OutputStream(send)
+        phase, started = "compile", time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                if key in programs:
+                    programs.move_to_end(key)
+                else:
+                    programs[key] = tupl.compile(request["source"], inputs, optimize)
+                    if len(programs) > cache_size:
+                        programs.popitem(last=False)
+                result["times"]["compile"] = time.perf_counter() - started
+                send({"compiled": True})
+
+                phase, started = "run", time.perf_counter()
+                value = programs[key].run(request.get("bindings"), request.get("memo", True))
+                result["times"]["run"] = time.perf_counter() - started
+            result.update(ok=True, value=value, text=str(value))
+        except Exception as err:
+            result["times"][phase] = time.perf_counter() - started
+            result["error"] = tupl_batch.error_record(phase, err)
+        output.flush()
+        try:
+            json.dumps(result["value"], default=tupl_batch.jsonable)
+        except ValueError:
+            result["value"] = result["text"]
+        send(result)
+
+
+class Worker:
+    '''A worker process and the keys of the programs it has compiled'''
+
+    def __init__(self, process, cache_size):
+        self.process = process
+        self.cache_size = cache_size
+        self.keys = collections.OrderedDict()  # as the cache of the worker
+
+    @classmethod
+    async def start(cls, cache_size, no_numpy):
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--cache-size", str(cache_size)]
+        if no_numpy:
+            command.append("--no-numpy")
+        process = await asyncio.create_subprocess_exec(
+            *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            limit=2 ** 26, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return cls(process, cache_size)
+
+    async def run(self, request, key, send):
+        '''Send the request to the worker, pass on its output with send and
+        return its result'''
+        self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise ConnectionError("the worker exited with status {}".format(await self.process.wait()))
+            message = json.loads(line)
+            if not message.get("done"):
+                send(message)
+                continue
+            self.keys[key] = True
+            self.keys.move_to_end(key)
+            if len(self.keys) > self.cache_size:
+                self.keys.popitem(last=False)
+            return message
+
+    async def stop(self):
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+
+
+class Daemon:
+    def __init__(self, workers=None, cache_size=64, timeout=None, no_numpy=False):
+        self.size = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.no_numpy = no_numpy
+        self.workers = []
+        self.idle = []
+        self.available = asyncio.Condition()
+        self.connections = set()  # Tasks serving a connection
+        self.replacing = set()  # Tasks starting a new worker
+        self.stopping = False
+
+    async def start(self):
+        self.workers = list(await asyncio.gather(*[Worker.start(self.cache_size, self.no_numpy)
+                                                   for _ in range(self.size)]))
+        self.idle = list(self.workers)
+
+    async def stop(self):
+        '''Cancel the requests and stop the workers'''
+        self.stopping = True
+        for task in self.connections:
+            task.cancel()
+        await asyncio.gather(*self.connections, *self.replacing, return_exceptions=True)
+        await asyncio.gather(*[worker.stop() for worker in self.workers])
+
+    async def acquire(self, key):
+        '''An idle worker, one that has compiled the program if possible'''
+        async with self.available:
+            await self.available.wait_for(lambda: self.idle)
+            worker = next((worker for worker in self.idle if key in worker.keys), self.idle[0])
+            self.idle.remove(worker)
+            return worker
+
+    async def release(self, worker):
+        async with self.available:
+            self.idle.append(worker)
+            self.available.notify()
+
+    def replace(self, worker):
+        '''Kill the worker and start a new one in its place'''
+        task = asyncio.ensure_future(self.restart(worker))
+        self.replacing.add(task)
+        task.add_done_callback(self.replacing.discard)
+
+    async def restart(self, worker):
+        await worker.stop()
+        if self.stopping:
+            return
+        new_worker = await Worker.start(self.cache_size, self.no_numpy)
+        self.workers[self.workers.index(worker)] = new_worker
+        await self.release(new_worker)
+
+    async def run(self, request, send):
+        '''Run the program of the request; returns the result message'''
+        source = request.get("source")
+        if source is None:
+            if "path" not in request:
+                raise ValueError("The request has no source or path")
+            with open(request["path"], encoding="utf-8") as infile:
+                source = infile.read()
+        work = {"source": source, "bindings": request.get("bindings") or {},
+                "optimize": request.get("optimize", 1), "memo": request.get("memo", True)}
+        key = program_key(source, work["bindings"], work["optimize"])
+        timeout = request.get("timeout", self.timeout)
+
+        worker = await self.acquire(key)
+        try:
+            result = await asyncio.wait_for(worker.run(work, key, send), timeout)
+        except asyncio.TimeoutError:
+            self.replace(worker)
+            return failure("run", "Timeout", "The program did not finish in {} s".format(timeout))
+        except BaseException:
+            # Cancelled, or the worker died
+            self.replace(worker)
+            raise
+        await self.release(worker)
+        return result
+
+    async def serve(self, request, send):
+        try:
+            result = await self.run(request, send)
+        except asyncio.CancelledError:
+            result = failure("run", "Cancelled", "The request was cancelled")
+        except Exception as err:
+            result = failure("request", type(err).__name__, str(err))
+        send(result)
+
+    async def handle(self, reader, writer):
+        '''Serve the requests of a connection'''
+        tasks = {}  # id -> Task
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+
+        def sender(request_id):
+            def send(message):
+                if not writer.is_closing():
+                    writer.write((json.dumps(dict(message, id=request_id)) + "\n").encode("utf-8"))
+            return send
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as err:
+                    sender(None)(failure("request", type(err).__name__, str(err)))
+                    continue
+                if "cancel" in request:
+                    task = tasks.get(request["cancel"])
+                    if task is not None:
+                        task.cancel()
+                    continue
+                request_id = request.get("id")
+                task = asyncio.ensure_future(self.serve(request, sender(request_id)))
+                tasks[request_id] = task
+                task.add_done_callback(lambda done, request_id=request_id: tasks.pop(request_id, None))
+                await writer.drain()
+        except asyncio.CancelledError:
+            pass  # the daemon is stopping
+        finally:
+            for task in list(tasks.values()):
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            writer.close()
+            self.connections.discard(connection)
+
+
+def failure(phase, error_type, message):
+    return {"done": True, "ok": False, "value": None, "text": None, "cached": False, "times": {},
+            "error": {"phase": phase, "type": error_type, "message": message, "stage": None, "lineno": None}}
+
+
+async def serve_forever(daemon, socket_path=None, port=None):
+    await daemon.start()
+    try:
+        if port is not None:
+            server = await asyncio.start_server(daemon.handle, "127.0.0.1", port, limit=2 ** 26)
+        else:
+            server = await asyncio.start_unix_server(daemon.handle, socket_path, limit=2 ** 26)
+        print("Listening on", "127.0.0.1:{}".format(port) if port is not None else socket_path,
+              "with {} workers".format(daemon.size), flush=True)
+        stopped = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+        await stopped.wait()
+        server.close()
+    finally:
+        await daemon.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    arg_parser = argparse.ArgumentParser()
+    group = arg_parser.add_mutually_exclusive_group()
+    group.add_argument('--socket', metavar='PATH', help='Unix socket to listen on (default: {})'.format(default_socket()))
+    group.add_argument('--port', type=int, help='listen on this TCP port of localhost instead')
+    arg_parser.add_argument('--workers', type=int, help='number of worker processes (default: CPU count)')
+    arg_parser.add_argument('--cache-size', type=int, default=64,
+                            help='compiled programs kept by every worker (default 64)')
+    arg_parser.add_argument('--timeout', type=float,
+                            help='seconds a program may run unless the request gives a timeout (default: no limit)')
+    arg_parser.add_argument('--no-numpy', action='store_true', help='do not use NumPy arrays for tuples of numbers')
+    arg_parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    ns = arg_parser.parse_args()
+
+    if ns.worker:
+        worker_main(ns.cache_size, ns.no_numpy)
+        sys.exit()
+
+    socket_path = ns.socket or default_socket()
+    if ns.port is None and os.path.exists(socket_path):
+        import socket
+        with socket.socket(socket.AF_UNIX) as probe:
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.unlink(socket_path)  # left by a daemon that did not stop cleanly
+            else:
+                arg_parser.error("a daemon is already listening on " + socket_path)
+    try:
+        asyncio.run(serve_forever(Daemon(ns.workers, ns.cache_size, ns.timeout, ns.no_numpy), socket_path, ns.port))
+    finally:
+        if ns.port is None and os.path.exists(socket_path):
+            os.unlink(socket_path)